@@ -0,0 +1,35 @@
+// Checks static/plan.js against the shared golden cases (bench/client_golden.json).
+//
+//     node bench/client.js [bench/client_golden.json]
+//
+// Exits 1 on the first differing figure of each case, printing where.
+const fs   = require("fs");
+const path = require("path");
+const { evaluate } = require(path.join(__dirname, "..", "static", "plan.js"));
+
+function diff(want, got, where) {
+  if (want === null || typeof want !== "object") {
+    return want === got ? null : `${where}: expected ${JSON.stringify(want)}, got ${JSON.stringify(got)}`;
+  }
+  if (got === null || typeof got !== "object" || Array.isArray(want) !== Array.isArray(got)) {
+    return `${where}: expected ${JSON.stringify(want)}, got ${JSON.stringify(got)}`;
+  }
+  const keys = new Set([...Object.keys(want), ...Object.keys(got)]);
+  for (const k of keys) {
+    const d = diff(want[k], got[k], `${where}.${k}`);
+    if (d) return d;
+  }
+  return null;
+}
+
+const golden = JSON.parse(fs.readFileSync(process.argv[2] || path.join(__dirname, "client_golden.json"), "utf8"));
+let failed = 0;
+golden.cases.forEach((c, i) => {
+  const d = diff(c.expected, evaluate(golden.plans[c.plan], ...c.args), `${c.plan}[${i}]`);
+  if (d) {
+    failed++;
+    console.log(`  JS  ${d}`);
+  }
+});
+console.log(`plan.js: ${golden.cases.length - failed}/${golden.cases.length} cases identical`);
+process.exit(failed ? 1 : 0);
@@ -0,0 +1,125 @@
+"""
+Golden cases shared by core.evaluate() and static/plan.js, the dashboard's
+in-browser evaluator: both must produce identical figures for the same
+client plan.
+
+    python -m bench.client             # check Python, then node bench/client.js
+    python -m bench.client --update    # after an intended change of results
+
+Cases cover the shipped data, a synthetic catalog with pack formats and a
+small catalog of rounding edge cases (prices on half cents, mixes past the
+pack DP bound), each over a seeded spread of dashboard inputs.
+"""
+import argparse, json, os, random, shutil, subprocess, sys
+
+import core
+from bench.synth import shipped, synthetic
+
+HERE        = os.path.dirname(os.path.abspath(__file__))
+GOLDEN_PATH = os.path.join(HERE, "client_golden.json")
+
+CASES_PER_PLAN = 25
+INPUTS = {                          # evaluate() argument order
+    "guests":                [0, 1, 2, 7, 37, 150, 200, 999, 5000, 60000],
+    "alcohol_ml_per_person": [25, 50, 75, 100],
+    "buffer":                [1, 1.05, 1.1, 1.25],
+    "ticket_price":          [0, 7.5, 12.125, 15, 20],
+    "venue_cost":            [0, 500, 333.33],
+    "equipment_cost":        [0, 500, 0.125],
+}
+
+
+def edge():
+    """Half-cent prices, a can, a kg item, a two-format spirit and a per-guest extra."""
+    catalog = {
+        "ingredients": {
+            "Gin":   {"type": "spirit", "abv": 0.4, "volume_ml": 700, "price_min": 12.125, "price_max": 14.375,
+                      "formats": [{"name": "single", "size": 700, "price_min": 12.125, "price_max": 14.375},
+                                  {"name": "case of 6", "size": 4200, "price_min": 65.475, "price_max": 77.625}]},
+            "Tonic": {"type": "mixer", "abv": 0, "volume_ml": 200, "price_min": 0.625, "price_max": 0.875},
+            "Lager": {"type": "beer", "abv": 0.05, "volume_ml": 330, "price_min": 1.005, "price_max": 2.675},
+            "Ice":   {"type": "extra", "abv": 0, "volume_ml": None, "unit": "kg",
+                      "price_min": 0.125, "price_max": 0.375},
+            "Cups":  {"type": "extra", "abv": 0, "volume_ml": None, "unit": "pcs",
+                      "price_min": 0.045, "price_max": 0.055},
+        },
+        "cocktails": {
+            "G&T": {"main_spirit": "Gin", "recipe": {"Gin": {"quantity": 40}, "Tonic": {"quantity": 150},
+                                                     "Ice": {"quantity": 0.15}}},
+        },
+    }
+    settings = {
+        "guests": 150, "ticket_price": 12.125, "venue_cost": 333.33, "equipment_cost": 0.125,
+        "alcohol_ml_per_person": 75, "buffer": 1.1,
+        "menu": {
+            "Beer":    {"macro_pct": 0.3, "spirits": {"Lager": {"pct": 1.0}}},
+            "Spirits": {"macro_pct": 0.7, "spirits": {"Gin": {"pct": 1.0, "drinks": {"G&T": 1.0}}}},
+        },
+        "extras": {"Cups": {"qty_per_person": 3, "min_qty": 50}},
+    }
+    return settings, catalog
+
+
+def sources():
+    """{plan name: (settings, catalog)}"""
+    return {"shipped": shipped(), "synthetic": synthetic(30, 45, seed=2), "edge": edge()}
+
+
+def build():
+    plans, cases = {}, []
+    for name, (settings, catalog) in sources().items():
+        plan = core.compile_plan(settings, catalog)
+        plans[name] = core.client_plan(plan)
+        rng = random.Random(name)
+        for _ in range(CASES_PER_PLAN):
+            args = [rng.choice(values) for values in INPUTS.values()]
+            cases.append({"plan": name, "args": args, "expected": core.evaluate(plan, *args)})
+    return {"plans": plans, "cases": cases}
+
+
+def check_python(golden):
+    """Differences between the stored cases and what core produces now."""
+    errors  = []
+    current = build()
+    for name, plan in current["plans"].items():
+        if golden["plans"].get(name) != plan:
+            errors.append(f"{name}: client_plan() output changed")
+    srcs = sources()
+    for i, case in enumerate(golden["cases"]):
+        settings, catalog = srcs[case["plan"]]
+        settings = {**settings, **dict(zip(INPUTS, case["args"]))}
+        if core.calculate(settings, catalog) != case["expected"]:
+            errors.append(f"{case['plan']}[{i}]: calculate() differs")
+        elif current["cases"][i]["expected"] != case["expected"]:
+            errors.append(f"{case['plan']}[{i}]: evaluate() differs")
+    return errors
+
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    ap.add_argument("--update", action="store_true", help="rewrite client_golden.json from core")
+    opts = ap.parse_args(argv)
+
+    if opts.update:
+        with open(GOLDEN_PATH, "w", encoding="utf-8") as f:
+            json.dump(build(), f, separators=(",", ":"))
+            f.write("\n")
+        print(f"wrote {GOLDEN_PATH}")
+
+    with open(GOLDEN_PATH, encoding="utf-8") as f:
+        golden = json.load(f)
+    errors = check_python(golden)
+    for e in errors:
+        print(f"  PY  {e}")
+    print(f"core: {len(golden['cases'])} cases, {len(errors)} differing")
+
+    node = shutil.which("node")
+    if node is None:
+        print("node not found: plan.js not checked")
+        return 1 if errors else 0
+    js = subprocess.run([node, os.path.join(HERE, "client.js"), GOLDEN_PATH])
+    return 1 if errors or js.returncode else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
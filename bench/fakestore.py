@@ -0,0 +1,128 @@
+"""
+In-process stand-in for the user_data table, for load tests without Postgres.
+
+install() swaps store.py's DB primitives (_db_get, _db_set, _db_patch,
+_load_user, the settings compare-and-set pair, ping) for versions over a dict and switches store into DB mode, so
+every public store function, the catalog cache and catalog_version
+invalidation run unchanged. Values are kept as JSON text, like JSONB
+rows, so callers get fresh copies. `latency` (seconds) is slept once per
+round trip to stand in for the network hop to a database.
+
+State lives in one process: serve it from a single worker (threads are fine).
+"""
+import json, threading, time
+
+import store
+
+_rows  = {}                 # (user_id, key) → JSON text
+_lock  = threading.Lock()
+_delay = {"latency": 0.0}
+
+
+def _round_trip():
+    if _delay["latency"]:
+        time.sleep(_delay["latency"])
+
+
+def _get(user_id, key, default=None):
+    text = _rows.get((user_id, key))
+    return json.loads(text) if text is not None else default
+
+
+# The expressions _db_patch() receives, as Python over the stored value
+_PATCHES = {
+    store._MERGE:      lambda v, a: {**v, **a["items"]},
+    store._REMOVE:     lambda v, a: {k: x for k, x in v.items() if k not in a["names"]},
+    store._APPEND_NEW: lambda v, a: v + [n for n in a["names"] if n not in v],
+    store._MERGE_INTO: lambda v, a: {**v, **{n: {**v[n], **p} for n, p in a["items"].items() if n in v}},
+}
+
+
+def _db_get(user_id, key, default):
+    _round_trip()
+    with _lock:
+        return _get(user_id, key, default)
+
+
+def _db_set(user_id, key, value):
+    _round_trip()
+    text = json.dumps(value, ensure_ascii=False)
+    with _lock:
+        _rows[(user_id, key)] = text
+
+
+def _db_patch(user_id, patches, catalog=True):
+    _round_trip()
+    changed = False
+    with _lock:
+        for key, expr, args, create in patches:
+            # An empty payload (no items, no names) changes nothing: no row, no version bump
+            if not any(args.values()):
+                continue
+            current = _get(user_id, key)
+            if current is None and not create:
+                continue
+            base  = current if current is not None else store.PATCH_DEFAULTS[key]
+            value = _PATCHES[expr](base, args)
+            if current is None or value != current:
+                _rows[(user_id, key)] = json.dumps(value, ensure_ascii=False)
+                changed = True
+        if changed and catalog:
+            _rows[(user_id, "catalog_version")] = json.dumps(_get(user_id, "catalog_version", 0) + 1)
+    if changed and catalog:
+        with store._user_cache_lock:
+            old = store._user_catalogs.pop(user_id, None)
+            if old is not None:
+                store._forget_digest(old[1])
+    return changed
+
+
+def _load_user(user_id, extra_keys=()):
+    cached = store._cached_catalog(user_id)
+    _round_trip()
+    with _lock:
+        version = _get(user_id, "catalog_version", 0)
+        stale   = not (cached and cached[0] == version)
+        keys    = list(extra_keys) + (list(store.OVERLAY_DEFAULTS) if stale else [])
+        rows    = {k: _get(user_id, k) for k in keys if (user_id, k) in _rows}
+
+    defaults = store._default_catalog()
+    if not stale:
+        store._cache_stats["hits"] += 1
+        catalog = cached[1]
+    else:
+        store._cache_stats["misses"] += 1
+        overlay = {k: rows.get(k, d) for k, d in store.OVERLAY_DEFAULTS.items()}
+        catalog = store._merge_catalog(defaults, overlay)
+        store._cache_catalog(user_id, version, catalog)
+    return catalog, rows
+
+
+def _db_get_settings(user_id):
+    _round_trip()
+    with _lock:
+        return _get(user_id, "settings") or store._default_settings(), _get(user_id, "settings_version", 0)
+
+
+def _db_cas_settings(user_id, settings, version):
+    _round_trip()
+    text = json.dumps(settings, ensure_ascii=False)
+    with _lock:
+        current = _get(user_id, "settings_version")
+        if current is not None and current != version:
+            return None
+        _rows[(user_id, "settings_version")] = json.dumps((current or 0) + 1)
+        _rows[(user_id, "settings")] = text
+        return (current or 0) + 1
+
+
+def ping():
+    _round_trip()
+
+
+def install(latency=0.0):
+    _delay["latency"] = latency
+    store._db_get, store._db_set, store.ping = _db_get, _db_set, ping
+    store._db_patch, store._load_user = _db_patch, _load_user
+    store._db_get_settings, store._db_cas_settings = _db_get_settings, _db_cas_settings
+    store.USE_DB = True
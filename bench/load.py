@@ -0,0 +1,279 @@
+"""
+End-to-end load test: starts the app under gunicorn on localhost and has
+simulated signed-in users mix dashboard views, /api/calculate, settings
+saves and catalog edits. Reports throughput, p50/p95/p99 latency and
+errors per route. Runs offline; the same seed, clients and requests give
+the same request sequence.
+
+    python -m bench.load                                   # in-process fake store
+    python -m bench.load --store postgres --workers 4      # DATABASE_URL, e.g. a local Postgres
+    python -m bench.load --store local --workers 4         # per-user JSON files in a temp dir
+    python -m bench.load --clients 32 --requests 500 --mix dashboard=2,calculate=4,settings=1,catalog=1
+
+The fake store keeps its data in one process, so it is served by a single
+worker with --threads; compare worker counts against Postgres or the local
+JSON store (LOCAL_PER_USER, no catalog edits). Users are named loadtest-<n>;
+with Postgres their rows are deleted before and after.
+"""
+import argparse, http.client, json, os, random, secrets, shutil, socket, subprocess, sys, tempfile
+import threading, time
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+ROOT = os.path.dirname(HERE)
+
+DEFAULT_MIX = "dashboard=3,calculate=4,settings=2,catalog=1"
+
+
+# ── Server ─────────────────────────────────────────────────────
+
+def _free_port():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def start_server(opts, secret, port):
+    env = {**os.environ, "SECRET_KEY": secret, "LOADTEST_STORE": opts.store, "WEB_THREADS": str(opts.threads),
+           "LOADTEST_DB_LATENCY_MS": str(opts.db_latency_ms), "WEB_CONCURRENCY": str(opts.workers)}
+    if opts.store != "postgres":
+        env.pop("DATABASE_URL", None)
+    if opts.store == "local":
+        env.update(LOCAL_PER_USER="1", LOCAL_USER_DIR=opts.user_dir)
+    cmd = [sys.executable, "-m", "gunicorn", "bench.loadapp:app", "--bind", f"127.0.0.1:{port}",
+           "--workers", str(opts.workers), "--threads", str(opts.threads),
+           "--worker-class", "gthread", "--log-level", "warning", "--chdir", ROOT]
+    if opts.store == "postgres":
+        subprocess.run([sys.executable, "store.py", "migrate"], env=env, cwd=ROOT, check=True)
+    proc = subprocess.Popen(cmd, env=env, cwd=ROOT)
+    deadline = time.monotonic() + 60
+    while time.monotonic() < deadline:
+        if proc.poll() is not None:
+            raise SystemExit(f"server exited with {proc.returncode}")
+        try:
+            conn = http.client.HTTPConnection("127.0.0.1", port, timeout=2)
+            conn.request("GET", "/healthz")
+            ready = conn.getresponse().status == 200
+            conn.close()
+            if ready:
+                return proc
+        except OSError:
+            time.sleep(0.2)
+    proc.terminate()
+    raise SystemExit("server did not start within 60s")
+
+
+def mint_cookies(secret, users):
+    """Session cookies as /auth/callback would set them, signed with the server's key."""
+    from flask import Flask
+    app = Flask("loadtest")
+    app.secret_key = secret
+    signer = app.session_interface.get_signing_serializer(app)
+    return {u: "session=" + signer.dumps({"user_id": u, "name": u, "email": f"{u}@example.test"})
+            for u in users}
+
+
+def clear_users(users):
+    import psycopg2
+    with psycopg2.connect(os.environ["DATABASE_URL"],
+                          sslmode=os.environ.get("DB_SSLMODE", "require")) as conn:
+        with conn.cursor() as cur:
+            cur.execute("DELETE FROM user_data WHERE user_id = ANY(%s)", (users,))
+    conn.close()
+
+
+# ── Workload ───────────────────────────────────────────────────
+
+def _shipped_ingredients():
+    with open(os.path.join(ROOT, "data", "catalog.json"), encoding="utf-8") as f:
+        return sorted(json.load(f)["ingredients"])
+
+
+class Client:
+    """One keep-alive connection issuing a seeded sequence of user actions."""
+
+    def __init__(self, port, cookies, etags, rng, ingredients):
+        self.conn        = http.client.HTTPConnection("127.0.0.1", port, timeout=60)
+        self.cookies     = cookies
+        self.etags       = etags        # (user, path) → last ETag, shared like a browser cache
+        self.rng         = rng
+        self.ingredients = ingredients
+
+    def request(self, user, method, path, body=None, cached=False):
+        headers = {"Cookie": self.cookies[user]}
+        if body is not None:
+            headers["Content-Type"] = "application/json"
+            body = json.dumps(body)
+        etag = self.etags.get((user, path)) if cached else None
+        if etag:
+            headers["If-None-Match"] = etag
+        try:
+            self.conn.request(method, path, body=body, headers=headers)
+            response = self.conn.getresponse()
+            response.read()
+        except (OSError, http.client.HTTPException):
+            self.conn.close()
+            raise
+        if cached and response.getheader("ETag"):
+            self.etags[(user, path)] = response.getheader("ETag")
+        return response.status
+
+    def dashboard(self, user):
+        return self.request(user, "GET", "/", cached=True)
+
+    def calculate(self, user):
+        return self.request(user, "GET", "/api/calculate", cached=True)
+
+    def settings(self, user):
+        body = {"guests": self.rng.randrange(50, 500, 10), "buffer": self.rng.choice([1.0, 1.1, 1.2])}
+        return self.request(user, "POST", "/api/settings?partial=kpis,shopping_list", body)
+
+    def catalog(self, user):
+        price = round(self.rng.uniform(0.5, 20), 2)
+        body  = {"name": self.rng.choice(self.ingredients), "price_min": price,
+                 "price_max": round(price * 1.3, 2)}
+        return self.request(user, "POST", "/api/catalog/ingredient/price?partial=kpis", body)
+
+
+def parse_mix(spec):
+    mix = {}
+    for part in spec.split(","):
+        name, _, weight = part.partition("=")
+        if name not in ("dashboard", "calculate", "settings", "catalog"):
+            raise argparse.ArgumentTypeError(f"unknown action: {name}")
+        mix[name] = float(weight or 1)
+    return mix
+
+
+def run_client(i, opts, port, cookies, etags, ingredients, deadline, samples):
+    rng    = random.Random(opts.seed * 1_000_003 + i)
+    client = Client(port, cookies, etags, rng, ingredients)
+    users  = sorted(cookies)
+    names, weights = zip(*opts.mix.items())
+    done = 0
+    while done < opts.requests and (deadline is None or time.monotonic() < deadline):
+        action = rng.choices(names, weights)[0]
+        user   = rng.choice(users)
+        t = time.perf_counter()
+        try:
+            status = getattr(client, action)(user)
+        except (OSError, http.client.HTTPException) as e:
+            status = type(e).__name__
+        samples.append((action, status, time.perf_counter() - t))
+        done += 1
+    # Open keep-alive connections would hold up gunicorn's graceful shutdown
+    client.conn.close()
+
+
+# ── Report ─────────────────────────────────────────────────────
+
+def _percentile(sorted_values, q):
+    if not sorted_values:
+        return 0.0
+    return sorted_values[min(len(sorted_values) - 1, int(q * len(sorted_values)))]
+
+
+def summarize(samples, elapsed):
+    routes = {}
+    for action, status, secs in sorted(samples, key=lambda r: r[0]):
+        routes.setdefault(action, []).append((status, secs))
+    routes["all"] = [(status, secs) for _, status, secs in samples]
+    out = {}
+    for route, rows in routes.items():
+        latencies = sorted(secs for _, secs in rows)
+        errors    = [s for s, _ in rows if not isinstance(s, int) or s >= 400]
+        out[route] = {
+            "requests":   len(rows),
+            "throughput": round(len(rows) / elapsed, 1),
+            "p50_ms":     round(_percentile(latencies, 0.50) * 1000, 2),
+            "p95_ms":     round(_percentile(latencies, 0.95) * 1000, 2),
+            "p99_ms":     round(_percentile(latencies, 0.99) * 1000, 2),
+            "errors":     len(errors),
+            "not_modified": sum(1 for s, _ in rows if s == 304),
+        }
+    return out
+
+
+def print_report(report, opts, elapsed):
+    print(f"\n{opts.store} store, {opts.workers} worker(s) × {opts.threads} thread(s), "
+          f"{opts.clients} clients, {opts.users} users, {elapsed:.1f}s")
+    print(f"{'route':<10} {'requests':>9} {'req/s':>8} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8} "
+          f"{'304':>6} {'errors':>7}")
+    for route, r in report.items():
+        print(f"{route:<10} {r['requests']:>9} {r['throughput']:>8} {r['p50_ms']:>8} {r['p95_ms']:>8} "
+              f"{r['p99_ms']:>8} {r['not_modified']:>6} {r['errors']:>7}")
+
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    ap.add_argument("--store", choices=["fake", "postgres", "local"], default="fake")
+    ap.add_argument("--db-latency-ms", type=float, default=0.5,
+                    help="fake store: delay per round trip, standing in for the network")
+    ap.add_argument("--workers", type=int, default=1, help="gunicorn workers")
+    ap.add_argument("--threads", type=int, default=4, help="threads per gunicorn worker")
+    ap.add_argument("--clients", type=int, default=16, help="concurrent simulated browsers")
+    ap.add_argument("--users", type=int, default=50, help="distinct signed-in users")
+    ap.add_argument("--requests", type=int, default=200, help="requests per client")
+    ap.add_argument("--duration", type=float, help="stop after this many seconds instead")
+    ap.add_argument("--mix", type=parse_mix, default=parse_mix(DEFAULT_MIX))
+    ap.add_argument("--seed", type=int, default=1)
+    ap.add_argument("--json", help="also write the report here")
+    opts = ap.parse_args(argv)
+    if opts.store == "fake" and opts.workers != 1:
+        ap.error("the fake store lives in one process: use --workers 1 and raise --threads")
+    if opts.store == "postgres" and not os.environ.get("DATABASE_URL"):
+        ap.error("--store postgres needs DATABASE_URL")
+    if opts.store == "local":
+        # Catalog edits are stored in the database only
+        if set(opts.mix) == {"catalog"}:
+            ap.error("--store local cannot serve catalog edits")
+        opts.mix.pop("catalog", None)
+        opts.user_dir = tempfile.mkdtemp(prefix="bottlecount-load-")
+    if opts.duration:
+        opts.requests = sys.maxsize
+
+    users   = [f"loadtest-{i}" for i in range(opts.users)]
+    secret  = secrets.token_hex(16)
+    cookies = mint_cookies(secret, users)
+    port    = _free_port()
+    if opts.store == "postgres":
+        clear_users(users)
+    proc = start_server(opts, secret, port)
+    try:
+        # Every user starts from saved settings, as after a first visit
+        seed_rng = random.Random(opts.seed)
+        setup    = Client(port, cookies, {}, seed_rng, _shipped_ingredients())
+        for user in users:
+            setup.settings(user)
+        setup.conn.close()
+
+        etags, samples = {}, []
+        deadline = time.monotonic() + opts.duration if opts.duration else None
+        threads  = [threading.Thread(target=run_client,
+                                     args=(i, opts, port, cookies, etags, _shipped_ingredients(),
+                                           deadline, samples))
+                    for i in range(opts.clients)]
+        t = time.perf_counter()
+        for th in threads:
+            th.start()
+        for th in threads:
+            th.join()
+        elapsed = time.perf_counter() - t
+    finally:
+        proc.terminate()
+        proc.wait(timeout=30)
+        if opts.store == "postgres":
+            clear_users(users)
+        elif opts.store == "local":
+            shutil.rmtree(opts.user_dir, ignore_errors=True)
+
+    report = summarize(samples, elapsed)
+    print_report(report, opts, elapsed)
+    if opts.json:
+        with open(opts.json, "w", encoding="utf-8") as f:
+            json.dump({"options": {k: v for k, v in vars(opts).items() if k not in ("json", "user_dir")},
+                       "elapsed_s": round(elapsed, 3), "routes": report}, f, indent=2)
+    return 1 if report["all"]["errors"] else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
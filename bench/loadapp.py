@@ -0,0 +1,8 @@
+"""WSGI entry for bench/load.py: server.app, on the in-process fake store when LOADTEST_STORE=fake."""
+import os
+
+if os.environ.get("LOADTEST_STORE") == "fake":
+    from bench import fakestore
+    fakestore.install(latency=float(os.environ.get("LOADTEST_DB_LATENCY_MS", 0)) / 1000)
+
+from server import app
@@ -0,0 +1,285 @@
+"""
+Benchmarks for core.py: time and peak memory per case and scale, checked
+against a stored baseline, plus golden outputs so an optimization cannot
+move a bottle count or a total.
+
+    python -m bench.run                       # all scales, compare with baseline.json
+    python -m bench.run --scales shipped small --repeat 3
+    python -m bench.run --save-baseline       # record this machine's numbers
+    python -m bench.run --golden-only         # outputs only, no timing
+    python -m bench.run --update-golden       # after an intended change of results
+
+Exits 1 on a golden mismatch or a regression beyond --tolerance.
+Batch paths run in-process (workers=1) with a warm plan cache, as a
+single gunicorn worker would serve them.
+"""
+import argparse, hashlib, json, os, platform, statistics, sys, time, tracemalloc
+
+import core
+from bench.synth import SCALES, scale
+
+HERE          = os.path.dirname(os.path.abspath(__file__))
+BASELINE_PATH = os.path.join(HERE, "baseline.json")
+GOLDEN_PATH   = os.path.join(HERE, "golden.json")
+
+MIN_SAMPLE_S = 0.005    # calls are batched until one sample takes at least this long
+NOISE_MS     = 0.5      # slowdowns smaller than this never count as a regression
+SEASON_SIZE  = 12
+
+
+# ── Cases ──────────────────────────────────────────────────────
+
+def _season(settings):
+    return [{**settings, "name": f"Event {i:02d}", "date": f"2026-{i % 12 + 1:02d}-01",
+             "guests": 80 + 37 * i % 400}
+            for i in range(SEASON_SIZE)]
+
+
+def cases(settings, catalog):
+    """{name: zero-argument callable}; all share one compiled plan."""
+    digest = core.content_digest(catalog)           # the server passes the store's cached digest
+    key    = core.plan_key(settings, catalog, digest)  # and the plan key its ETag is built on
+    plan   = core.plan_for(settings, catalog, digest, key)
+    args   = (settings["guests"], settings["alcohol_ml_per_person"], settings["buffer"],
+              settings["ticket_price"], settings["venue_cost"], settings["equipment_cost"])
+    base   = core.evaluate(plan, *args)
+    priced = next(r["name"] for r in plan["rows"] if not r["formats"])
+    change = {"op": "price", "name": priced, "price_min": 1.0, "price_max": 2.0}
+    events = _season(settings)
+    return {
+        "validate_menu":      lambda: core.validate_menu(settings["menu"]),
+        "catalog_model":      lambda: core.CatalogModel(catalog),
+        "calculate":          lambda: core.calculate(settings, catalog, digest),
+        "compile_plan":       lambda: core.compile_plan(settings, catalog),
+        "calculate_compiled": lambda: core.calculate_compiled(settings, catalog, digest, key),
+        "apply_change":       lambda: core.apply_change(base, change, plan, settings)[0],
+        "sweep":              lambda: core.sweep(plan, list(range(50, 1050, 50)), [10, 12.5, 15, 20, 25],
+                                                 [25, 50, 75, 100], [1.0, 1.1, 1.2],
+                                                 settings["venue_cost"], settings["equipment_cost"]),
+        "break_even_exact":   lambda: core.break_even_exact(plan, settings),
+        "min_ticket_price":   lambda: core.min_ticket_price(plan, settings, target_profit=1000),
+        "max_guests_within":  lambda: core.max_guests_within(plan, settings, cap=5000),
+        "simulate_risk":      lambda: core.simulate_risk(plan, settings, draws=20_000, seed=1, workers=1),
+        "plan_season":        lambda: core.plan_season(events, catalog, digest, workers=1),
+    }
+
+
+# ── Golden outputs ─────────────────────────────────────────────
+
+def _plain(x):
+    """JSON-ready copy with numpy values unwrapped and floats rounded past noise."""
+    if hasattr(x, "tolist"):
+        x = x.tolist()
+    if isinstance(x, dict):
+        return {str(k): _plain(v) for k, v in x.items()}
+    if isinstance(x, (list, tuple)):
+        return [_plain(v) for v in x]
+    if isinstance(x, float):
+        return round(x, 6)
+    return x
+
+
+def fingerprint(value):
+    plain = _plain(value)
+    out   = {"sha1": hashlib.sha1(json.dumps(plain, sort_keys=True).encode()).hexdigest()}
+    if isinstance(plain, dict):
+        # Named scalars only: list-valued results (sweep grids, risk tables) are in the sha1
+        for key in ("total_min", "total_max", "profit_min", "profit_max", "break_even"):
+            if key in plain and not isinstance(plain[key], (list, dict)):
+                out[key] = plain[key]
+        if "shopping_list" in plain:
+            out["items"] = len(plain["shopping_list"])
+            out["units"] = sum(r["quantity"] for r in plain["shopping_list"])
+    elif not isinstance(plain, list):
+        out["value"] = plain
+    return out
+
+
+def _edits(plan, catalog):
+    """A sequence of catalog changes for apply_change(): price edits, an undo, then deletions."""
+    priced = [r["name"] for r in plan["rows"] if not r["formats"]][:3]
+    packed = [r["name"] for r in plan["rows"] if r["formats"]][:1]
+    edits  = [{"op": "price", "name": name, "price_min": 0.125 * (i + 1), "price_max": 0.375 * (i + 3)}
+              for i, name in enumerate(priced + packed)]
+    if priced:
+        ing = catalog["ingredients"][priced[0]]
+        edits.append({"op": "price", "name": priced[0],
+                      "price_min": ing["price_min"], "price_max": ing["price_max"]})
+    cocktail = next(iter(catalog["cocktails"]), None)
+    if cocktail is not None:
+        edits.append({"op": "delete_cocktail", "name": cocktail})
+    # A plain shopping-list row, then the main spirit of a cocktail that is still served
+    if len(priced) > 1:
+        edits.append({"op": "delete_ingredient", "name": priced[1]})
+    spirits = {data["main_spirit"] for name, data in catalog["cocktails"].items() if name != cocktail}
+    spirit  = next((r["name"] for r in plan["rows"] if r["name"] in spirits and r["name"] not in priced[1:2]), None)
+    if spirit is not None:
+        edits.append({"op": "delete_ingredient", "name": spirit})
+    return edits
+
+
+def _edited(catalog, change):
+    ingredients = dict(catalog["ingredients"])
+    cocktails   = dict(catalog["cocktails"])
+    if change["op"] == "price":
+        ingredients[change["name"]] = {**ingredients[change["name"]], "price_min": change["price_min"],
+                                       "price_max": change["price_max"]}
+    elif change["op"] == "delete_cocktail":
+        cocktails.pop(change["name"])
+    elif change["op"] == "delete_ingredient":
+        ingredients.pop(change["name"])
+    return {**catalog, "ingredients": ingredients, "cocktails": cocktails}
+
+
+def incremental_errors(settings, catalog):
+    """apply_change() after each edit of _edits() must equal a full calculate_compiled()."""
+    plan   = core.plan_for(settings, catalog)
+    result = core.calculate_compiled(settings, catalog)
+    errors = []
+    for step, change in enumerate(_edits(plan, catalog)):
+        result, plan = core.apply_change(result, change, plan, settings)
+        catalog      = _edited(catalog, change)
+        if result != core.calculate_compiled(settings, catalog):
+            errors.append(f"apply_change differs from calculate_compiled after edit {step} ({change['op']})")
+    return errors
+
+
+def golden(settings, catalog, runs):
+    """Fingerprints per case; the calculate() variants must also agree exactly."""
+    outputs = {name: fn() for name, fn in runs.items()}
+    errors  = []
+    if core.calculate(settings, catalog) != outputs["calculate"]:
+        errors.append("calculate without a cached model differs")
+    for name in ("calculate_compiled",):
+        if outputs[name] != outputs["calculate"]:
+            errors.append(f"{name} differs from calculate")
+    plan     = core.plan_for(settings, catalog)
+    expected = core.evaluate(plan, settings["guests"], settings["alcohol_ml_per_person"],
+                             settings["buffer"], settings["ticket_price"],
+                             settings["venue_cost"], settings["equipment_cost"])
+    if expected != outputs["calculate"]:
+        errors.append("evaluate(compile_plan) differs from calculate")
+    errors += incremental_errors(settings, catalog)
+    skip = {"compile_plan", "catalog_model"}      # internal structure, not a result
+    return {name: fingerprint(v) for name, v in outputs.items() if name not in skip}, errors
+
+
+# ── Timing ─────────────────────────────────────────────────────
+
+def measure(fn, repeat):
+    """(median ms, min ms, peak KiB) per call."""
+    fn()
+    number = 1
+    while True:
+        t = time.perf_counter()
+        for _ in range(number):
+            fn()
+        if time.perf_counter() - t >= MIN_SAMPLE_S or number >= 10_000:
+            break
+        number *= 10
+    samples = []
+    for _ in range(repeat):
+        t = time.perf_counter()
+        for _ in range(number):
+            fn()
+        samples.append((time.perf_counter() - t) / number * 1000)
+
+    tracemalloc.start()
+    try:
+        fn()
+        peak = tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+    return statistics.median(samples), min(samples), peak / 1024
+
+
+def compare(scale_name, name, row, baseline, tolerance):
+    base = baseline.get("results", {}).get(scale_name, {}).get(name)
+    if not base:
+        return "new", False
+    # The fastest sample is the least disturbed by other load on the machine
+    dt = row["min_ms"] / base["min_ms"] - 1 if base["min_ms"] else 0
+    dm = row["peak_kib"] / base["peak_kib"] - 1 if base["peak_kib"] else 0
+    slow = dt > tolerance and row["min_ms"] - base["min_ms"] > NOISE_MS
+    fat  = dm > tolerance and row["peak_kib"] - base["peak_kib"] > 64
+    note = f"{dt:+.0%} time, {dm:+.0%} mem"
+    if slow or fat:
+        note += "  REGRESSION"
+    return note, slow or fat
+
+
+def _load(path):
+    if not os.path.exists(path):
+        return {}
+    with open(path, encoding="utf-8") as f:
+        return json.load(f)
+
+
+def _save(path, data):
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(data, f, indent=2, sort_keys=True)
+        f.write("\n")
+
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    ap.add_argument("--scales", nargs="+", choices=list(SCALES), default=list(SCALES))
+    ap.add_argument("--cases", nargs="+", help="only these cases (default: all)")
+    ap.add_argument("--repeat", type=int, default=5, help="timed samples per case")
+    ap.add_argument("--tolerance", type=float, default=0.3, help="allowed slowdown / growth, 0.3 = 30%%")
+    ap.add_argument("--save-baseline", action="store_true")
+    ap.add_argument("--golden-only", action="store_true")
+    ap.add_argument("--update-golden", action="store_true")
+    opts = ap.parse_args(argv)
+
+    baseline = _load(BASELINE_PATH)
+    goldens  = _load(GOLDEN_PATH)
+    results  = {}
+    failed   = False
+
+    for scale_name in opts.scales:
+        settings, catalog = scale(scale_name)
+        runs = cases(settings, catalog)
+        print(f"\n{scale_name}: {len(catalog['ingredients'])} ingredients, "
+              f"{len(catalog['cocktails'])} cocktails")
+
+        prints, errors = golden(settings, catalog, runs)
+        if opts.update_golden:
+            goldens[scale_name] = prints
+        else:
+            for name, fp in prints.items():
+                want = goldens.get(scale_name, {}).get(name)
+                if want is not None and want != fp:
+                    errors.append(f"{name}: expected {want}, got {fp}")
+        for e in errors:
+            print(f"  GOLDEN  {e}")
+        failed |= bool(errors)
+
+        if opts.golden_only:
+            continue
+        results[scale_name] = {}
+        for name, fn in runs.items():
+            if opts.cases and name not in opts.cases:
+                continue
+            median, best, peak = measure(fn, opts.repeat)
+            row = {"median_ms": round(median, 4), "min_ms": round(best, 4), "peak_kib": round(peak, 1)}
+            results[scale_name][name] = row
+            note, regressed = compare(scale_name, name, row, baseline, opts.tolerance)
+            failed |= regressed and not opts.save_baseline
+            print(f"  {name:<20} {median:>10.3f} ms  (min {best:.3f})  {peak:>10.1f} KiB  {note}")
+
+    if opts.update_golden:
+        _save(GOLDEN_PATH, goldens)
+        print(f"\nwrote {GOLDEN_PATH}")
+    if opts.save_baseline:
+        for scale_name, rows in results.items():
+            baseline.setdefault("results", {}).setdefault(scale_name, {}).update(rows)
+        baseline["machine"] = {"python": platform.python_version(), "platform": platform.platform(),
+                               "cpus": os.cpu_count()}
+        _save(BASELINE_PATH, baseline)
+        print(f"\nwrote {BASELINE_PATH}")
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
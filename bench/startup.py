@@ -0,0 +1,82 @@
+"""
+Cold-start check: time for a fresh interpreter to import server.py and
+answer its first /healthz, in local mode. Also imports the app with
+DATABASE_URL pointing at a closed port, which only succeeds if import
+does no network I/O.
+
+    python -m bench.startup                  # 5 runs, exit 1 above the target
+    python -m bench.startup --runs 10 --target-ms 400
+
+Prints the slowest imports (python -X importtime) when over target.
+"""
+import argparse, os, statistics, subprocess, sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+TARGET_MS = float(os.environ.get("STARTUP_TARGET_MS", 500))
+
+PROBE = """
+import time
+t = time.perf_counter()
+import server
+imported = time.perf_counter()
+assert server.app.test_client().get("/healthz").status_code == 200
+print((imported - t) * 1000, (time.perf_counter() - t) * 1000)
+"""
+
+
+def _env(**extra):
+    env = {k: v for k, v in os.environ.items() if k not in ("DATABASE_URL", "METRICS_ENABLED")}
+    return {**env, **extra}
+
+
+def _run(args, env):
+    return subprocess.run([sys.executable, *args], cwd=ROOT, env=env, capture_output=True, text=True)
+
+
+def slowest_imports(n=10):
+    out = _run(["-X", "importtime", "-c", "import server"], _env()).stderr.splitlines()
+    rows = []
+    for line in out:
+        parts = line.split("|")
+        if len(parts) == 3 and parts[1].strip().isdigit():
+            rows.append((int(parts[1]), parts[2].rstrip()))
+    return sorted(rows, reverse=True)[:n]
+
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    ap.add_argument("--runs", type=int, default=5)
+    ap.add_argument("--target-ms", type=float, default=TARGET_MS,
+                    help="median import + first request budget (STARTUP_TARGET_MS)")
+    opts = ap.parse_args(argv)
+
+    offline = _run(["-c", "import server"],
+                   _env(DATABASE_URL="postgresql://nobody@127.0.0.1:1/none", DB_SSLMODE="disable"))
+    if offline.returncode:
+        print("import touched the database:\n" + offline.stderr[-2000:])
+        return 1
+
+    imports, firsts = [], []
+    for _ in range(opts.runs):
+        probe = _run(["-c", PROBE], _env())
+        if probe.returncode:
+            print(probe.stderr[-2000:])
+            return 1
+        imported, first = map(float, probe.stdout.split()[-2:])
+        imports.append(imported)
+        firsts.append(first)
+
+    median = statistics.median(firsts)
+    print(f"import server:        median {statistics.median(imports):7.1f} ms  (min {min(imports):.1f})")
+    print(f"first /healthz ready: median {median:7.1f} ms  (min {min(firsts):.1f})  target {opts.target_ms:.0f} ms")
+    if median <= opts.target_ms:
+        return 0
+    print("\nover target; slowest imports (cumulative µs):")
+    for us, name in slowest_imports():
+        print(f"  {us:>9}  {name}")
+    return 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
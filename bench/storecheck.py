@@ -0,0 +1,137 @@
+"""
+Checks of store.py's single-statement catalog patches: what changes the
+overlay, what bumps catalog_version (and so drops every worker's cached
+catalog), and what must not. Then an export → import → edit round trip
+through the HTTP routes: shipped entries must stay shipped, and deletes
+and price edits must reach personal entries that hide shipped ones.
+
+    python -m bench.storecheck            # against DATABASE_URL (rows of one throwaway user)
+    python -m bench.storecheck --fake     # against bench/fakestore.py, which must agree
+
+Exits 1 on the first failed check.
+"""
+import argparse, json, os, sys
+from urllib.parse import quote
+
+import store
+
+USER = "storecheck-user"
+
+
+def _version():
+    return store._db_get(USER, "catalog_version", 0)
+
+
+def _clear():
+    """Drops the check user's rows (replaced for the fake store)."""
+    with store._conn() as conn, conn.cursor() as cur:
+        cur.execute("DELETE FROM user_data WHERE user_id = %s", (USER,))
+
+
+def checks():
+    """(description, passed) for each check, in order; the user's rows are cleared before and after."""
+    name = next(iter(store._default_catalog()["ingredients"]))
+    out  = []
+
+    _clear()
+    changed = store.add_ingredients(USER, {})
+    out.append(("empty add returns False", changed is False))
+    out.append(("empty add leaves catalog_version alone", _version() == 0))
+    out.append(("empty add creates no overlay row", store._db_get(USER, "personal_ingredients", None) is None))
+
+    changed = store.apply_catalog_batch(USER)
+    out.append(("empty batch returns False", changed is False and _version() == 0))
+
+    changed = store.delete_ingredients(USER, [])
+    out.append(("empty delete returns False", changed is False and _version() == 0))
+
+    changed = store.update_ingredient_prices(USER, {name: (1.0, 2.0)})
+    out.append(("price edit returns True and bumps the version", changed is True and _version() == 1))
+
+    changed = store.update_ingredient_prices(USER, {name: (1.0, 2.0)})
+    out.append(("repeating the edit is a no-op", changed is False and _version() == 1))
+
+    changed = store.update_ingredient_prices(USER, {})
+    out.append(("empty price edit is a no-op", changed is False and _version() == 1))
+    _clear()
+    return out
+
+
+def _edits(client, catalog_of, ingredient, other, cocktail, label):
+    """Price edit, ingredient delete and cocktail delete through the routes, as checks."""
+    client.post("/api/catalog/ingredient/price", json={"name": ingredient, "price_min": 0.5, "price_max": 0.75})
+    edited = catalog_of()["ingredients"].get(ingredient, {})
+    client.delete(f"/api/catalog/ingredient/{quote(other)}")
+    client.delete(f"/api/catalog/cocktail/{quote(cocktail)}")
+    catalog = catalog_of()
+    return [(f"{label}: price edit applies", (edited.get("price_min"), edited.get("price_max")) == (0.5, 0.75)),
+            (f"{label}: deleted ingredient is gone", other not in catalog["ingredients"]),
+            (f"{label}: deleted cocktail is gone", cocktail not in catalog["cocktails"])]
+
+
+def round_trip():
+    """(description, passed) for the export / import / edit round trip; rows cleared before and after."""
+    import server
+
+    client = server.app.test_client()
+    with client.session_transaction() as sess:
+        sess["user_id"] = USER
+    catalog_of = lambda: store.get_catalog(USER)
+    defaults   = store._default_catalog()
+    ingredient, other = list(defaults["ingredients"])[:2]
+    cocktail   = next(iter(defaults["cocktails"]))
+    entries    = len(defaults["ingredients"]) + len(defaults["cocktails"])
+    out        = []
+
+    _clear()
+    body = client.get("/api/catalog/export?format=csv").get_data()
+    got  = client.post("/api/catalog/import?format=csv", data=body, content_type="text/csv").get_json()
+    out.append(("re-imported export is all unchanged rows",
+                got["imported"]["unchanged"] == entries and got["failed"] == 0))
+    out.append(("re-imported export leaves catalog_version alone", _version() == 0))
+
+    rows = [json.loads(line) for line in client.get("/api/catalog/export?format=ndjson").get_data(as_text=True).splitlines()]
+    for row in rows:
+        if row["kind"] == "ingredient" and row["name"] == ingredient:
+            row["price_max"] += 1
+    got = client.post("/api/catalog/import?format=ndjson", content_type="application/x-ndjson",
+                      data="".join(json.dumps(row) + "\n" for row in rows)).get_json()
+    out.append(("an export with one new price imports one price update",
+                got["imported"]["price"] == 1 and got["imported"]["unchanged"] == entries - 1))
+    out.append(("the price update is an override, not a personal copy",
+                store._db_get(USER, "personal_ingredients", {}) == {}
+                and catalog_of()["ingredients"][ingredient]["price_max"] == defaults["ingredients"][ingredient]["price_max"] + 1))
+    out += _edits(client, catalog_of, ingredient, other, cocktail, "after the round trip")
+
+    # Personal copies of shipped entries, as imports wrote them before shipped rows were skipped
+    _clear()
+    store.add_ingredients(USER, {name: defaults["ingredients"][name] for name in (ingredient, other)})
+    store.add_cocktails(USER, {cocktail: defaults["cocktails"][cocktail]})
+    out += _edits(client, catalog_of, ingredient, other, cocktail, "personal copies hiding shipped entries")
+    _clear()
+    return out
+
+
+def main(argv=None):
+    global _clear
+    ap = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    ap.add_argument("--fake", action="store_true", help="run against the in-process fake store")
+    opts = ap.parse_args(argv)
+    if opts.fake:
+        from bench import fakestore
+        fakestore.install()
+        _clear = lambda: [fakestore._rows.pop(k) for k in list(fakestore._rows) if k[0] == USER]
+    elif not os.environ.get("DATABASE_URL"):
+        ap.error("needs DATABASE_URL (or --fake)")
+    else:
+        store.migrate()
+
+    failed = 0
+    for what, passed in checks() + round_trip():
+        print(f"  {'ok  ' if passed else 'FAIL'}  {what}")
+        failed += not passed
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,126 @@
+"""
+Deterministic synthetic catalogs and settings for benchmarks.
+
+synthetic(n_ingredients, n_cocktails, seed) builds a catalog shaped like
+data/catalog.json (spirits, beer, wine, mixers, snacks, extras, some
+multi-format products) and settings whose menu uses all of it, with every
+percentage level summing to 100%. The same arguments always give the same
+data, so results can be pinned in golden.json.
+"""
+import json, os, random
+
+DATA = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "data")
+
+# Share of ingredients per type; the rest are mixers
+TYPE_MIX = [("spirit", 0.25), ("beer", 0.08), ("wine", 0.08), ("snack", 0.08), ("extra", 0.04)]
+
+MAX_EXTRAS = 20
+
+# name → (ingredients, cocktails); "shipped" is data/ as is
+SCALES = {
+    "shipped": None,
+    "small":   (100, 150),
+    "medium":  (1000, 1500),
+    "large":   (4000, 6000),
+}
+
+
+def _split(rng, names):
+    """Random shares over names, summing to 1."""
+    weights = [rng.uniform(0.2, 1.0) for _ in names]
+    total   = sum(weights)
+    return {n: w / total for n, w in zip(names, weights)}
+
+
+def _price(rng, lo, hi):
+    price_min = round(rng.uniform(lo, hi), 2)
+    return price_min, round(price_min * rng.uniform(1.0, 1.5), 2)
+
+
+def _ingredient(rng, kind):
+    if kind in ("spirit", "beer", "wine", "mixer"):
+        volume, abv, price = {
+            "spirit": (rng.choice([500, 700, 1000]), rng.uniform(0.15, 0.45), (5, 30)),
+            "beer":   (rng.choice([330, 500, 660]),  rng.uniform(0.04, 0.08), (0.6, 2.5)),
+            "wine":   (750,                          rng.uniform(0.10, 0.15), (2, 12)),
+            "mixer":  (rng.choice([250, 1000, 1500]), 0,                      (0.3, 2)),
+        }[kind]
+        price_min, price_max = _price(rng, *price)
+        ing = {"type": kind, "abv": round(abv, 3), "volume_ml": volume,
+               "price_min": price_min, "price_max": price_max}
+        if rng.random() < 0.15:
+            # A case of six alongside the single bottle, a little cheaper per ml
+            ing["formats"] = [
+                {"name": "single", "size": volume, "price_min": price_min, "price_max": price_max},
+                {"name": "case of 6", "size": volume * 6,
+                 "price_min": round(price_min * 5.4, 2), "price_max": round(price_max * 5.4, 2)},
+            ]
+        return ing
+    price_min, price_max = _price(rng, 0.05, 3)
+    return {"type": kind, "abv": 0, "volume_ml": None, "unit": rng.choice(["pcs", "kg"]),
+            "price_min": price_min, "price_max": price_max}
+
+
+def synthetic(n_ingredients, n_cocktails, seed=0):
+    """(settings, catalog) with about n_ingredients ingredients and n_cocktails cocktails."""
+    rng   = random.Random(seed)
+    kinds = {}
+    for kind, share in TYPE_MIX:
+        kinds[kind] = [f"{kind.title()} {i:05d}" for i in range(max(1, round(n_ingredients * share)))]
+    used = sum(len(v) for v in kinds.values())
+    kinds["mixer"] = [f"Mixer {i:05d}" for i in range(max(1, n_ingredients - used))]
+    kinds["extra"].insert(0, "Ice kg")
+
+    ingredients = {name: _ingredient(rng, kind) for kind, names in kinds.items() for name in names}
+    ingredients["Ice kg"].update(unit="kg", volume_ml=None)
+
+    cocktails = {}
+    for i in range(n_cocktails):
+        spirit = rng.choice(kinds["spirit"])
+        recipe = {spirit: {"quantity": rng.choice([25, 40, 50, 60]), "unit": "ml"}}
+        for mixer in rng.sample(kinds["mixer"], min(len(kinds["mixer"]), rng.randint(0, 2))):
+            recipe[mixer] = {"quantity": rng.choice([100, 150, 200]), "unit": "ml"}
+        if rng.random() < 0.4:
+            recipe["Ice kg"] = {"quantity": 0.1, "unit": "kg"}
+        cocktails[f"Cocktail {i:05d}"] = {"main_spirit": spirit,
+                                          "category": rng.choice(["Spirits", "Shots"]),
+                                          "recipe": recipe}
+
+    # Menu: every beer, wine and spirit; each spirit pours the cocktails built on it
+    by_category = {}
+    for name, ck in cocktails.items():
+        by_category.setdefault(ck["category"], {}).setdefault(ck["main_spirit"], []).append(name)
+    macro = _split(rng, ["Beer", "Wine", *sorted(by_category)])
+    menu  = {cat: {"macro_pct": macro[cat],
+                   "spirits": {n: {"pct": p} for n, p in _split(rng, kinds[cat.lower()]).items()}}
+             for cat in ("Beer", "Wine")}
+    for cat, spirits in sorted(by_category.items()):
+        menu[cat] = {"macro_pct": macro[cat],
+                     "spirits": {s: {"pct": p, "drinks": _split(rng, spirits[s])}
+                                 for s, p in _split(rng, sorted(spirits)).items()}}
+
+    # A real menu puts out a handful of snacks, not every one in the catalog
+    extras = {name: {"qty_per_person": round(rng.uniform(0.01, 0.5), 3)}
+              for name in (kinds["snack"] + kinds["extra"][1:])[:MAX_EXTRAS]}
+    for name in list(extras)[::3]:
+        extras[name]["min_qty"] = rng.randint(1, 20)
+
+    # Enough guests that every bottle on the menu gets opened
+    settings = {"guests": max(200, n_ingredients * 2), "ticket_price": 25,
+                "venue_cost": 500, "equipment_cost": 500, "alcohol_ml_per_person": 75,
+                "buffer": 1.1, "extras": extras, "menu": menu}
+    return settings, {"ingredients": ingredients, "cocktails": cocktails}
+
+
+def shipped():
+    """(settings, catalog) from data/."""
+    with open(os.path.join(DATA, "settings.json"), encoding="utf-8") as f:
+        settings = json.load(f)
+    with open(os.path.join(DATA, "catalog.json"), encoding="utf-8") as f:
+        catalog = json.load(f)
+    return settings, catalog
+
+
+def scale(name, seed=0):
+    size = SCALES[name]
+    return shipped() if size is None else synthetic(*size, seed=seed)
@@ -0,0 +1,205 @@
+"""
+Streaming catalog import/export.
+
+Both directions share one row schema, so an export can be edited and
+imported back. A row is an ingredient, a price update for an existing
+ingredient, or a cocktail:
+
+    kind        "ingredient" | "price" | "cocktail" (inferred when empty)
+    name        required
+    type, abv, volume_ml, unit, price_min, price_max, formats    ingredients
+    price_min, price_max                                         prices
+    main_spirit, category, recipe                                cocktails
+
+Rows that repeat a shipped entry are skipped on import, and rows that only
+change a shipped ingredient's prices become price updates.
+
+In CSV, `formats` and `recipe` cells hold JSON. No I/O here: readers take
+an iterable of text lines, writers yield text chunks.
+"""
+import csv, io, json
+
+FIELDS           = ["kind", "name", "type", "abv", "volume_ml", "unit", "price_min", "price_max",
+                    "formats", "main_spirit", "category", "recipe"]
+INGREDIENT_TYPES = {"spirit", "beer", "wine", "mixer", "snack", "extra"}
+FORMATS          = {"csv": "text/csv", "ndjson": "application/x-ndjson"}
+
+
+# ── Reading ────────────────────────────────────────────────────
+
+def read_rows(lines, fmt):
+    """
+    Yields (line number, row) from text lines. A line that cannot be decoded
+    yields (line number, ValueError) and reading continues.
+    """
+    if fmt == "csv":
+        reader = csv.DictReader(lines)
+        try:
+            for row in reader:
+                yield reader.line_num, {k: v for k, v in row.items() if k and v not in (None, "")}
+        except csv.Error as e:
+            yield reader.line_num, ValueError(f"CSV: {e}")
+        return
+    for n, line in enumerate(lines, 1):
+        if not line.strip():
+            continue
+        try:
+            row = json.loads(line)
+        except ValueError as e:
+            yield n, ValueError(f"JSON: {e}")
+            continue
+        yield n, row if isinstance(row, dict) else ValueError("JSON: expected an object")
+
+
+def _number(row, key, default=None, lo=0.0, hi=None):
+    value = row.get(key, default)
+    if value is None:
+        raise ValueError(f"{key} is required")
+    try:
+        value = float(value)
+    except (TypeError, ValueError):
+        raise ValueError(f"{key} must be a number") from None
+    if value != value or value < lo or (hi is not None and value > hi):
+        raise ValueError(f"{key} out of range")
+    return value
+
+
+def _json_cell(row, key):
+    value = row.get(key)
+    if isinstance(value, str):
+        try:
+            return json.loads(value)
+        except ValueError:
+            raise ValueError(f"{key} must be JSON") from None
+    return value
+
+
+def _prices(row):
+    price_min, price_max = _number(row, "price_min"), _number(row, "price_max")
+    if price_min > price_max:
+        raise ValueError("price_min exceeds price_max")
+    return price_min, price_max
+
+
+def _formats(row):
+    formats = _json_cell(row, "formats")
+    if formats is None:
+        return None
+    if not isinstance(formats, list):
+        raise ValueError("formats must be a list")
+    out = []
+    for f in formats:
+        if not isinstance(f, dict) or not f.get("name"):
+            raise ValueError("each format needs a name")
+        price_min, price_max = _prices(f)
+        out.append({"name": str(f["name"]), "size": _number(f, "size", lo=1e-9),
+                    "price_min": price_min, "price_max": price_max})
+    return out
+
+
+def parse_row(row, ingredients, shipped=None):
+    """
+    Validates one raw row against the known ingredient names and returns
+    (kind, name, data); raises ValueError with a readable message.
+    Price rows return (price_min, price_max) as data.
+
+    `shipped` holds the shipped entries still in the user's catalog
+    ({"ingredients": ..., "cocktails": ...}). A row that repeats one of them
+    (as an export does) comes back as ("unchanged", name, None), and an
+    ingredient row that only changes its prices as a price row, so imports
+    never copy shipped entries into personal ones that would hide them.
+    """
+    kind, name, data = _parse_row(row, ingredients)
+    entry = (shipped or {}).get(kind + "s", {}).get(name)
+    if entry is None:
+        return kind, name, data
+    try:
+        _, _, base = _parse_row({**entry, "kind": kind, "name": name}, ingredients)
+    except ValueError:
+        return kind, name, data
+    if data == base:
+        return "unchanged", name, None
+    if kind == "ingredient" and {**data, "price_min": base["price_min"], "price_max": base["price_max"]} == base:
+        return "price", name, (data["price_min"], data["price_max"])
+    return kind, name, data
+
+
+def _parse_row(row, ingredients):
+    name = str(row.get("name", "")).strip()
+    if not name:
+        raise ValueError("name is required")
+    kind = row.get("kind") or ("cocktail" if "recipe" in row else
+                               "ingredient" if "type" in row else "price")
+
+    if kind == "price":
+        if name not in ingredients:
+            raise ValueError(f"unknown ingredient: {name}")
+        return kind, name, _prices(row)
+
+    if kind == "ingredient":
+        if row.get("type") not in INGREDIENT_TYPES:
+            raise ValueError(f"type must be one of {', '.join(sorted(INGREDIENT_TYPES))}")
+        price_min, price_max = _prices(row)
+        volume = row.get("volume_ml")
+        data = {
+            "type":      row["type"],
+            "abv":       _number(row, "abv", 0, hi=1),
+            "volume_ml": int(_number(row, "volume_ml", lo=1)) if volume not in (None, "") else None,
+            "price_min": price_min,
+            "price_max": price_max,
+        }
+        if row.get("unit"):
+            data["unit"] = str(row["unit"])
+        formats = _formats(row)
+        if formats:
+            data["formats"] = formats
+        return kind, name, data
+
+    if kind == "cocktail":
+        main_spirit = row.get("main_spirit")
+        if main_spirit not in ingredients:
+            raise ValueError(f"unknown main_spirit: {main_spirit}")
+        recipe = _json_cell(row, "recipe")
+        if not isinstance(recipe, dict) or not recipe:
+            raise ValueError("recipe must be a non-empty object")
+        clean = {}
+        for ing, det in recipe.items():
+            if ing not in ingredients:
+                raise ValueError(f"unknown recipe ingredient: {ing}")
+            if not isinstance(det, dict):
+                raise ValueError(f"recipe entry for {ing} must be an object")
+            clean[ing] = {"quantity": _number(det, "quantity"), "unit": str(det.get("unit", "ml"))}
+        return kind, name, {"main_spirit": main_spirit,
+                            "category":    str(row.get("category") or "Spirits"),
+                            "recipe":      clean}
+
+    raise ValueError(f"unknown kind: {kind}")
+
+
+# ── Writing ────────────────────────────────────────────────────
+
+def _export_rows(catalog):
+    for name, ing in catalog["ingredients"].items():
+        yield {"kind": "ingredient", "name": name, **ing}
+    for name, ck in catalog["cocktails"].items():
+        yield {"kind": "cocktail", "name": name, **ck}
+
+
+def export_rows(catalog, fmt):
+    """Yields the catalog as CSV or NDJSON text, one row at a time."""
+    if fmt == "csv":
+        buf    = io.StringIO()
+        writer = csv.DictWriter(buf, FIELDS, extrasaction="ignore")
+        writer.writeheader()
+        for row in _export_rows(catalog):
+            yield buf.getvalue()
+            buf.seek(0)
+            buf.truncate()
+            for key in ("formats", "recipe"):
+                if key in row:
+                    row[key] = json.dumps(row[key], ensure_ascii=False)
+            writer.writerow(row)
+        yield buf.getvalue()
+        return
+    for row in _export_rows(catalog):
+        yield json.dumps(row, ensure_ascii=False) + "\n"
@@ -8,7 +8,15 @@ Category types:
   "Beer"    → 2-level: category → ingredient (served as-is, no cocktail needed)
   "Wine"    → 2-level: category → ingredient (served as-is, no cocktail needed)
 """
+import atexit
+import hashlib
+import json
 import math
+import os
+import sys
+import threading
+from array import array
+from collections import OrderedDict, deque
 
 ALCOHOL_LEVELS = {
     25:  "🌿 Soft",
@@ -21,134 +29,111 @@ ALCOHOL_LEVELS = {
 SIMPLE_CATEGORIES = {"Beer", "Wine"}
 
 
-def calculate(settings, catalog):
+def calculate(settings, catalog, catalog_digest=None):
     n             = settings["guests"]
     alcohol_ml    = settings["alcohol_ml_per_person"]
     buffer        = settings["buffer"]
-    menu          = settings["menu"]
-    ingredients   = catalog["ingredients"]
-    cocktails     = catalog["cocktails"]
+    model         = catalog_model(catalog, catalog_digest)
+    ingredients   = model.ingredients
 
     total_alcohol = n * alcohol_ml  # ml of pure alcohol total
 
-    volume_total = {}  # ingredient_name → total ml (or kg)
+    volume_total = {}  # ingredient id → total ml (or kg)
 
-    for category, cat_data in menu.items():
-        macro_pct   = cat_data["macro_pct"]
-        cat_alcohol = total_alcohol * macro_pct
+    for category in parse_menu(settings["menu"]).categories:
+        cat_alcohol = total_alcohol * category.macro_pct
 
-        if category in SIMPLE_CATEGORIES:
+        if category.simple:
             # ── Simple category: each spirit IS the drink ──────────────
-            for ing_name, spirit_data in cat_data["spirits"].items():
-                spirit_pct     = spirit_data["pct"]
+            for ing_name, spirit_pct, _ in category.spirits:
                 spirit_alcohol = cat_alcohol * spirit_pct
 
-                ing = ingredients.get(ing_name)
-                if not ing:
+                ing = model.get(ing_name)
+                if ing is None:
                     continue
-                abv = ing.get("abv", 0)
+                abv = ing.abv or 0
                 if abv <= 0:
                     continue
 
                 # volume of this ingredient needed = pure_alcohol / ABV
                 vol_ml = spirit_alcohol / abv
-                volume_total[ing_name] = volume_total.get(ing_name, 0) + vol_ml
+                volume_total[ing.id] = volume_total.get(ing.id, 0) + vol_ml
 
         else:
             # ── Spirits category: 3-level with cocktail recipes ────────
-            for spirit_name, spirit_data in cat_data["spirits"].items():
-                spirit_pct    = spirit_data["pct"]
+            for spirit_name, spirit_pct, drinks in category.spirits:
                 spirit_alcohol = cat_alcohol * spirit_pct
 
-                ing = ingredients.get(spirit_name)
-                if not ing:
+                ing = model.get(spirit_name)
+                if ing is None:
                     continue
-                abv = ing.get("abv", 0)
+                abv = ing.abv if ing.abv is not None else 0
 
-                for drink_name, drink_pct in spirit_data.get("drinks", {}).items():
+                for drink_name, drink_pct in drinks:
                     drink_alcohol = spirit_alcohol * drink_pct
 
-                    ck = cocktails.get(drink_name)
-                    if not ck:
+                    ck = model.cocktails.get(drink_name)
+                    if ck is None:
                         continue
 
-                    main_spirit   = ck["main_spirit"]
-                    recipe        = ck["recipe"]
-
-                    spirit_recipe     = recipe.get(main_spirit, {})
-                    ml_per_serve      = spirit_recipe.get("quantity", 0)
-                    spirit_abv        = ingredients.get(main_spirit, {}).get("abv", abv)
-
-                    alcohol_per_serve = ml_per_serve * spirit_abv
+                    main              = ingredients[ck.main_spirit]
+                    spirit_abv        = main.abv if main is not None and main.abv is not None else abv
+                    alcohol_per_serve = ck.main_ml * spirit_abv
                     if alcohol_per_serve <= 0:
                         continue
 
                     servings = drink_alcohol / alcohol_per_serve
 
-                    for ing_name, ing_recipe in recipe.items():
-                        qty = ing_recipe["quantity"] * servings
-                        volume_total[ing_name] = volume_total.get(ing_name, 0) + qty
+                    for ing_id, quantity in ck.recipe:
+                        volume_total[ing_id] = volume_total.get(ing_id, 0) + quantity * servings
 
     # Fixed per-person items (snacks, cups, etc.)
-    extras = settings.get("extras", {})
-    for item_name, cfg in extras.items():
-        qpp  = cfg.get("qty_per_person", 0)
-        minq = cfg.get("min_qty", 0)
-        volume_total[item_name] = max(minq, qpp * n)
+    for item_name, cfg in settings.get("extras", {}).items():
+        i = model.ids.get(item_name)
+        if i is not None:
+            volume_total[i] = max(cfg.get("min_qty", 0), cfg.get("qty_per_person", 0) * n)
 
     # Convert to purchasable units
     shopping_list = []
-    for ing_name, vol_total in volume_total.items():
-        ing = ingredients.get(ing_name)
-        if not ing:
+    for ing_id, vol_total in volume_total.items():
+        ing = ingredients[ing_id]
+        if ing is None:
             continue
 
-        bottle_ml = ing.get("volume_ml")
-        item_type = ing.get("type", "extra")
-        unit      = ing.get("unit", "pcs")
+        if ing.formats:
+            # Several purchasable formats: cheapest mix covering the need
+            quantity, cost_min, cost_max, packs = buy_packs(ing.formats, vol_total * buffer)
+            shopping_list.append({
+                "name":     ing.name,
+                "type":     ing.type,
+                "quantity": quantity,
+                "unit":     "packs",
+                "cost_min": cost_min,
+                "cost_max": cost_max,
+                "packs":    packs,
+            })
+            continue
 
-        if bottle_ml and bottle_ml > 0:
-            quantity     = math.ceil((vol_total * buffer) / bottle_ml)
-            display_unit = "btl." if bottle_ml >= 250 else "can"
+        if ing.bottle_ml:
+            quantity     = math.ceil((vol_total * buffer) / ing.bottle_ml)
+            display_unit = "btl." if ing.bottle_ml >= 250 else "can"
         else:
             quantity     = math.ceil(vol_total * buffer)
-            display_unit = unit
-
-        cost_min = round(quantity * ing["price_min"], 2)
-        cost_max = round(quantity * ing["price_max"], 2)
+            display_unit = ing.unit
 
         shopping_list.append({
-            "name":     ing_name,
-            "type":     item_type,
+            "name":     ing.name,
+            "type":     ing.type,
             "quantity": quantity,
             "unit":     display_unit,
-            "cost_min": cost_min,
-            "cost_max": cost_max,
+            "cost_min": round(quantity * ing.price_min, 2),
+            "cost_max": round(quantity * ing.price_max, 2),
         })
 
     shopping_list.sort(key=lambda x: (x["type"], x["name"]))
 
-    total_min   = sum(r["cost_min"] for r in shopping_list)
-    total_max   = sum(r["cost_max"] for r in shopping_list)
-    fixed_costs = settings["venue_cost"] + settings["equipment_cost"]
-    revenue     = n * settings["ticket_price"]
-    profit_min  = revenue - total_max - fixed_costs
-    profit_max  = revenue - total_min - fixed_costs
-
-    avg_var_cost = (total_min + total_max) / 2 / n if n > 0 else 0
-    margin       = settings["ticket_price"] - avg_var_cost
-    break_even   = math.ceil(fixed_costs / margin) if margin > 0 else None
-
-    return {
-        "shopping_list": shopping_list,
-        "total_min":     round(total_min, 2),
-        "total_max":     round(total_max, 2),
-        "fixed_costs":   fixed_costs,
-        "revenue":       revenue,
-        "profit_min":    round(profit_min, 2),
-        "profit_max":    round(profit_max, 2),
-        "break_even":    break_even,
-    }
+    return _summarize(shopping_list, n, settings["ticket_price"],
+                      settings["venue_cost"], settings["equipment_cost"])
 
 
 def validate_menu(menu):
@@ -156,26 +141,1274 @@ def validate_menu(menu):
     Returns a list of validation errors for the percentage tree.
     Beer/Wine: validate macro + spirit sums only (no drinks level).
     Spirits:   validate all three levels.
-    Empty list = all good.
+    Empty list = all good. A by-product of parse_menu().
+    """
+    return parse_menu(menu).errors
+
+
+# ── Typed model ────────────────────────────────────────────────
+# Catalog and menu JSON parsed once into slotted objects. Ingredient names
+# are interned and numbered, and recipes hold (id, quantity) pairs, so
+# compiling a plan walks tuples rather than nested dicts. Numbers are kept
+# as given (ints stay ints), which keeps results identical to the JSON.
+# Checks happen while parsing: a malformed catalog entry raises ValueError,
+# and a menu carries its percentage errors.
+
+MODEL_CACHE_SIZE = 64
+
+_models      = OrderedDict()   # catalog digest → CatalogModel
+_models_lock = threading.Lock()
+_NUMBER = (int, float)    # exact types: bools are not quantities
+
+
+class Ingredient:
+    __slots__ = ("id", "name", "type", "abv", "bottle_ml", "unit", "price_min", "price_max", "formats")
+
+    def __init__(self, id, name, data):
+        abv, volume = data.get("abv"), data.get("volume_ml")
+        self.id        = id
+        self.name      = name
+        self.type      = sys.intern(data.get("type", "extra"))
+        self.abv       = abv                    # None when the entry has no abv
+        self.bottle_ml = volume if volume and volume > 0 else None
+        self.unit      = sys.intern(data.get("unit", "pcs"))
+        self.price_min = data.get("price_min")
+        self.price_max = data.get("price_max")
+        self.formats   = pack_formats(data) if "formats" in data else ()
+        if (type(self.price_min) not in _NUMBER or type(self.price_max) not in _NUMBER
+                or abv is not None and type(abv) not in _NUMBER):
+            raise ValueError(f"ingredient {name}: price_min, price_max and abv must be numbers")
+
+
+class Cocktail:
+    __slots__ = ("name", "main_spirit", "main_ml", "recipe")
+
+    def __init__(self, name, data, ids):
+        recipe, main = data.get("recipe"), data.get("main_spirit")
+        if type(recipe) is not dict or main is None:
+            raise ValueError(f"cocktail {name}: needs a main_spirit and a recipe")
+        items = []
+        for ing_name, det in recipe.items():
+            quantity = det.get("quantity")
+            if type(quantity) not in _NUMBER:
+                raise ValueError(f"cocktail {name}: quantity of {ing_name} must be a number")
+            i = ids.get(ing_name)
+            if i is None:
+                i = ids[sys.intern(ing_name)] = len(ids)
+            items.append((i, quantity))
+        self.name        = name
+        self.main_spirit = ids.setdefault(sys.intern(main), len(ids))
+        self.main_ml     = recipe.get(main, {}).get("quantity", 0)
+        self.recipe      = tuple(items)
+
+
+class CatalogModel:
+    """
+    ids          — interned name → id, for catalog ingredients and names
+                   recipes use without a catalog entry
+    names        — those names by id
+    ingredients  — Ingredient (or None for those unknown names) by id
+    cocktails    — name → Cocktail
     """
+    __slots__ = ("ids", "names", "ingredients", "cocktails")
+
+    def __init__(self, catalog):
+        ids = {sys.intern(name): i for i, name in enumerate(catalog["ingredients"])}
+        self.ingredients = [Ingredient(i, name, data) for name, i, data
+                            in zip(ids, range(len(ids)), catalog["ingredients"].values())]
+        self.cocktails   = {name: Cocktail(name, data, ids) for name, data in catalog["cocktails"].items()}
+        self.ingredients += [None] * (len(ids) - len(self.ingredients))
+        self.ids         = ids
+        self.names       = tuple(ids)
+
+    def get(self, name):
+        i = self.ids.get(name)
+        return self.ingredients[i] if i is not None else None
+
+
+class MenuCategory:
+    __slots__ = ("name", "macro_pct", "simple", "spirits")   # spirits: ((name, pct, ((drink, pct), ...)), ...)
+
+    def __init__(self, name, macro_pct, simple, spirits):
+        self.name, self.macro_pct, self.simple, self.spirits = name, macro_pct, simple, spirits
+
+
+class Menu:
+    __slots__ = ("categories", "errors")
+
+    def __init__(self, categories, errors):
+        self.categories, self.errors = categories, errors
+
+
+def parse_menu(menu):
+    """The menu tree as a Menu; its `errors` are what validate_menu() reports."""
     errors = []
     macro_sum = sum(v["macro_pct"] for v in menu.values())
     if abs(macro_sum - 1.0) > 0.01:
         errors.append(f"Macro categories sum = {macro_sum*100:.1f}% (must be 100%)")
 
+    categories = []
     for cat, cat_data in menu.items():
         spirits     = cat_data.get("spirits", {})
         spirits_sum = sum(v["pct"] for v in spirits.values())
         if abs(spirits_sum - 1.0) > 0.01:
             errors.append(f"[{cat}] Spirits sum = {spirits_sum*100:.1f}% (must be 100%)")
 
-        if cat not in SIMPLE_CATEGORIES:
+        simple = cat in SIMPLE_CATEGORIES
+        if simple:
+            parsed = tuple((spirit, spirit_data["pct"], ()) for spirit, spirit_data in spirits.items())
+        else:
             # Only Spirits categories need drink-level validation
+            parsed = []
             for spirit, spirit_data in spirits.items():
-                drinks_sum = sum(spirit_data.get("drinks", {}).values())
+                drinks     = spirit_data.get("drinks", {})
+                drinks_sum = sum(drinks.values())
                 if abs(drinks_sum - 1.0) > 0.01:
                     errors.append(
                         f"[{cat} → {spirit}] Drinks sum = {drinks_sum*100:.1f}% (must be 100%)"
                     )
+                parsed.append((spirit, spirit_data["pct"], tuple(drinks.items())))
+
+        categories.append(MenuCategory(cat, cat_data["macro_pct"], simple, tuple(parsed)))
+
+    return Menu(tuple(categories), errors)
+
+
+def catalog_model(catalog, catalog_digest=None):
+    """CatalogModel of a catalog; memoized when its digest is known. Shared, do not mutate."""
+    if catalog_digest is None:
+        return CatalogModel(catalog)
+    with _models_lock:
+        model = _models.get(catalog_digest)
+        if model is not None:
+            _models.move_to_end(catalog_digest)
+            return model
+    # Parsed outside the lock; a thread that got there first wins
+    model = CatalogModel(catalog)
+    with _models_lock:
+        model = _models.setdefault(catalog_digest, model)
+        _models.move_to_end(catalog_digest)
+        while len(_models) > MODEL_CACHE_SIZE:
+            _models.popitem(last=False)
+    return model
+
+
+# ── Purchase formats ───────────────────────────────────────────
+# An ingredient may list several purchasable formats of the same product:
+#   "formats": [{"name": "70cl", "size": 700, "price_min": 9, "price_max": 13},
+#               {"name": "6 × 1L", "size": 6000, ...}]
+# "size" is in the ingredient's base unit (ml for drinks, units/kg otherwise).
+# The cheapest mix (by mid price) covering the required amount is a min-cost
+# cover problem, solved with an unbounded-knapsack DP over multiples of the
+# sizes' common grain. An optimal mix never holds more than
+# best_size/grain packs of formats other than the best-value one (pigeonhole
+# on partial sums), so the table stops at that bound and larger needs are
+# reduced by whole packs of the best-value format first.
+
+PACK_TABLE_MAX   = 20_000      # DP cells per product; larger mixes fill greedily above it
+PACK_CACHE_CELLS = 2_000_000   # DP cells across all cached products, 8 bytes × (2 + formats) each
+
+_pack_tables = OrderedDict()  # formats tuple → DP table; published tables are never changed
+_pack_cells  = 0              # cells held by _pack_tables
+_pack_lock   = threading.Lock()
+
+
+def pack_formats(ing):
+    """Normalized formats of a catalog ingredient: tuple of (name, size, min €, max €)."""
+    return tuple((f["name"], f["size"], f["price_min"], f["price_max"])
+                 for f in ing.get("formats") or () if f.get("size", 0) > 0)
+
+
+def _pack_table(formats, upto):
+    """DP table for a product, grown on demand to cover `upto` grains (or its bound)."""
+    with _pack_lock:
+        table = _pack_tables.get(formats)
+        if table is not None:
+            _pack_tables.move_to_end(formats)
+    if table is None:
+        scaled = [round(size * 1000) for _, size, _, _ in formats]
+        grain  = math.gcd(*scaled)
+        units  = [u // grain for u in scaled]
+        value  = [pmin + pmax for _, _, pmin, pmax in formats]
+        best   = min(range(len(formats)), key=lambda f: (value[f] / units[f], -units[f]))
+        table  = {
+            "grain":  grain / 1000,
+            "units":  units,
+            "value":  value,
+            "best":   best,
+            "limit":  min(units[best] * max(units) + units[best], PACK_TABLE_MAX),
+            # Flat arrays, cell u at [u] (and [u * formats:] for counts):
+            "cost":   array("d", [0]),                  # cheapest cost holding >= u grains
+            "packs":  array("q", [0]),                  # packs in that mix (the tie-break)
+            "counts": array("q", [0] * len(formats)),   # the mix achieving it
+        }
+    elif min(upto, table["limit"]) < len(table["cost"]):
+        return table
+    return _publish_pack_table(formats, _grow_pack_table(table, min(upto, table["limit"])))
+
+
+def _grow_pack_table(table, upto):
+    """A copy of `table` extended to cell `upto`; threads may be reading the original."""
+    cost, packs, counts = array("d", table["cost"]), array("q", table["packs"]), array("q", table["counts"])
+    width = len(table["units"])
+    for u in range(len(cost), upto + 1):
+        options = []
+        for f, size in enumerate(table["units"]):
+            prev = max(0, u - size)
+            options.append((cost[prev] + table["value"][f], packs[prev] + 1, f, prev))
+        best_cost, n, f, prev = min(options)
+        cost.append(best_cost)
+        packs.append(n)
+        counts.extend(counts[prev * width:(prev + 1) * width])
+        counts[u * width + f] += 1
+    return {**table, "cost": cost, "packs": packs, "counts": counts}
+
+
+def _publish_pack_table(formats, table):
+    global _pack_cells
+    with _pack_lock:
+        current = _pack_tables.get(formats)
+        if current is not None and len(current["cost"]) >= len(table["cost"]):
+            return current   # another thread grew it at least as far
+        _pack_cells += len(table["cost"]) - (len(current["cost"]) if current is not None else 0)
+        _pack_tables[formats] = table
+        _pack_tables.move_to_end(formats)
+        # Least recently used products go first; the one in use always stays
+        while _pack_cells > PACK_CACHE_CELLS and len(_pack_tables) > 1:
+            _, dropped = _pack_tables.popitem(last=False)
+            _pack_cells -= len(dropped["cost"])
+    return table
+
+
+def _pack_costs(formats, counts):
+    cost_min = cost_max = 0
+    for (_, _, pmin, pmax), count in zip(formats, counts):
+        cost_min = cost_min + round(count * pmin, 2)
+        cost_max = cost_max + round(count * pmax, 2)
+    return round(cost_min, 2), round(cost_max, 2)
+
+
+def buy_packs(formats, need):
+    """Cheapest mix covering `need` → (total packs, cost_min, cost_max, breakdown)."""
+    table = _pack_table(formats, 0)
+    u     = max(math.ceil(need / table["grain"]), 0)
+    table = _pack_table(formats, u)
+    extra = 0
+    if u > table["limit"]:
+        step  = table["units"][table["best"]]
+        extra = math.ceil((u - table["limit"]) / step)
+        u    -= extra * step
+    width  = len(formats)
+    counts = table["counts"][u * width:(u + 1) * width].tolist()
+    counts[table["best"]] += extra
+
+    cost_min, cost_max = _pack_costs(formats, counts)
+    packs = [{"format": name, "count": count}
+             for (name, _, _, _), count in zip(formats, counts) if count]
+    return sum(counts), cost_min, cost_max, packs
+
+
+def _buy_packs_vec(np, formats, need):
+    """buy_packs() over an array of needs → (total packs, cost_min, cost_max) arrays."""
+    table  = _pack_table(formats, 0)
+    u      = np.maximum(np.ceil(need / table["grain"]), 0).astype(np.int64)
+    table  = _pack_table(formats, int(u.max(initial=0)))
+    step   = table["units"][table["best"]]
+    extra  = np.where(u > table["limit"], -((table["limit"] - u) // step), 0)
+    # Fancy indexing copies, so the buffer view is released and the table can grow again
+    counts = np.frombuffer(table["counts"], dtype=np.int64).reshape(-1, len(formats))[u - extra * step]
+    counts[:, table["best"]] += extra
+
+    cost_min = np.zeros(len(u))
+    cost_max = np.zeros(len(u))
+    for f, (_, _, pmin, pmax) in enumerate(formats):
+        cost_min = cost_min + _round2(np, counts[:, f] * pmin)
+        cost_max = cost_max + _round2(np, counts[:, f] * pmax)
+    return counts.sum(axis=1), _round2(np, cost_min), _round2(np, cost_max)
+
+
+def _purchase(ing, need):
+    """Plan row + required amount → (quantity, cost_min, cost_max, packs or None)."""
+    if ing["formats"]:
+        return buy_packs(ing["formats"], need)
+    if ing["bottle_ml"]:
+        quantity = math.ceil(need / ing["bottle_ml"])
+    else:
+        quantity = math.ceil(need)
+    return (quantity, round(quantity * ing["price_min"], 2),
+            round(quantity * ing["price_max"], 2), None)
+
+
+def _purchase_vec(np, ing, need):
+    """_purchase() over an array of needs → (quantity, cost_min, cost_max) arrays."""
+    if ing["formats"]:
+        return _buy_packs_vec(np, ing["formats"], need)
+    quantity = np.ceil(need / ing["bottle_ml"] if ing["bottle_ml"] else need)
+    return (quantity.astype(np.int64), _round2(np, quantity * ing["price_min"]),
+            _round2(np, quantity * ing["price_max"]))
+
+
+# ── Compiled plans ─────────────────────────────────────────────
+# For a fixed menu and catalog, every ingredient volume in calculate() is a
+# sum of terms of the form  mult * ((((T * macro) * spirit) * drink) / div)
+# with T = guests * alcohol_ml. compile_plan() walks the menu tree once and
+# flattens it into those terms; evaluate() then only does arithmetic.
+# The terms keep calculate()'s exact operation order (multiplying by 1.0 is
+# exact), so results are bit-for-bit identical, ceil() boundaries included.
+
+PLAN_CACHE_SIZE = 128
+
+_plan_cache = OrderedDict()   # content hash → compiled plan
+_plan_stats = {"hits": 0, "misses": 0}
+_plan_lock  = threading.Lock()   # guards both; compiling happens outside it
+
+
+def compile_plan(settings, catalog, model=None):
+    """
+    Flattens menu + catalog into a plan:
+      rows    — one per shopping-list line, already in shopping-list order
+      terms   — [row, macro_pct, spirit_pct, drink_pct, divisor, multiplier]
+      sources — per term: [cocktail, menu spirit, main spirit, ml per serve, menu spirit ABV]
+      extras  — [row, qty_per_person, min_qty]
+      index   — dependency index, see build_index()
+    `model` is the catalog's CatalogModel when the caller has one cached.
+    """
+    model       = model or CatalogModel(catalog)
+    ingredients = model.ingredients
+
+    terms   = []   # [ingredient id, macro, spirit, drink, divisor, mult]
+    sources = []   # what each term was derived from, for apply_change()
+
+    for category in parse_menu(settings["menu"]).categories:
+        macro_pct = category.macro_pct
+
+        if category.simple:
+            for ing_name, spirit_pct, _ in category.spirits:
+                ing = model.get(ing_name)
+                if ing is None:
+                    continue
+                abv = ing.abv or 0
+                if abv <= 0:
+                    continue
+                terms.append([ing.id, macro_pct, spirit_pct, 1.0, abv, 1.0])
+                sources.append([None, ing_name, None, None, abv])
+
+        else:
+            for spirit_name, spirit_pct, drinks in category.spirits:
+                ing = model.get(spirit_name)
+                if ing is None:
+                    continue
+                abv = ing.abv if ing.abv is not None else 0
+
+                for drink_name, drink_pct in drinks:
+                    ck = model.cocktails.get(drink_name)
+                    if ck is None:
+                        continue
+
+                    main = ingredients[ck.main_spirit]
+                    spirit_abv        = main.abv if main is not None and main.abv is not None else abv
+                    alcohol_per_serve = ck.main_ml * spirit_abv
+                    if alcohol_per_serve <= 0:
+                        continue
+
+                    main_name = model.names[ck.main_spirit]
+                    for ing_id, quantity in ck.recipe:
+                        terms.append([ing_id, macro_pct, spirit_pct, drink_pct,
+                                      alcohol_per_serve, quantity])
+                        sources.append([drink_name, spirit_name, main_name, ck.main_ml, abv])
+
+    extras = {}
+    for item_name, cfg in settings.get("extras", {}).items():
+        i = model.ids.get(item_name)
+        if i is not None and ingredients[i] is not None:
+            extras[i] = [cfg.get("qty_per_person", 0), cfg.get("min_qty", 0)]
+
+    # Extras overwrite whatever the menu contributed; unknown names are dropped
+    used = [ingredients[i] for i in {t[0] for t in terms} | set(extras) if ingredients[i] is not None]
+    used.sort(key=lambda ing: (ing.type, ing.name))
+    index = {ing.id: row for row, ing in enumerate(used)}
+
+    rows = []
+    for ing in used:
+        rows.append({
+            "name":      ing.name,
+            "type":      ing.type,
+            "unit":      "packs" if ing.formats else "btl." if ing.bottle_ml and ing.bottle_ml >= 250
+                         else "can" if ing.bottle_ml else ing.unit,
+            "bottle_ml": ing.bottle_ml,
+            "price_min": ing.price_min,
+            "price_max": ing.price_max,
+            "formats":   ing.formats or None,
+            "stock_unit": "ml" if ing.bottle_ml else ing.unit,   # what volumes count
+        })
+
+    keep = [i for i, t in enumerate(terms) if t[0] in index and t[0] not in extras]
+    plan = {
+        "rows":    rows,
+        "terms":   [[index[terms[i][0]], *terms[i][1:]] for i in keep],
+        "sources": [sources[i] for i in keep],
+        "extras":  [[index[i], qpp, minq] for i, (qpp, minq) in extras.items()],
+    }
+    plan["index"] = build_index(plan)
+    return plan
+
+
+def build_index(plan):
+    """
+    Dependency index of a plan:
+      rows        — ingredient → shopping-list row
+      cocktails   — cocktail → terms (menu entries) it produced
+      ingredients — ingredient → cocktails whose recipe uses it
+      spirits     — ingredient → terms whose serving size depends on it
+                    (as the menu spirit or the cocktail's main spirit)
+    """
+    rows = {ing["name"]: i for i, ing in enumerate(plan["rows"])}
+    index = {"rows": rows, "cocktails": {}, "ingredients": {}, "spirits": {}}
+    for i, ((row, *_), (cocktail, spirit, main_spirit, _, _)) in enumerate(
+            zip(plan["terms"], plan["sources"])):
+        if cocktail is not None:
+            index["cocktails"].setdefault(cocktail, []).append(i)
+            users = index["ingredients"].setdefault(plan["rows"][row]["name"], [])
+            if cocktail not in users:
+                users.append(cocktail)
+        index["spirits"].setdefault(spirit, []).append(i)
+        if main_spirit is not None and main_spirit != spirit:
+            index["spirits"].setdefault(main_spirit, []).append(i)
+    return index
+
+
+def plan_volumes(plan, guests, alcohol_ml):
+    """Pre-buffer volume per plan row."""
+    total_alcohol = guests * alcohol_ml
+    volumes = [0] * len(plan["rows"])
+    for row, macro, spirit, drink, div, mult in plan["terms"]:
+        volumes[row] = volumes[row] + mult * ((((total_alcohol * macro) * spirit) * drink) / div)
+    for row, qpp, minq in plan["extras"]:
+        volumes[row] = max(minq, qpp * guests)
+    return volumes
+
+
+def _plan_purchases(plan, volumes, buffer):
+    return [_purchase(ing, vol_total * buffer) for ing, vol_total in zip(plan["rows"], volumes)]
+
+
+def evaluate(plan, guests, alcohol_ml, buffer, ticket_price, venue_cost, equipment_cost):
+    """Same result as calculate() for the settings/catalog the plan was compiled from."""
+    n         = guests
+    purchases = _plan_purchases(plan, plan_volumes(plan, guests, alcohol_ml), buffer)
+
+    shopping_list = []
+    for ing, (quantity, cost_min, cost_max, packs) in zip(plan["rows"], purchases):
+        row = {
+            "name":     ing["name"],
+            "type":     ing["type"],
+            "quantity": quantity,
+            "unit":     ing["unit"],
+            "cost_min": cost_min,
+            "cost_max": cost_max,
+        }
+        if packs is not None:
+            row["packs"] = packs
+        shopping_list.append(row)
+
+    return _summarize(shopping_list, n, ticket_price, venue_cost, equipment_cost)
+
+
+def _cents(cost):
+    """A line cost (already rounded to cents) as an exact integer number of cents."""
+    return round(cost * 100)
+
+
+def _sum_cents(costs):
+    """Sum of line costs in whole cents: fsum() is correctly rounded and each cost is whole cents
+    to within far less than half a cent, so this equals the sum of each _cents()."""
+    return round(math.fsum(costs) * 100)
+
+
+def _summarize(shopping_list, n, ticket_price, venue_cost, equipment_cost):
+    cents_min = _sum_cents([r["cost_min"] for r in shopping_list])
+    cents_max = _sum_cents([r["cost_max"] for r in shopping_list])
+    return _kpis(shopping_list, cents_min, cents_max, n, ticket_price, venue_cost, equipment_cost)
+
+
+def _kpis(shopping_list, cents_min, cents_max, n, ticket_price, venue_cost, equipment_cost):
+    # Totals are summed in integer cents: exact and independent of order, so
+    # apply_change() can adjust them by a delta and static/plan.js and the
+    # vectorized paths reproduce them bit for bit
+    total_min   = cents_min / 100
+    total_max   = cents_max / 100
+    fixed_costs = venue_cost + equipment_cost
+    revenue     = n * ticket_price
+    profit_min  = revenue - total_max - fixed_costs
+    profit_max  = revenue - total_min - fixed_costs
+
+    avg_var_cost = (total_min + total_max) / 2 / n if n > 0 else 0
+    margin       = ticket_price - avg_var_cost
+    break_even   = math.ceil(fixed_costs / margin) if margin > 0 else None
+
+    return {
+        "shopping_list": shopping_list,
+        "total_min":     round(total_min, 2),
+        "total_max":     round(total_max, 2),
+        "fixed_costs":   fixed_costs,
+        "revenue":       revenue,
+        "profit_min":    round(profit_min, 2),
+        "profit_max":    round(profit_max, 2),
+        "break_even":    break_even,
+    }
+
+
+def content_digest(obj):
+    """sha1 of obj as compact JSON; the store's catalog and bundle digests too."""
+    # Key order is significant: it fixes the order volumes are summed in
+    payload = json.dumps(obj, separators=(",", ":"), ensure_ascii=False)
+    return hashlib.sha1(payload.encode("utf-8")).hexdigest()
+
 
-    return errors
+def plan_key(settings, catalog, catalog_digest=None):
+    """
+    Content hash of everything a plan depends on (menu, extras, catalog).
+    Hashing a whole catalog costs more than calculate() itself, so callers
+    that already know a digest of the catalog (the store does) pass it in.
+    Hashing the menu costs about as much as evaluate(): the functions below
+    take a precomputed `key`; the server hashes it once per request and
+    builds store.bundle_digest() on it.
+    """
+    return content_digest([settings["menu"], settings.get("extras", {}),
+                           catalog_digest or content_digest(catalog)])
+
+
+def plan_for(settings, catalog, catalog_digest=None, key=None):
+    """compile_plan() memoized on plan_key(); plans are shared, do not mutate."""
+    key  = key or plan_key(settings, catalog, catalog_digest)
+    plan = cached_plan(settings, catalog, catalog_digest, key)
+    with _plan_lock:
+        _plan_stats["misses" if plan is None else "hits"] += 1
+    if plan is None:
+        model = catalog_model(catalog, catalog_digest)
+        plan  = remember_plan(settings, catalog, compile_plan(settings, catalog, model), catalog_digest, key)
+    return plan
+
+
+def plan_cache_stats():
+    with _plan_lock:
+        return {**_plan_stats, "entries": len(_plan_cache), "capacity": PLAN_CACHE_SIZE}
+
+
+def cached_plan(settings, catalog, catalog_digest=None, key=None):
+    """The memoized plan for this menu and catalog, or None if not compiled yet."""
+    key = key or plan_key(settings, catalog, catalog_digest)
+    with _plan_lock:
+        plan = _plan_cache.get(key)
+        if plan is not None:
+            _plan_cache.move_to_end(key)
+    return plan
+
+
+def remember_plan(settings, catalog, plan, catalog_digest=None, key=None):
+    """Memoizes a plan built elsewhere (e.g. by apply_change) under plan_key()."""
+    key = key or plan_key(settings, catalog, catalog_digest)
+    with _plan_lock:
+        _plan_cache[key] = plan
+        _plan_cache.move_to_end(key)
+        while len(_plan_cache) > PLAN_CACHE_SIZE:
+            _plan_cache.popitem(last=False)
+    return plan
+
+
+def calculate_compiled(settings, catalog, catalog_digest=None, key=None):
+    """calculate() through the cached compiled plan."""
+    return evaluate(plan_for(settings, catalog, catalog_digest, key),
+                    settings["guests"], settings["alcohol_ml_per_person"], settings["buffer"],
+                    settings["ticket_price"], settings["venue_cost"], settings["equipment_cost"])
+
+
+# ── Client plans ───────────────────────────────────────────────
+# The dashboard recomputes results in the browser while inputs change.
+# client_plan() strips a compiled plan to what evaluate() reads, as plain
+# JSON: rows, terms and extras, plus each pack product's DP parameters.
+# static/plan.js evaluates it in the same operation order, with Python's
+# rounding, so its figures are identical to evaluate() and calculate().
+# bench/client.py holds both sides to shared golden cases.
+
+def client_plan(plan):
+    """JSON-ready plan for static/plan.js."""
+    rows = []
+    for ing in plan["rows"]:
+        row = {
+            "name":      ing["name"],
+            "type":      ing["type"],
+            "unit":      ing["unit"],
+            "bottle_ml": ing["bottle_ml"],
+            "price_min": ing["price_min"],
+            "price_max": ing["price_max"],
+            "packs":     None,
+        }
+        if ing["formats"]:
+            table = _pack_table(ing["formats"], 0)
+            row["packs"] = {
+                "formats": [[name, pmin, pmax] for name, _, pmin, pmax in ing["formats"]],
+                **{k: table[k] for k in ("grain", "units", "value", "best", "limit")},
+            }
+        rows.append(row)
+    return {"rows": rows, "terms": plan["terms"], "extras": plan["extras"]}
+
+
+# ── Scenario sweeps ────────────────────────────────────────────
+# evaluate() vectorized over a grid of guests × ticket price × alcohol level
+# × buffer. Same operation order as evaluate(), so bottle counts and money
+# figures match it exactly; round() is reproduced with a correctly-rounding
+# fix-up for values that sit on a half-cent boundary.
+
+MAX_SCENARIOS = 1_000_000
+
+
+def _cents_vec(np, cost):
+    """_cents() over a float array (whole numbers as floats, exact up to 2**53)."""
+    return np.rint(cost * 100)
+
+
+def _round2(np, x):
+    """Python's round(x, 2) over a float array."""
+    y     = np.round(x, 2)
+    scaled = x * 100
+    near  = np.abs(np.abs(scaled - np.trunc(scaled)) - 0.5) < 1e-6 + np.abs(scaled) * 1e-12
+    if near.any():
+        y[near] = [round(v, 2) for v in x[near].tolist()]
+    return y
+
+
+def sweep(plan, guests, ticket_price, alcohol_ml, buffer, venue_cost, equipment_cost,
+          quantities=True):
+    """
+    Evaluates the plan at every point of the grid guests × ticket_price ×
+    alcohol_ml × buffer (each a list of values; the grid is flattened in that
+    order, last axis fastest). Returns column lists, one entry per point.
+    """
+    import numpy as np
+
+    axes  = [np.asarray(a) for a in (guests, ticket_price, alcohol_ml, buffer)]
+    shape = tuple(len(a) for a in axes)
+    size  = math.prod(shape)
+    if size > MAX_SCENARIOS:
+        raise ValueError(f"{size} scenarios requested (max {MAX_SCENARIOS})")
+
+    n, ticket, alcohol, buf = (g.ravel() for g in np.meshgrid(*axes, indexing="ij"))
+    if not np.issubdtype(n.dtype, np.integer):
+        n = n.astype(np.float64)
+
+    total_alcohol = n * alcohol
+    volumes = np.zeros((len(plan["rows"]), size))
+    for row, macro, spirit, drink, div, mult in plan["terms"]:
+        volumes[row] = volumes[row] + mult * ((((total_alcohol * macro) * spirit) * drink) / div)
+    for row, qpp, minq in plan["extras"]:
+        volumes[row] = np.maximum(minq, qpp * n)
+
+    qty       = np.empty((len(plan["rows"]), size), dtype=np.int64)
+    cents_min = np.zeros(size)
+    cents_max = np.zeros(size)
+    for i, ing in enumerate(plan["rows"]):
+        qty[i], cost_min, cost_max = _purchase_vec(np, ing, volumes[i] * buf)
+        cents_min = cents_min + _cents_vec(np, cost_min)
+        cents_max = cents_max + _cents_vec(np, cost_max)
+    total_min = cents_min / 100
+    total_max = cents_max / 100
+
+    fixed_costs = venue_cost + equipment_cost
+    revenue     = n * ticket
+    profit_min  = revenue - total_max - fixed_costs
+    profit_max  = revenue - total_min - fixed_costs
+
+    with np.errstate(divide="ignore", invalid="ignore"):
+        avg_var_cost = np.where(n > 0, (total_min + total_max) / 2 / np.where(n > 0, n, 1), 0)
+        margin       = ticket - avg_var_cost
+        break_even   = np.ceil(fixed_costs / np.where(margin > 0, margin, 1))
+    break_even = [int(b) if ok else None
+                  for b, ok in zip(break_even.tolist(), (margin > 0).tolist())]
+
+    out = {
+        "axes": {
+            "guests":                axes[0].tolist(),
+            "ticket_price":          axes[1].tolist(),
+            "alcohol_ml_per_person": axes[2].tolist(),
+            "buffer":                axes[3].tolist(),
+        },
+        "shape":      list(shape),
+        "total_min":  _round2(np, total_min).tolist(),
+        "total_max":  _round2(np, total_max).tolist(),
+        "profit_min": _round2(np, profit_min).tolist(),
+        "profit_max": _round2(np, profit_max).tolist(),
+        "break_even": break_even,
+    }
+    if quantities:
+        out["items"]      = [ing["name"] for ing in plan["rows"]]
+        out["quantities"] = qty.tolist()
+    return out
+
+
+# ── Monte Carlo risk ───────────────────────────────────────────
+# Attendance and per-person pure alcohol are drawn from distributions; the
+# stock bought is what evaluate() recommends for the saved settings. Within a
+# plan, a row's demand is coef × attendance × alcohol (menu rows) or
+# max(min_qty, qty_per_person × attendance) (extras), so each draw is a few
+# vector operations. Draws run in fixed-size chunks, each with its own child
+# seed, so results depend on the seed only — not on how many workers ran them.
+
+RISK_CHUNK       = 125_000
+RISK_MAX_DRAWS   = 5_000_000
+RISK_WORKERS     = int(os.environ.get("RISK_WORKERS", min(4, os.cpu_count() or 1)))
+RISK_QUANTILES   = (0.05, 0.25, 0.5, 0.75, 0.95)
+
+_risk_pool      = None
+_risk_pool_lock = threading.Lock()
+
+
+def _sample(rng, spec, size):
+    """Draws from {"dist": normal|lognormal|poisson|uniform|triangular|fixed, ...}."""
+    import numpy as np
+
+    dist = spec.get("dist", "normal")
+    if dist == "normal":
+        return rng.normal(spec["mean"], spec.get("sd", 0), size)
+    if dist == "lognormal":
+        mean, sd = spec["mean"], spec.get("sd", 0)
+        sigma2   = math.log(1 + (sd / mean) ** 2) if mean > 0 else 0
+        return rng.lognormal(math.log(mean) - sigma2 / 2 if mean > 0 else -math.inf,
+                             math.sqrt(sigma2), size)
+    if dist == "poisson":
+        return rng.poisson(spec["mean"], size).astype(float)
+    if dist == "uniform":
+        return rng.uniform(spec["low"], spec["high"], size)
+    if dist == "triangular":
+        return rng.triangular(spec["low"], spec["mode"], spec["high"], size)
+    if dist == "fixed":
+        return np.full(size, float(spec["value"]))
+    raise ValueError(f"Unknown distribution: {dist}")
+
+
+def _risk_chunk(job):
+    """One chunk of draws → additive partial aggregates (runs in a worker)."""
+    import numpy as np
+
+    seed, size, model = job
+    rng        = np.random.default_rng(seed)
+    attendance = np.maximum(np.rint(_sample(rng, model["attendance"], size)), 0)
+    alcohol    = np.maximum(_sample(rng, model["consumption"], size), 0)
+    exposure   = attendance * alcohol
+
+    rows     = len(model["coef"])
+    stockout = np.zeros(rows, dtype=np.int64)
+    leftover = np.zeros(rows)
+    any_out  = np.zeros(size, dtype=bool)
+    for i in range(rows):
+        extra = model["extras"][i]
+        if extra is None:
+            demand = model["coef"][i] * exposure
+        else:
+            demand = np.maximum(extra[1], extra[0] * attendance)
+        out          = demand > model["stock"][i]
+        stockout[i]  = out.sum()
+        any_out     |= out
+        spare        = np.maximum(model["stock"][i] - demand, 0)
+        leftover[i]  = np.floor(spare / model["unit"][i]).sum() if model["unit"][i] else spare.sum()
+
+    return {
+        "attendance": attendance,
+        "exposure":   exposure,
+        "stockout":   stockout,
+        "any_out":    int(any_out.sum()),
+        "leftover":   leftover,
+    }
+
+
+def _get_risk_pool():
+    global _risk_pool
+    with _risk_pool_lock:   # request threads must not start two pools
+        if _risk_pool is None:
+            import multiprocessing
+            from concurrent.futures import ProcessPoolExecutor
+            _risk_pool = ProcessPoolExecutor(RISK_WORKERS,
+                                             mp_context=multiprocessing.get_context("spawn"))
+            atexit.register(_risk_pool.shutdown, cancel_futures=True)
+        return _risk_pool
+
+
+def run_chunks(fn, jobs, workers=None):
+    """Maps fn over jobs, on the shared process pool when it is worth it."""
+    workers = RISK_WORKERS if workers is None else workers
+    if workers <= 1 or len(jobs) <= 1:
+        return [fn(job) for job in jobs]
+    return list(_get_risk_pool().map(fn, jobs))
+
+
+def imap_chunks(fn, jobs, workers=None, ahead=None):
+    """
+    run_chunks() over an iterable of any length: yields results in job order
+    while keeping at most `ahead` jobs (default 2 per worker) in flight, so
+    jobs are drawn from `jobs` only as results are consumed.
+    """
+    workers = RISK_WORKERS if workers is None else workers
+    if workers <= 1:
+        yield from map(fn, jobs)
+        return
+    pool, window = _get_risk_pool(), deque()
+    ahead = ahead or 2 * workers
+    try:
+        for job in jobs:
+            window.append(pool.submit(fn, job))
+            if len(window) >= ahead:
+                yield window.popleft().result()
+        while window:
+            yield window.popleft().result()
+    finally:
+        for future in window:
+            future.cancel()
+
+
+def simulate_risk(plan, settings, draws=100_000, seed=None, attendance=None,
+                  consumption=None, service_level=0.95, workers=None):
+    """
+    Monte Carlo over attendance and per-person consumption for the stock
+    evaluate() would buy. Reports profit quantiles, per-item stock-out
+    probability and expected unopened leftovers, and the buffer each item
+    needs to be covered in `service_level` of the draws.
+    """
+    import numpy as np
+
+    if not 0 < draws <= RISK_MAX_DRAWS:
+        raise ValueError(f"draws must be between 1 and {RISK_MAX_DRAWS}")
+    if not 0 < service_level < 1:
+        raise ValueError("service_level must be between 0 and 1")
+
+    n, alcohol_ml, buffer = settings["guests"], settings["alcohol_ml_per_person"], settings["buffer"]
+    attendance  = attendance  or {"dist": "normal", "mean": n, "sd": 0.15 * n}
+    consumption = consumption or {"dist": "lognormal", "mean": alcohol_ml, "sd": 0.25 * alcohol_ml}
+    planned     = evaluate(plan, n, alcohol_ml, buffer, settings["ticket_price"],
+                           settings["venue_cost"], settings["equipment_cost"])
+
+    rows   = plan["rows"]
+    coef   = [0.0] * len(rows)   # volume per ml of pure alcohol served
+    extras = [None] * len(rows)
+    for row, macro, spirit, drink, div, mult in plan["terms"]:
+        coef[row] += mult * macro * spirit * drink / div
+    for row, qpp, minq in plan["extras"]:
+        extras[row] = (qpp, minq)
+
+    unit, stock = [], []
+    for r, ing in zip(planned["shopping_list"], rows):
+        if ing["formats"]:
+            sizes = {name: size for name, size, _, _ in ing["formats"]}
+            unit.append(min(sizes.values()))
+            stock.append(sum(p["count"] * sizes[p["format"]] for p in r["packs"]))
+        else:
+            unit.append(ing["bottle_ml"] or 1)
+            stock.append(r["quantity"] * (ing["bottle_ml"] or 1))
+
+    model = {
+        "attendance":  attendance,
+        "consumption": consumption,
+        "coef":   coef,
+        "extras": extras,
+        "unit":   unit,
+        "stock":  stock,
+    }
+    children = np.random.SeedSequence(seed).spawn(math.ceil(draws / RISK_CHUNK))
+    sizes    = [min(RISK_CHUNK, draws - i * RISK_CHUNK) for i in range(len(children))]
+    parts    = run_chunks(_risk_chunk, list(zip(children, sizes, [model] * len(sizes))), workers)
+
+    attendance_s = np.concatenate([p["attendance"] for p in parts])
+    exposure_s   = np.concatenate([p["exposure"] for p in parts])
+    stockout     = sum(p["stockout"] for p in parts)
+    leftover     = sum(p["leftover"] for p in parts)
+
+    fixed_costs = settings["venue_cost"] + settings["equipment_cost"]
+    revenue     = attendance_s * settings["ticket_price"]
+    profit_min  = revenue - planned["total_max"] - fixed_costs
+    profit_max  = revenue - planned["total_min"] - fixed_costs
+
+    def summary(x):
+        q = np.quantile(x, RISK_QUANTILES)
+        return {"mean": round(float(x.mean()), 2),
+                **{f"p{round(p * 100)}": round(float(v), 2) for p, v in zip(RISK_QUANTILES, q)}}
+
+    # Demand is monotone in exposure (menu rows) or attendance (extras), so the
+    # service-level quantile of demand comes from one quantile of each driver.
+    base        = plan_volumes(plan, n, alcohol_ml)
+    exposure_q  = float(np.quantile(exposure_s, service_level))
+    attendance_q = float(np.quantile(attendance_s, service_level))
+
+    items = []
+    for i, (ing, r) in enumerate(zip(rows, planned["shopping_list"])):
+        if extras[i] is None:
+            need = coef[i] * exposure_q
+        else:
+            need = max(extras[i][1], extras[i][0] * attendance_q)
+        items.append({
+            "name":              ing["name"],
+            "type":              ing["type"],
+            "quantity":          r["quantity"],
+            "unit":              r["unit"],
+            "p_stockout":        round(int(stockout[i]) / draws, 4),
+            "expected_leftover": round(float(leftover[i]) / draws, 2),
+            "buffer":            math.ceil(need / base[i] * 100) / 100 if base[i] > 0 else None,
+        })
+
+    return {
+        "draws":          draws,
+        "seed":           seed,
+        "service_level":  service_level,
+        "attendance":     summary(attendance_s),
+        "profit_min":     summary(profit_min),
+        "profit_max":     summary(profit_max),
+        "p_loss":         round(float((profit_min < 0).mean()), 4),
+        "p_any_stockout": round(sum(p["any_out"] for p in parts) / draws, 4),
+        "items":          items,
+    }
+
+
+# ── Exact solvers ──────────────────────────────────────────────
+# Shopping cost is a step function of headcount: bottle counts only move
+# when a ceil() boundary is crossed, and never go down as guests go up.
+# The solvers below work on that structure with the compiled plan instead
+# of re-running calculate() for every candidate. "basis" picks the price
+# column: "min" = worst case (pay max prices → profit_min), "max" = best case.
+
+SOLVER_MAX_GUESTS = 1_000_000
+
+
+def _totals(plan, guests, alcohol_ml, buffer):
+    """(total_min, total_max) before rounding, summed exactly like evaluate()."""
+    purchases = _plan_purchases(plan, plan_volumes(plan, guests, alcohol_ml), buffer)
+    _, costs_min, costs_max, _ = list(zip(*purchases)) or [()] * 4
+    return _sum_cents(costs_min) / 100, _sum_cents(costs_max) / 100
+
+
+def _profit(plan, settings, guests, basis, ticket_price=None):
+    """profit_min (basis "min") or profit_max (basis "max") as evaluate() reports it."""
+    ticket = settings["ticket_price"] if ticket_price is None else ticket_price
+    total_min, total_max = _totals(plan, guests, settings["alcohol_ml_per_person"], settings["buffer"])
+    spend  = total_max if basis == "min" else total_min
+    return round(guests * ticket - spend - (settings["venue_cost"] + settings["equipment_cost"]), 2)
+
+
+def _profit_block(plan, settings, start, stop, basis):
+    """evaluate()'s profit for every headcount in [start, stop), vectorized."""
+    import numpy as np
+
+    n = np.arange(start, stop, dtype=np.int64)
+    total_alcohol = n * settings["alcohol_ml_per_person"]
+    volumes = np.zeros((len(plan["rows"]), len(n)))
+    for row, macro, spirit, drink, div, mult in plan["terms"]:
+        volumes[row] = volumes[row] + mult * ((((total_alcohol * macro) * spirit) * drink) / div)
+    for row, qpp, minq in plan["extras"]:
+        volumes[row] = np.maximum(minq, qpp * n)
+
+    spend = np.zeros(len(n))   # cents
+    for i, ing in enumerate(plan["rows"]):
+        _, cost_min, cost_max = _purchase_vec(np, ing, volumes[i] * settings["buffer"])
+        spend = spend + _cents_vec(np, cost_max if basis == "min" else cost_min)
+    fixed = settings["venue_cost"] + settings["equipment_cost"]
+    return _round2(np, n * settings["ticket_price"] - spend / 100 - fixed)
+
+
+def break_even_exact(plan, settings, basis="min", max_guests=SOLVER_MAX_GUESTS):
+    """
+    Smallest headcount whose reported profit is >= 0, or None within max_guests.
+
+    With spend S(n) non-decreasing, if profit(n) < 0 then no n' below
+    (S(n) + fixed) / ticket can break even either, so the search jumps there.
+    A ticket barely above the marginal cost makes those jumps short; after a
+    few of them the remaining range is scanned in vectorized blocks.
+    """
+    import numpy as np
+
+    ticket = settings["ticket_price"]
+    fixed  = settings["venue_cost"] + settings["equipment_cost"]
+    n = 0
+    for _ in range(32):
+        if _profit(plan, settings, n, basis) >= 0:
+            return n
+        if ticket <= 0:
+            return None
+        total_min, total_max = _totals(plan, n, settings["alcohol_ml_per_person"], settings["buffer"])
+        spend = total_max if basis == "min" else total_min
+        # One below the float estimate, so rounding can never skip the answer
+        n = max(n + 1, math.ceil((spend + fixed) / ticket) - 1)
+        if n > max_guests:
+            return None
+
+    block = 1 << 16
+    while n <= max_guests:
+        stop   = min(n + block, max_guests + 1)
+        profit = _profit_block(plan, settings, n, stop, basis)
+        hits   = np.flatnonzero(profit >= 0)
+        if len(hits):
+            return n + int(hits[0])
+        n = stop
+    return None
+
+
+def min_ticket_price(plan, settings, target_profit=0, basis="min", guests=None):
+    """Lowest ticket price (in cents) that reaches target_profit at `guests`."""
+    n = settings["guests"] if guests is None else guests
+    if n <= 0:
+        return None
+    total_min, total_max = _totals(plan, n, settings["alcohol_ml_per_person"], settings["buffer"])
+    spend  = total_max if basis == "min" else total_min
+    needed = target_profit + spend + settings["venue_cost"] + settings["equipment_cost"]
+    price  = max(math.ceil(needed / n * 100) / 100, 0)
+    # Spend does not depend on the ticket, so only rounding can be off by a cent
+    while price > 0 and _profit(plan, settings, n, basis, price - 0.01) >= target_profit:
+        price = round(price - 0.01, 2)
+    while _profit(plan, settings, n, basis, price) < target_profit:
+        price = round(price + 0.01, 2)
+    return price
+
+
+def max_guests_within(plan, settings, cap, basis="max", include_fixed=True,
+                      max_guests=SOLVER_MAX_GUESTS):
+    """
+    Largest headcount whose shopping spend (at max prices for basis "max",
+    min prices for "min"), plus fixed costs if include_fixed, stays <= cap.
+    Spend never decreases with headcount, so this is a bisection.
+    """
+    fixed = settings["venue_cost"] + settings["equipment_cost"] if include_fixed else 0
+
+    def spend(n):
+        total_min, total_max = _totals(plan, n, settings["alcohol_ml_per_person"], settings["buffer"])
+        return round((total_max if basis == "max" else total_min) + fixed, 2)
+
+    if spend(0) > cap:
+        return None
+    lo, hi = 0, 1
+    while hi <= max_guests and spend(hi) <= cap:
+        lo, hi = hi, hi * 2
+    if hi > max_guests:
+        if spend(max_guests) <= cap:
+            return max_guests
+        hi = max_guests
+    while hi - lo > 1:
+        mid = (lo + hi) // 2
+        if spend(mid) <= cap:
+            lo = mid
+        else:
+            hi = mid
+    return lo
+
+
+# ── Incremental recalculation ──────────────────────────────────
+# After a catalog edit only the rows that depend on the edited item change.
+# apply_change() uses the plan's dependency index to recompute just those
+# rows and reuses every other shopping-list line from the previous result.
+# A price edit changes one line, and the totals (whole cents) move by its
+# difference, so the result stays identical to a full calculate().
+
+
+def apply_change(previous_result, change, plan, settings):
+    """
+    Applies one catalog change to a result produced from `plan` and returns
+    (new_result, new_plan). Supported changes:
+      {"op": "price",             "name": ..., "price_min": ..., "price_max": ...}
+      {"op": "delete_cocktail",   "name": ...}
+      {"op": "delete_ingredient", "name": ...}
+    """
+    op, name = change["op"], change["name"]
+    index    = plan["index"]
+    summary  = (settings["guests"], settings["ticket_price"],
+                settings["venue_cost"], settings["equipment_cost"])
+
+    if op == "price":
+        row = index["rows"].get(name)
+        if row is None:
+            return previous_result, plan
+        ing  = {**plan["rows"][row], "price_min": change["price_min"], "price_max": change["price_max"]}
+        rows = plan["rows"][:]
+        rows[row] = ing
+        new_plan = {**plan, "rows": rows}
+        if ing["formats"]:   # pack rows are priced per format
+            return previous_result, new_plan
+        old  = previous_result["shopping_list"][row]
+        line = {**old, "cost_min": round(old["quantity"] * ing["price_min"], 2),
+                "cost_max": round(old["quantity"] * ing["price_max"], 2)}
+        shopping_list = previous_result["shopping_list"][:]
+        shopping_list[row] = line
+        # Totals are whole cents, so the previous ones are recovered exactly
+        cents_min = _cents(previous_result["total_min"]) + _cents(line["cost_min"]) - _cents(old["cost_min"])
+        cents_max = _cents(previous_result["total_max"]) + _cents(line["cost_max"]) - _cents(old["cost_max"])
+        return _kpis(shopping_list, cents_min, cents_max, *summary), new_plan
+
+    terms, sources = plan["terms"], plan["sources"]
+    removed = set()
+    drop    = set()
+    reserve = {}    # term → new divisor
+    if op == "delete_cocktail":
+        drop.update(index["cocktails"].get(name, []))
+    elif op == "delete_ingredient":
+        if name in index["rows"]:
+            removed.add(index["rows"][name])
+        for i in index["spirits"].get(name, []):
+            _, spirit, _, ml_per_serve, spirit_abv = sources[i]
+            if spirit == name:
+                drop.add(i)
+            elif ml_per_serve * spirit_abv > 0:
+                # Main spirit gone: servings fall back to the menu spirit's ABV
+                reserve[i] = ml_per_serve * spirit_abv
+            else:
+                drop.add(i)
+    else:
+        raise ValueError(f"Unknown change: {op}")
+
+    if not (removed or drop or reserve):
+        return previous_result, plan
+
+    affected = {terms[i][0] for i in drop | set(reserve)} - removed
+    kept     = [i for i in range(len(terms)) if i not in drop and terms[i][0] not in removed]
+    present  = {terms[i][0] for i in kept} | {e[0] for e in plan["extras"] if e[0] not in removed}
+    old_rows = sorted(present)
+    remap    = {old: new for new, old in enumerate(old_rows)}
+
+    new_plan = {
+        "rows":    [plan["rows"][i] for i in old_rows],
+        "terms":   [[remap[terms[i][0]], *terms[i][1:4], reserve.get(i, terms[i][4]), terms[i][5]]
+                    for i in kept],
+        "sources": [sources[i] for i in kept],
+        "extras":  [[remap[row], qpp, minq] for row, qpp, minq in plan["extras"] if row in remap],
+    }
+    new_plan["index"] = build_index(new_plan)
+
+    total_alcohol = settings["guests"] * settings["alcohol_ml_per_person"]
+    volumes = {remap[row]: 0 for row in affected if row in remap}
+    for row, macro, spirit, drink, div, mult in new_plan["terms"]:
+        if row in volumes:
+            volumes[row] = volumes[row] + mult * ((((total_alcohol * macro) * spirit) * drink) / div)
+
+    shopping_list = []
+    for new, old in enumerate(old_rows):
+        if new not in volumes:
+            shopping_list.append(previous_result["shopping_list"][old])
+            continue
+        ing = new_plan["rows"][new]
+        quantity, cost_min, cost_max, packs = _purchase(ing, volumes[new] * settings["buffer"])
+        line = {"name": ing["name"], "type": ing["type"], "quantity": quantity,
+                "unit": ing["unit"], "cost_min": cost_min, "cost_max": cost_max}
+        if packs is not None:
+            line["packs"] = packs
+        shopping_list.append(line)
+
+    return _summarize(shopping_list, *summary), new_plan
+
+
+# ── Season planning ────────────────────────────────────────────
+# A season is a run of events sharing one catalog. Each event is sized like
+# a single party (its own menu, guests, alcohol level and buffer); buying
+# then walks the events in order, and whatever one event left over (the
+# buffer nobody drank, part-used bottles) is used before buying anew.
+
+SEASON_CHUNK = 64   # fewest events per worker job; smaller seasons run in-process
+
+
+def _season_chunk(job):
+    """Worker: pre-buffer volumes and the standalone result for a run of events."""
+    plans, events = job
+    out = []
+    for p, guests, alcohol_ml, buffer, ticket_price, venue_cost, equipment_cost in events:
+        plan = plans[p]
+        out.append((plan_volumes(plan, guests, alcohol_ml),
+                    evaluate(plan, guests, alcohol_ml, buffer, ticket_price, venue_cost, equipment_cost)))
+    return out
+
+
+def _bought(ing, quantity, packs):
+    """Amount (ml, or units for unitless items) a purchase adds to stock."""
+    if packs is not None:
+        sizes = {name: size for name, size, _, _ in ing["formats"]}
+        return sum(p["count"] * sizes[p["format"]] for p in packs)
+    return quantity * ing["bottle_ml"] if ing["bottle_ml"] else quantity
+
+
+def plan_season(events, catalog, catalog_digest=None, workers=None):
+    """
+    events: full settings dicts, each with a "name", in the order they run.
+    Returns, per event, what it buys once earlier leftovers are used and its
+    profit on that basis, next to the standalone result; then the combined
+    shopping list for the season and the stock left at the end.
+    """
+    catalog_digest = catalog_digest or content_digest(catalog)
+    plans, plan_ids, specs = [], {}, []
+    for ev in events:
+        # Events mostly share the season's menu object: hash each one once
+        shared = (id(ev["menu"]), id(ev.get("extras")))
+        if shared not in plan_ids:
+            key = plan_key(ev, catalog, catalog_digest)
+            if key not in plan_ids:
+                plan_ids[key] = len(plans)
+                plans.append(plan_for(ev, catalog, catalog_digest, key))
+            plan_ids[shared] = plan_ids[key]
+        specs.append((plan_ids[shared], ev["guests"], ev["alcohol_ml_per_person"], ev["buffer"],
+                      ev["ticket_price"], ev["venue_cost"], ev["equipment_cost"]))
+
+    # Sizing is independent per event and goes to the pool in a few large
+    # batches; the stock carried between events makes buying sequential.
+    workers = RISK_WORKERS if workers is None else workers
+    size    = max(SEASON_CHUNK, -(-len(specs) // max(workers, 1)))
+    jobs    = [(plans, specs[i:i + size]) for i in range(0, len(specs), size)]
+    sized   = [r for chunk in run_chunks(_season_chunk, jobs, workers) for r in chunk]
+
+    stock, units, combined, per_event = {}, {}, {}, []
+    for ev, spec, (volumes, standalone) in zip(events, specs, sized):
+        plan = plans[spec[0]]
+        shopping_list = []
+        for ing, volume in zip(plan["rows"], volumes):
+            name = ing["name"]
+            have = stock.get(name, 0)
+            want = volume * ev["buffer"]
+            quantity, cost_min, cost_max, packs = _purchase(ing, max(want - have, 0))
+            stock[name] = max(have + _bought(ing, quantity, packs) - volume, 0)
+            units[name] = ing["stock_unit"]
+
+            line = {"name": name, "type": ing["type"], "quantity": quantity, "unit": ing["unit"],
+                    "cost_min": cost_min, "cost_max": cost_max,
+                    "from_stock": round(min(have, want), 2)}
+            if packs is not None:
+                line["packs"] = packs
+            shopping_list.append(line)
+
+            total = combined.setdefault(name, {"name": name, "type": ing["type"], "quantity": 0,
+                                               "unit": ing["unit"], "cost_min": 0, "cost_max": 0})
+            total["quantity"] += quantity
+            total["cost_min"]  = round(total["cost_min"] + cost_min, 2)
+            total["cost_max"]  = round(total["cost_max"] + cost_max, 2)
+            for p in packs or ():
+                counts = total.setdefault("packs", {})
+                counts[p["format"]] = counts.get(p["format"], 0) + p["count"]
+
+        result = _summarize(shopping_list, ev["guests"], ev["ticket_price"],
+                            ev["venue_cost"], ev["equipment_cost"])
+        result["name"]   = ev["name"]
+        result["date"]   = ev.get("date")
+        result["guests"] = ev["guests"]
+        result["standalone"] = {k: v for k, v in standalone.items() if k != "shopping_list"}
+        per_event.append(result)
+
+    shopping_list = sorted(combined.values(), key=lambda r: (r["type"], r["name"]))
+    for line in shopping_list:
+        if "packs" in line:
+            line["packs"] = [{"format": f, "count": c} for f, c in line["packs"].items()]
+    total_min   = round(sum(r["cost_min"] for r in shopping_list), 2)
+    total_max   = round(sum(r["cost_max"] for r in shopping_list), 2)
+    fixed_costs = sum(e["fixed_costs"] for e in per_event)
+    revenue     = sum(e["revenue"] for e in per_event)
+    return {
+        "events":        per_event,
+        "shopping_list": shopping_list,
+        "total_min":     total_min,
+        "total_max":     total_max,
+        "fixed_costs":   fixed_costs,
+        "revenue":       revenue,
+        "profit_min":    round(revenue - total_max - fixed_costs, 2),
+        "profit_max":    round(revenue - total_min - fixed_costs, 2),
+        "standalone_total_min": round(sum(e["standalone"]["total_min"] for e in per_event), 2),
+        "standalone_total_max": round(sum(e["standalone"]["total_max"] for e in per_event), 2),
+        "leftovers":     [{"name": name, "amount": round(amount, 2), "unit": units[name]}
+                          for name, amount in stock.items() if amount > 1e-9],
+    }
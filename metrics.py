@@ -0,0 +1,185 @@
+"""
+Request instrumentation: stage timers, DB counters, Server-Timing and a
+Prometheus text endpoint.
+
+Off unless METRICS_ENABLED=1. Disabled, timed() hands back the function
+it wraps and stage() a shared no-op context, so the hot path pays nothing.
+Figures are per process: each gunicorn worker reports its own.
+"""
+import os, threading, time
+from contextlib import contextmanager, nullcontext
+
+ENABLED = os.environ.get("METRICS_ENABLED", "0") == "1"
+
+# Seconds; wide enough for a cached page (~1 ms) and a large Monte Carlo run
+BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+_registry   = []            # metrics, in exposition order
+_collectors = []            # callables returning [(name, type, help, [(labels, value)])]
+_local      = threading.local()
+_noop       = nullcontext()
+
+
+class Histogram:
+    def __init__(self, name, help, labels=()):
+        self.name, self.help, self.labels = name, help, tuple(labels)
+        self._series = {}       # label values → [bucket counts..., sum, count]
+        self._lock   = threading.Lock()
+        _registry.append(self)
+
+    def observe(self, value, *labels):
+        with self._lock:
+            series = self._series.get(labels)
+            if series is None:
+                series = self._series[labels] = [0] * (len(BUCKETS) + 2)
+            for i, bound in enumerate(BUCKETS):
+                if value <= bound:
+                    series[i] += 1
+            series[-2] += value
+            series[-1] += 1
+
+    def render(self):
+        yield f"# HELP {self.name} {self.help}"
+        yield f"# TYPE {self.name} histogram"
+        with self._lock:
+            items = [(k, v[:]) for k, v in self._series.items()]
+        for labels, series in items:
+            base = _labels(self.labels, labels)
+            for bound, count in zip(BUCKETS, series):
+                yield f"{self.name}_bucket{_labels(self.labels + ('le',), labels + (bound,))} {count}"
+            yield f"{self.name}_bucket{_labels(self.labels + ('le',), labels + ('+Inf',))} {series[-1]}"
+            yield f"{self.name}_sum{base} {series[-2]}"
+            yield f"{self.name}_count{base} {series[-1]}"
+
+
+class Counter:
+    def __init__(self, name, help, labels=()):
+        self.name, self.help, self.labels = name, help, tuple(labels)
+        self._series = {}
+        self._lock   = threading.Lock()
+        _registry.append(self)
+
+    def inc(self, *labels, amount=1):
+        with self._lock:
+            self._series[labels] = self._series.get(labels, 0) + amount
+
+    def render(self):
+        yield f"# HELP {self.name} {self.help}"
+        yield f"# TYPE {self.name} counter"
+        with self._lock:
+            items = list(self._series.items())
+        for labels, value in items:
+            yield f"{self.name}{_labels(self.labels, labels)} {value}"
+
+
+def _labels(names, values):
+    if not names:
+        return ""
+    pairs = ",".join(f'{n}="{str(v).replace(chr(92), chr(92) * 2).replace(chr(34), chr(92) + chr(34))}"'
+                     for n, v in zip(names, values))
+    return "{" + pairs + "}"
+
+
+REQUEST_SECONDS = Histogram("bottlecount_request_seconds", "Request latency by route.",
+                            ["route", "method", "status"])
+STAGE_SECONDS   = Histogram("bottlecount_stage_seconds",
+                            "Time in one stage (store call, validation, calculation, rendering).",
+                            ["stage"])
+DB_QUERIES      = Counter("bottlecount_db_queries_total", "SQL statements executed.")
+DB_QUERY_SECONDS = Histogram("bottlecount_db_query_seconds", "SQL statement latency.")
+DB_CHECKOUTS    = Counter("bottlecount_db_checkouts_total", "Connections taken from the pool.")
+
+
+def register_collector(fn):
+    """fn() → [(name, type, help, [(labels dict, value), ...])], read at scrape time."""
+    _collectors.append(fn)
+    return fn
+
+
+def render():
+    """The Prometheus text exposition of everything registered."""
+    lines = []
+    for metric in _registry:
+        lines.extend(metric.render())
+    for fn in _collectors:
+        for name, kind, help, samples in fn():
+            lines.append(f"# HELP {name} {help}")
+            lines.append(f"# TYPE {name} {kind}")
+            for labels, value in samples:
+                lines.append(f"{name}{_labels(tuple(labels), tuple(labels.values()))} {value}")
+    return "\n".join(lines) + "\n"
+
+
+# ── Per-request accounting ─────────────────────────────────────
+
+def begin_request():
+    _local.stages  = {}     # stage → [seconds, calls]
+    _local.queries = 0
+    _local.conns   = 0
+    _local.started = time.perf_counter()
+
+
+def end_request(route, method, status):
+    """Records the request and returns its Server-Timing header value."""
+    total  = time.perf_counter() - getattr(_local, "started", time.perf_counter())
+    REQUEST_SECONDS.observe(total, route, method, status)
+    stages = getattr(_local, "stages", {})
+    parts  = [f'{name.replace(".", "-")};dur={secs * 1000:.2f};desc="{calls}x"'
+              for name, (secs, calls) in stages.items()]
+    parts.append(f'db;desc="{getattr(_local, "queries", 0)} queries, '
+                 f'{getattr(_local, "conns", 0)} connections"')
+    parts.append(f"total;dur={total * 1000:.2f}")
+    _local.stages = {}
+    return ", ".join(parts)
+
+
+def _record(name, seconds):
+    STAGE_SECONDS.observe(seconds, name)
+    stages = getattr(_local, "stages", None)
+    if stages is not None:
+        entry = stages.setdefault(name, [0.0, 0])
+        entry[0] += seconds
+        entry[1] += 1
+
+
+@contextmanager
+def _stage(name):
+    t = time.perf_counter()
+    try:
+        yield
+    finally:
+        _record(name, time.perf_counter() - t)
+
+
+def stage(name):
+    """Context manager timing one stage of the current request."""
+    return _stage(name) if ENABLED else _noop
+
+
+def timed(name):
+    """Decorator timing every call as stage `name`; the identity when disabled."""
+    def wrap(fn):
+        if not ENABLED:
+            return fn
+        def timed_call(*args, **kwargs):
+            t = time.perf_counter()
+            try:
+                return fn(*args, **kwargs)
+            finally:
+                _record(name, time.perf_counter() - t)
+        timed_call.__name__ = fn.__name__
+        timed_call.__doc__  = fn.__doc__
+        timed_call.__wrapped__ = fn
+        return timed_call
+    return wrap
+
+
+def count_query(seconds):
+    DB_QUERIES.inc()
+    DB_QUERY_SECONDS.observe(seconds)
+    _local.queries = getattr(_local, "queries", 0) + 1
+
+
+def count_checkout():
+    DB_CHECKOUTS.inc()
+    _local.conns = getattr(_local, "conns", 0) + 1
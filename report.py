@@ -0,0 +1,258 @@
+"""
+Cross-user report for operators: which cocktails and ingredients menus use,
+how guest counts and alcohol levels are spread, and how much of each
+ingredient every saved plan would buy together.
+
+    python report.py                                    # CSV to stdout
+    python report.py --format ndjson -o report.ndjson   # or GET /api/admin/report
+
+Users come from store.iter_users() (a server-side cursor with a database)
+and are computed REPORT_CHUNK at a time on core's process pool, at most a
+few chunks in flight. Each chunk comes back as additive totals that are
+folded in and dropped, so memory depends on the chunk size and the number
+of distinct names, not on the number of users.
+
+Rows share one schema:
+
+    section     "total" | "failed" | "guests" | "alcohol_ml_per_person" | "cocktail" | "ingredient" | "end"
+    key         "all", a guest range, an alcohol level or a name
+    users       users counted in the row (end: every user read)
+    share       users / users computed
+    quantity    total: guests; ingredient: units bought
+    unit, cost_min, cost_max                 ingredient and total rows
+
+NDJSON output also carries {"section": "progress", "users": n} lines while
+users are being computed, so long runs keep the connection busy. The last
+row is always {"section": "end", "key": "all"}: output without it was cut
+short. The CLI is the way to export a large user base; the HTTP endpoint
+streams the same rows but is bounded by the server's and proxy's limits.
+"""
+import argparse, csv, io, json, os, sys, time
+from bisect import bisect_right
+
+import core
+import store
+from catalog_io import FORMATS
+
+REPORT_CHUNK    = int(os.environ.get("REPORT_CHUNK", 250))    # users per pool job
+REPORT_MAX_KEYS = 10_000    # distinct names per section; further ones count as "(other)"
+PROGRESS_EVERY  = 5_000     # users between NDJSON progress lines
+
+FIELDS        = ["section", "key", "users", "share", "quantity", "unit", "cost_min", "cost_max"]
+GUEST_BUCKETS = (0, 50, 100, 200, 300, 500, 1000, 2000, 5000)
+OTHER         = "(other)"
+_NUMBER       = (int, float)   # exact types: bools and numeric strings are not amounts
+
+
+# ── Totals ─────────────────────────────────────────────────────
+# Plain dicts and lists, so chunks pickle cheaply back from the pool:
+#   guests       bucket index → users
+#   alcohol      ml per person → users
+#   cocktails    name → users
+#   ingredients  name → [users, quantity, cost_min, cost_max, unit]
+
+def _empty():
+    return {"users": 0, "failed": 0, "guests_total": 0, "cost_min": 0.0, "cost_max": 0.0,
+            "guests": {}, "alcohol": {}, "cocktails": {}, "ingredients": {}}
+
+
+def _slot(table, key, new):
+    """table[key], created by new(); past REPORT_MAX_KEYS names it is the "(other)" slot."""
+    if key not in table:
+        if len(table) >= REPORT_MAX_KEYS:
+            key = OTHER
+        if key not in table:
+            table[key] = new()
+    return key
+
+
+def _count(table, key, n=1):
+    key = _slot(table, key, int)
+    table[key] += n
+
+
+def _served_cocktails(menu):
+    """Cocktails with a non-zero share of a non-zero spirit in a non-zero category."""
+    served = set()
+    for cat, cat_data in menu.items():
+        if cat in core.SIMPLE_CATEGORIES or not cat_data.get("macro_pct"):
+            continue
+        for spirit_data in cat_data.get("spirits", {}).values():
+            if spirit_data.get("pct"):
+                served.update(drink for drink, share in spirit_data.get("drinks", {}).items() if share)
+    return served
+
+
+def _user_values(settings, result):
+    """
+    What one user adds to the totals, read and checked in full first:
+    raises ValueError (or KeyError, TypeError) on values that are not counts.
+    """
+    guests, ml = settings["guests"], settings["alcohol_ml_per_person"]
+    if type(guests) not in _NUMBER or type(ml) not in _NUMBER:
+        raise ValueError("guests and alcohol_ml_per_person must be numbers")
+    items = [(str(item["name"]), item["quantity"], item["cost_min"], item["cost_max"], item["unit"])
+             for item in result["shopping_list"] if item["quantity"] > 0]
+    if any(type(v) not in _NUMBER for _, *values, _ in items for v in values):
+        raise ValueError("shopping list amounts must be numbers")
+    return {"guests": guests, "bucket": max(bisect_right(GUEST_BUCKETS, guests) - 1, 0), "ml": ml,
+            "served": {str(name) for name in _served_cocktails(settings["menu"])}, "items": items,
+            "cost_min": result["total_min"], "cost_max": result["total_max"]}
+
+
+def _add_user(acc, user):
+    # Only values from _user_values(): nothing below can fail half-way
+    acc["users"]        += 1
+    acc["guests_total"] += user["guests"]
+    acc["cost_min"]     += user["cost_min"]
+    acc["cost_max"]     += user["cost_max"]
+    _count(acc["guests"], user["bucket"])
+    _count(acc["alcohol"], user["ml"])
+    for name in user["served"]:
+        _count(acc["cocktails"], name)
+    ingredients = acc["ingredients"]
+    for name, quantity, cost_min, cost_max, unit in user["items"]:
+        slot = ingredients[_slot(ingredients, name, lambda: [0, 0, 0.0, 0.0, unit])]
+        slot[0] += 1
+        slot[1] += quantity
+        slot[2] += cost_min
+        slot[3] += cost_max
+
+
+def _chunk(users):
+    """Pool job: [(settings, overlay), ...] → totals for those users."""
+    acc     = _empty()
+    default = store.merged_catalog(None)
+    digest  = store.catalog_digest(default)
+    for settings, overlay in users:
+        try:
+            if overlay is None:
+                result = core.calculate_compiled(settings, default, digest)
+            else:
+                result = core.calculate_compiled(settings, store.merged_catalog(overlay))
+            user = _user_values(settings, result)
+        except (KeyError, TypeError, ValueError, AttributeError, ZeroDivisionError):
+            # Settings saved by an older version or edited by hand: counted, never half-added
+            acc["failed"] += 1
+            continue
+        _add_user(acc, user)
+    return acc
+
+
+def _merge(acc, part):
+    for key in ("users", "failed", "guests_total", "cost_min", "cost_max"):
+        acc[key] += part[key]
+    for section in ("guests", "alcohol", "cocktails"):
+        for key, n in part[section].items():
+            _count(acc[section], key, n)
+    for name, (users, quantity, cost_min, cost_max, unit) in part["ingredients"].items():
+        slot = acc["ingredients"][_slot(acc["ingredients"], name, lambda: [0, 0, 0.0, 0.0, unit])]
+        slot[0] += users
+        slot[1] += quantity
+        slot[2] += cost_min
+        slot[3] += cost_max
+
+
+def _jobs(users, chunk):
+    batch = []
+    for _, settings, overlay in users:
+        batch.append((settings, overlay))
+        if len(batch) >= chunk:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+def aggregate(users=None, workers=None, chunk=REPORT_CHUNK):
+    """
+    Yields the running totals after each chunk; the last one covers every
+    user. `users` defaults to store.iter_users().
+    """
+    acc = _empty()
+    for part in core.imap_chunks(_chunk, _jobs(users if users is not None else store.iter_users(), chunk),
+                                 workers):
+        _merge(acc, part)
+        yield acc
+
+
+# ── Rows ───────────────────────────────────────────────────────
+
+def _guest_range(i):
+    if i + 1 < len(GUEST_BUCKETS):
+        return f"{GUEST_BUCKETS[i]}-{GUEST_BUCKETS[i + 1] - 1}"
+    return f"{GUEST_BUCKETS[i]}+"
+
+
+def report_rows(acc):
+    """The totals as rows of FIELDS; names by users, most first; the "end" row last."""
+    computed = acc["users"]
+    share    = lambda n: round(n / computed, 4) if computed else None
+    yield {"section": "total", "key": "all", "users": computed, "share": share(computed),
+           "quantity": acc["guests_total"], "cost_min": round(acc["cost_min"], 2),
+           "cost_max": round(acc["cost_max"], 2)}
+    yield {"section": "failed", "key": "all", "users": acc["failed"]}
+    for i, n in sorted(acc["guests"].items()):
+        yield {"section": "guests", "key": _guest_range(i), "users": n, "share": share(n)}
+    for ml, n in sorted(acc["alcohol"].items(), key=lambda kv: (kv[0] == OTHER, 0 if kv[0] == OTHER else kv[0])):
+        yield {"section": "alcohol_ml_per_person", "key": ml if ml == OTHER else f"{ml:g}",
+               "users": n, "share": share(n)}
+    for name, n in sorted(acc["cocktails"].items(), key=lambda kv: (-kv[1], kv[0])):
+        yield {"section": "cocktail", "key": name, "users": n, "share": share(n)}
+    for name, (n, quantity, cost_min, cost_max, unit) in sorted(acc["ingredients"].items(),
+                                                                key=lambda kv: (-kv[1][0], kv[0])):
+        yield {"section": "ingredient", "key": name, "users": n, "share": share(n), "quantity": quantity,
+               "unit": unit, "cost_min": round(cost_min, 2), "cost_max": round(cost_max, 2)}
+    # Completeness marker: a report missing it was truncated
+    yield {"section": "end", "key": "all", "users": computed + acc["failed"]}
+
+
+def write_rows(rows, fmt):
+    """Yields rows as CSV or NDJSON text, one row at a time."""
+    if fmt == "csv":
+        buf    = io.StringIO()
+        writer = csv.DictWriter(buf, FIELDS)
+        writer.writeheader()
+        for row in rows:
+            writer.writerow(row)
+            yield buf.getvalue()
+            buf.seek(0)
+            buf.truncate()
+        return
+    for row in rows:
+        yield json.dumps(row, ensure_ascii=False) + "\n"
+
+
+def stream_report(fmt, users=None, workers=None, chunk=REPORT_CHUNK):
+    """The whole report as text chunks: progress lines (NDJSON only), then the rows."""
+    acc, reported = _empty(), 0
+    for acc in aggregate(users, workers, chunk):
+        seen = acc["users"] + acc["failed"]
+        if fmt == "ndjson" and seen - reported >= PROGRESS_EVERY:
+            reported = seen
+            yield json.dumps({"section": "progress", "users": seen}) + "\n"
+    yield from write_rows(report_rows(acc), fmt)
+
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    ap.add_argument("--format", choices=sorted(FORMATS), default="csv")
+    ap.add_argument("-o", "--output", help="file to write (default: stdout)")
+    ap.add_argument("--workers", type=int, help=f"pool processes (default RISK_WORKERS={core.RISK_WORKERS})")
+    ap.add_argument("--chunk", type=int, default=REPORT_CHUNK, help="users per pool job")
+    opts = ap.parse_args(argv)
+
+    t   = time.perf_counter()
+    out = open(opts.output, "w", encoding="utf-8", newline="") if opts.output else sys.stdout
+    try:
+        for text in stream_report(opts.format, workers=opts.workers, chunk=opts.chunk):
+            out.write(text)
+    finally:
+        if out is not sys.stdout:
+            out.close()
+    print(f"report done in {time.perf_counter() - t:.1f}s", file=sys.stderr)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,11 +1,21 @@
-import os, io
+import os, io, hashlib, math, threading
+from collections import OrderedDict
 from datetime import datetime
-from flask import Flask, render_template, request, jsonify, send_file, session, redirect, url_for, request
-from store import (get_catalog, get_settings, save_settings,
+from flask import (Flask, render_template, request, jsonify, send_file, session, redirect, url_for,
+                   make_response)
+from markupsafe import Markup
+from store import (get_catalog, get_settings, get_bundle, save_settings,
                    add_ingredient, delete_ingredient, update_ingredient_price,
-                   add_cocktail, delete_cocktail)
-from core import calculate, validate_menu, ALCOHOL_LEVELS
-from authlib.integrations.flask_client import OAuth
+                   add_cocktail, delete_cocktail, apply_catalog_batch,
+                   get_events, save_event, delete_event, get_season,
+                   pool_stats, cache_stats, write_stats, settle_settings,
+                   catalog_digest, bundle_digest, migrate, ping, USE_DB)
+from core import (calculate_compiled, plan_for, plan_key, cached_plan, remember_plan, apply_change, plan_cache_stats,
+                  client_plan, sweep, simulate_risk, plan_season, validate_menu,
+                  break_even_exact, min_ticket_price, max_guests_within, ALCOHOL_LEVELS, MAX_SCENARIOS)
+from catalog_io import read_rows, parse_row, export_rows, FORMATS
+from report import stream_report
+import metrics
 from dotenv import load_dotenv
 from functools import wraps
 
@@ -15,26 +25,44 @@ app = Flask(__name__)
 
 app.secret_key = os.environ.get("SECRET_KEY", "dev-secret")
 
-oauth = OAuth(app)
-google = oauth.register(
-    name="google",
-    client_id=os.environ.get("GOOGLE_CLIENT_ID"),
-    client_secret=os.environ.get("GOOGLE_CLIENT_SECRET"),
-    server_metadata_url="https://accounts.google.com/.well-known/openid-configuration",
-    client_kwargs={"scope": "openid email profile"},
-)
+# Stages reported in Server-Timing and /metrics; left untouched unless METRICS_ENABLED=1
+validate_menu      = metrics.timed("validate")(validate_menu)
+calculate_compiled = metrics.timed("calculate")(calculate_compiled)
+apply_change       = metrics.timed("calculate")(apply_change)
+sweep              = metrics.timed("sweep")(sweep)
+simulate_risk      = metrics.timed("risk")(simulate_risk)
+plan_season        = metrics.timed("season")(plan_season)
+render_template    = metrics.timed("render")(render_template)
 
 
 # ── Auth routes ───────────────────────────────────────────────
+# authlib is imported, and Google's OpenID metadata fetched, on the first
+# sign-in rather than at import: workers boot fast and offline.
+
+_oauth      = {"google": None}
+_oauth_lock = threading.Lock()
+
+def _google():
+    with _oauth_lock:
+        if _oauth["google"] is None:
+            from authlib.integrations.flask_client import OAuth
+            _oauth["google"] = OAuth(app).register(
+                name="google",
+                client_id=os.environ.get("GOOGLE_CLIENT_ID"),
+                client_secret=os.environ.get("GOOGLE_CLIENT_SECRET"),
+                server_metadata_url="https://accounts.google.com/.well-known/openid-configuration",
+                client_kwargs={"scope": "openid email profile"},
+            )
+        return _oauth["google"]
 
 @app.route("/login")
 def login():
     redirect_uri = url_for("auth_callback", _external=True)
-    return google.authorize_redirect(redirect_uri)
+    return _google().authorize_redirect(redirect_uri)
 
 @app.route("/auth/callback")
 def auth_callback():
-    token    = google.authorize_access_token()
+    token    = _google().authorize_access_token()
     userinfo = token["userinfo"]
     session["user_id"] = userinfo["sub"]   # Google's unique user ID
     session["email"]   = userinfo["email"]
@@ -71,24 +99,120 @@ def api_login_required(f):
         return f(*args, **kwargs)
     return decorated
 
+# Operators, by Google account email: ADMIN_EMAILS=a@example.com,b@example.com
+ADMIN_EMAILS = {e.strip().lower() for e in os.environ.get("ADMIN_EMAILS", "").split(",") if e.strip()}
+
+def admin_required(f):
+    """Returns a JSON 403 unless the signed-in email is in ADMIN_EMAILS (use after api_login_required)."""
+    @wraps(f)
+    def decorated(*args, **kwargs):
+        if session.get("email", "").lower() not in ADMIN_EMAILS:
+            return jsonify({"ok": False, "error": "Forbidden",
+                            "message": "This report is for operators only."}), 403
+        return f(*args, **kwargs)
+    return decorated
+
+# ── Result memo & conditional responses ──────────────────────
+# Results and rendered fragments are pure functions of bundle_digest(), so
+# they are memoized on it, and ETags built from it let a repeat request end
+# in a 304 after one hash check. BUILD_ID folds in the templates, static
+# files and every module next to this one (calculation, catalog merge,
+# response shaping), so a deploy never revalidates stale pages.
+
+RESULT_MEMO_SIZE = int(os.environ.get("RESULT_MEMO_SIZE", 512))
+
+_memo       = OrderedDict()   # (kind, bundle digest) → result / rendered fragment
+_memo_lock  = threading.Lock()
+_memo_stats = {"hits": 0, "misses": 0}
+
+def _build_id():
+    here = os.path.dirname(os.path.abspath(__file__))
+    h    = hashlib.sha1()
+    paths = sorted(name for name in os.listdir(here) if name.endswith(".py"))
+    for top in ("templates", "static"):
+        for root, dirs, files in os.walk(os.path.join(here, top)):
+            dirs.sort()
+            paths += sorted(os.path.relpath(os.path.join(root, name), here) for name in files)
+    for path in paths:
+        # The name too: moving code between files is a change
+        h.update(path.encode() + b"\0")
+        with open(os.path.join(here, path), "rb") as f:
+            h.update(f.read())
+    return h.hexdigest()[:12]
+
+BUILD_ID = _build_id()
+
+def _memoized(kind, digest, build):
+    key = (kind, digest)
+    with _memo_lock:
+        if key in _memo:
+            _memo_stats["hits"] += 1
+            _memo.move_to_end(key)
+            return _memo[key]
+        _memo_stats["misses"] += 1
+    value = build()
+    with _memo_lock:
+        _memo[key] = value
+        while len(_memo) > RESULT_MEMO_SIZE:
+            _memo.popitem(last=False)
+    return value
+
+def _digests(settings, catalog):
+    """(bundle digest, plan key): the menu is hashed once for both."""
+    key = plan_key(settings, catalog, catalog_digest(catalog))
+    return bundle_digest(settings, catalog, key), key
+
+def _result(settings, catalog, digest, key):
+    """calculate() for a bundle, memoized on its digest; None while the menu is invalid.
+    Shared between requests, do not mutate."""
+    def build():
+        if validate_menu(settings["menu"]):
+            return None
+        return calculate_compiled(settings, catalog, catalog_digest(catalog), key)
+    return _memoized("result", digest, build)
+
+def _fragment(name, digest, **context):
+    return _memoized(name, digest, lambda: Markup(render_template(FRAGMENTS[name], **context)))
+
+def _etag(*parts):
+    return hashlib.sha1("|".join([BUILD_ID, *map(str, parts)]).encode()).hexdigest()
+
+def _conditional(etag, build, weak=False):
+    """304 when the client already holds `etag`, else build() with the ETag attached."""
+    if request.method in ("GET", "HEAD") and request.if_none_match.contains_weak(etag):
+        response = app.response_class(status=304)
+    else:
+        response = make_response(build())
+    response.set_etag(etag, weak=weak)
+    response.headers["Cache-Control"] = "private, no-cache"
+    return response
+
 # ── PAGES ────────────────────────────────────────────────────
 
 @app.route("/")
 def dashboard():
     user_id  = session.get("user_id")
-    settings = get_settings(user_id)
-    catalog  = get_catalog(user_id)
-    errors   = validate_menu(settings["menu"])
-    result   = calculate(settings, catalog) if not errors else None
-    return render_template("dashboard.html",
-        settings=settings, result=result,
-        errors=errors, levels=ALCOHOL_LEVELS)
+    settings, catalog = get_bundle(user_id)
+    digest, key = _digests(settings, catalog)
+
+    def render():
+        errors  = validate_menu(settings["menu"])
+        result  = _result(settings, catalog, digest, key)
+        context = dict(settings=settings, catalog=catalog, errors=errors, result=result)
+        # Lets the page recompute locally while inputs change (static/plan.js)
+        plan    = client_plan(plan_for(settings, catalog, catalog_digest(catalog), key)) if result else None
+        return render_template("dashboard.html",
+            settings=settings, result=result, errors=errors, levels=ALCOHOL_LEVELS,
+            plan=plan, build=BUILD_ID,
+            fragments={name: _fragment(name, digest, **context)
+                       for name in ("errors", "kpis", "shopping_list")})
+    # The page header shows who is signed in
+    return _conditional(_etag(digest, session.get("name"), session.get("picture")), render)
 
 @app.route("/menu")
 def menu():
     user_id  = session.get("user_id")
-    settings = get_settings(user_id)
-    catalog  = get_catalog(user_id)
+    settings, catalog = get_bundle(user_id)
     errors   = validate_menu(settings["menu"])
     return render_template("menu.html",
         settings=settings, catalog=catalog, errors=errors)
@@ -99,6 +223,71 @@ def catalog_page():
     catalog = get_catalog(user_id)
     return render_template("catalog.html", catalog=catalog)
 
+# ── Partial updates ──────────────────────────────────────────
+# Mutation routes accept ?partial=result,kpis,... and answer with the
+# recalculated result and the named page fragments re-rendered, so pages
+# patch themselves in place instead of reloading.
+
+FRAGMENTS = {
+    "errors":        "partials/dashboard_errors.html",
+    "kpis":          "partials/kpis.html",
+    "shopping_list": "partials/shopping_list.html",
+    "menu_errors":   "partials/menu_errors.html",
+    "menu":          "partials/menu_categories.html",
+    "ingredients":   "partials/ingredients.html",
+    "cocktails":     "partials/cocktails.html",
+}
+NEEDS_RESULT = {"result", "kpis", "shopping_list"}
+
+def _partials():
+    names = request.args.get("partial", "").split(",")
+    return {n for n in names if n == "result" or n in FRAGMENTS}
+
+def _before_change(user_id, parts):
+    """(result, plan) ahead of a catalog edit, when the plan is already compiled."""
+    if not parts & NEEDS_RESULT:
+        return None
+    s, c        = get_bundle(user_id)
+    digest, key = _digests(s, c)
+    plan        = cached_plan(s, c, catalog_digest(c), key)
+    if plan is None:
+        return None
+    # Usually memoized by the page or edit that came before
+    result = _result(s, c, digest, key)
+    return None if result is None else (result, plan)
+
+def _updated(user_id, parts, previous=None, change=None):
+    """
+    {"ok": true} plus whatever ?partial= asked for. With the result and plan
+    from before a catalog edit, the new result comes from apply_change() and
+    its plan is memoized, so the next full calculation skips compiling too.
+    """
+    body = {"ok": True}
+    if not parts:
+        return jsonify(body)
+    settings, catalog = get_bundle(user_id)
+    digest, key = _digests(settings, catalog)
+    errors = validate_menu(settings["menu"])
+    result = None
+    if not errors and parts & NEEDS_RESULT:
+        if previous is not None:
+            def build():
+                result, plan = apply_change(previous[0], change, previous[1], settings)
+                remember_plan(settings, catalog, plan, catalog_digest(catalog), key)
+                return result
+            result = _memoized("result", digest, build)
+        else:
+            result = _result(settings, catalog, digest, key)
+    if "result" in parts:
+        body["result"] = result
+        body["errors"] = errors
+    body["fragments"] = {
+        name: _fragment(name, digest, settings=settings, catalog=catalog,
+                        errors=errors, result=result)
+        for name in parts if name in FRAGMENTS
+    }
+    return jsonify(body)
+
 # ── API: global settings ──────────────────────────────────────
 
 @app.route("/api/settings", methods=["POST"])
@@ -111,7 +300,7 @@ def api_settings():
         if key in request.json:
             s[key] = request.json[key]
     save_settings(user_id, s)
-    return jsonify({"ok": True})
+    return _updated(user_id, _partials())
 
 # ── API: save 3-level menu ────────────────────────────────────
 
@@ -128,19 +317,140 @@ def api_menu():
         if errors:
             return jsonify({"ok": False, "errors": errors}), 400
     save_settings(user_id, s)
-    return jsonify({"ok": True})
+    return _updated(user_id, _partials())
 
 # ── API: recalculate (AJAX) ───────────────────────────────────
 
-@app.route("/api/calculate", methods=["POST"])
+@app.route("/api/calculate", methods=["GET", "POST"])
 def api_calculate():
     user_id = session.get("user_id")
-    s = get_settings(user_id)
-    c = get_catalog(user_id)
+    s, c = get_bundle(user_id)
     errors = validate_menu(s["menu"])
     if errors:
         return jsonify({"ok": False, "errors": errors}), 400
-    return jsonify({"ok": True, "result": calculate(s, c)})
+    digest, key = _digests(s, c)
+    return _conditional(_etag(digest),
+                        lambda: jsonify({"ok": True, "result": _result(s, c, digest, key)}))
+
+# ── API: scenario sweep (profit / break-even grids) ──────────
+
+# Grid points one request may ask for (core.sweep() itself stops at MAX_SCENARIOS)
+SCENARIOS_REQUEST_MAX = min(int(os.environ.get("SCENARIOS_REQUEST_MAX", 250_000)), MAX_SCENARIOS)
+
+def _axis_len(spec, default):
+    """Number of values _axis() would give, without building them."""
+    if spec is None:
+        return len(default)
+    if isinstance(spec, dict):
+        start, stop, step = spec["start"], spec["stop"], spec.get("step", 1)
+        if step <= 0 or stop < start:
+            raise ValueError("range needs step > 0 and stop >= start")
+        return int((stop - start) / step + 1e-9) + 1
+    if isinstance(spec, list):
+        return len(spec)
+    return 1
+
+def _axis(spec, default):
+    """A grid axis: a list of values, a {start, stop, step} range, or a scalar."""
+    if spec is None:
+        return default
+    if isinstance(spec, dict):
+        return [spec["start"] + i * spec.get("step", 1) for i in range(_axis_len(spec, default))]
+    if isinstance(spec, list):
+        return spec
+    return [spec]
+
+@app.route("/api/scenarios", methods=["POST"])
+@api_login_required
+def api_scenarios():
+    user_id = session["user_id"]
+    s, c = get_bundle(user_id)
+    errors = validate_menu(s["menu"])
+    if errors:
+        return jsonify({"ok": False, "errors": errors}), 400
+    data = request.json or {}
+    specs = [(data.get("guests"), [s["guests"]]),
+             (data.get("ticket_price"), [s["ticket_price"]]),
+             (data.get("alcohol_ml_per_person"), list(ALCOHOL_LEVELS)),
+             (data.get("buffer"), [s["buffer"]])]
+    try:
+        # Sized arithmetically first: no axis is built for an oversized grid
+        size = math.prod(_axis_len(spec, default) for spec, default in specs)
+        if size > SCENARIOS_REQUEST_MAX:
+            raise ValueError(f"{size} scenarios requested (max {SCENARIOS_REQUEST_MAX} per request)")
+        guests, ticket_price, alcohol_ml, buffer = (_axis(spec, default) for spec, default in specs)
+        result = sweep(
+            plan_for(s, c, catalog_digest(c)),
+            guests       = [int(g) for g in guests],
+            ticket_price = ticket_price,
+            alcohol_ml   = alcohol_ml,
+            buffer       = buffer,
+            venue_cost     = s["venue_cost"],
+            equipment_cost = s["equipment_cost"],
+            quantities     = bool(data.get("quantities", True)),
+        )
+    except (KeyError, TypeError, ValueError, OverflowError) as e:
+        return jsonify({"ok": False, "error": str(e)}), 400
+    return jsonify({"ok": True, "result": result})
+
+# ── API: Monte Carlo risk ────────────────────────────────────
+
+# Draws one request may run; larger asks are clamped (the result reports `draws`)
+RISK_REQUEST_DRAWS = int(os.environ.get("RISK_REQUEST_DRAWS", 200_000))
+
+@app.route("/api/risk", methods=["POST"])
+@api_login_required
+def api_risk():
+    user_id = session["user_id"]
+    s, c = get_bundle(user_id)
+    errors = validate_menu(s["menu"])
+    if errors:
+        return jsonify({"ok": False, "errors": errors}), 400
+    data = request.json or {}
+    try:
+        result = simulate_risk(
+            plan_for(s, c, catalog_digest(c)), s,
+            draws         = min(int(data.get("draws", 100_000)), RISK_REQUEST_DRAWS),
+            seed          = data.get("seed"),
+            attendance    = data.get("attendance"),
+            consumption   = data.get("consumption"),
+            service_level = float(data.get("service_level", 0.95)),
+        )
+    except (KeyError, TypeError, ValueError) as e:
+        return jsonify({"ok": False, "error": str(e)}), 400
+    return jsonify({"ok": True, "result": result})
+
+# ── API: exact solvers ───────────────────────────────────────
+
+@app.route("/api/solve", methods=["POST"])
+@api_login_required
+def api_solve():
+    """
+    Exact break-even (worst/best prices), the minimum ticket price for a
+    target profit, and — when a spending cap is given — the most guests it covers.
+    """
+    user_id = session["user_id"]
+    s, c = get_bundle(user_id)
+    errors = validate_menu(s["menu"])
+    if errors:
+        return jsonify({"ok": False, "errors": errors}), 400
+    data = request.json or {}
+    plan = plan_for(s, c, catalog_digest(c))
+    try:
+        target = float(data.get("target_profit", 0))
+        result = {
+            "break_even_min":   break_even_exact(plan, s, "min"),
+            "break_even_max":   break_even_exact(plan, s, "max"),
+            "min_ticket_price": min_ticket_price(plan, s, target, "min", data.get("guests")),
+            "target_profit":    target,
+        }
+        if data.get("spend_cap") is not None:
+            result["max_guests"] = max_guests_within(
+                plan, s, float(data["spend_cap"]),
+                include_fixed=bool(data.get("include_fixed", True)))
+    except (TypeError, ValueError) as e:
+        return jsonify({"ok": False, "error": str(e)}), 400
+    return jsonify({"ok": True, "result": result})
 
 # ── API: ingredients CRUD ─────────────────────────────────────
 
@@ -162,7 +472,7 @@ def add_ingredient_route():
         "price_min": float(data.get("price_min", 0)),
         "price_max": float(data.get("price_max", 0)),
     })
-    return jsonify({"ok": True})
+    return _updated(user_id, _partials())
 
 @app.route("/api/catalog/ingredient/price", methods=["POST"])
 @api_login_required
@@ -177,15 +487,20 @@ def update_ingredient_price_route():
     price_max = float(data.get("price_max", 0))
     if price_min > price_max:
         return jsonify({"ok": False, "error": "Min price cannot exceed max price"}), 400
+    parts    = _partials()
+    previous = _before_change(user_id, parts)
     update_ingredient_price(user_id, name, price_min, price_max)
-    return jsonify({"ok": True})
+    return _updated(user_id, parts, previous,
+                    {"op": "price", "name": name, "price_min": price_min, "price_max": price_max})
 
 @app.route("/api/catalog/ingredient/<name>", methods=["DELETE"])
 @api_login_required
 def delete_ingredient_route(name):
-    user_id = session["user_id"]
+    user_id  = session["user_id"]
+    parts    = _partials()
+    previous = _before_change(user_id, parts)
     delete_ingredient(user_id, name)
-    return jsonify({"ok": True})
+    return _updated(user_id, parts, previous, {"op": "delete_ingredient", "name": name})
 
 
 # ── API: cocktails CRUD ───────────────────────────────────────
@@ -204,23 +519,305 @@ def add_cocktail_route():
         "category":    data["category"],
         "recipe":      data["recipe"],
     })
-    return jsonify({"ok": True})
+    return _updated(user_id, _partials())
 
 @app.route("/api/catalog/cocktail/<name>", methods=["DELETE"])
 @api_login_required
 def delete_cocktail_route(name):
-    user_id = session["user_id"]
+    user_id  = session["user_id"]
+    parts    = _partials()
+    previous = _before_change(user_id, parts)
     delete_cocktail(user_id, name)
+    return _updated(user_id, parts, previous, {"op": "delete_cocktail", "name": name})
+
+# ── API: bulk catalog import / export ──────────────────────────
+
+IMPORT_BATCH      = int(os.environ.get("IMPORT_BATCH", 500))   # rows per write
+IMPORT_MAX_ERRORS = 1000                                        # row errors reported in full
+
+def _catalog_format():
+    fmt = request.args.get("format")
+    if fmt is None:
+        fmt = "csv" if request.mimetype == "text/csv" else "ndjson"
+    if fmt not in FORMATS:
+        raise ValueError(f"format must be one of {', '.join(FORMATS)}")
+    return fmt
+
+@app.route("/api/catalog/import", methods=["POST"])
+@api_login_required
+def import_catalog_route():
+    """
+    Streams a CSV / NDJSON body (see catalog_io) into the user's overlay.
+    Rows are validated as they are read; valid ones are written every
+    IMPORT_BATCH rows, one statement per batch, and invalid ones are
+    reported by line without stopping the import.
+    """
+    user_id = session["user_id"]
+    try:
+        fmt = _catalog_format()
+    except ValueError as e:
+        return jsonify({"ok": False, "error": str(e)}), 400
+
+    catalog  = get_catalog(user_id)
+    defaults = get_catalog()
+    # Shipped entries the user still has: rows repeating them are not copied
+    shipped  = {part: {n: d for n, d in defaults[part].items() if n in catalog[part]}
+                for part in ("ingredients", "cocktails")}
+    known    = set(catalog["ingredients"])
+    imported = {}   # ingredients added by this import: later price rows patch them
+    batch    = {"ingredients": {}, "prices": {}, "cocktails": {}}
+    counts   = {"ingredient": 0, "price": 0, "cocktail": 0, "unchanged": 0}
+    errors, failed, pending = [], 0, 0
+
+    lines = io.TextIOWrapper(io.BufferedReader(request.stream), encoding="utf-8-sig", newline="")
+    for line, row in read_rows(lines, fmt):
+        try:
+            if isinstance(row, ValueError):
+                raise row
+            kind, name, data = parse_row(row, known, shipped)
+        except ValueError as e:
+            if len(errors) < IMPORT_MAX_ERRORS:
+                errors.append({"line": line, "error": str(e)})
+            failed += 1
+            continue
+        if kind == "unchanged":
+            counts[kind] += 1
+            continue
+        if kind == "ingredient":
+            known.add(name)
+            imported[name] = batch["ingredients"][name] = data
+        elif kind == "price" and name in imported:
+            imported[name] = batch["ingredients"][name] = {
+                **imported[name], "price_min": data[0], "price_max": data[1]}
+        elif kind == "price":
+            batch["prices"][name] = data
+        else:
+            batch["cocktails"][name] = data
+        counts[kind] += 1
+        pending += 1
+        if pending >= IMPORT_BATCH:
+            apply_catalog_batch(user_id, **batch)
+            batch   = {"ingredients": {}, "prices": {}, "cocktails": {}}
+            pending = 0
+    if pending:
+        apply_catalog_batch(user_id, **batch)
+    return jsonify({"ok": True, "imported": counts, "failed": failed, "errors": errors})
+
+@app.route("/api/catalog/export")
+def export_catalog_route():
+    try:
+        fmt = _catalog_format()
+    except ValueError as e:
+        return jsonify({"ok": False, "error": str(e)}), 400
+    catalog  = get_catalog(session.get("user_id"))
+    filename = f"catalog_{datetime.now().strftime('%Y%m%d')}.{fmt}"
+    return app.response_class(export_rows(catalog, fmt), mimetype=FORMATS[fmt],
+                              headers={"Content-Disposition": f"attachment; filename={filename}"})
+
+# ── API: cross-user report (operators) ─────────────────────────
+
+@app.route("/api/admin/report")
+@api_login_required
+@admin_required
+def admin_report_route():
+    """Aggregates over every user (see report.py), streamed as CSV or NDJSON while it runs."""
+    try:
+        fmt = _catalog_format()
+    except ValueError as e:
+        return jsonify({"ok": False, "error": str(e)}), 400
+    filename = f"report_{datetime.now().strftime('%Y%m%d')}.{fmt}"
+    return app.response_class(stream_report(fmt), mimetype=FORMATS[fmt],
+                              headers={"Content-Disposition": f"attachment; filename={filename}",
+                                       "X-Accel-Buffering": "no"})
+
+# ── API: DB pool / cache statistics ──────────────────────────
+
+@app.route("/healthz")
+def healthz():
+    """Readiness probe: the app is loaded and, with a database, answers one round trip."""
+    if USE_DB:
+        try:
+            ping()
+        except Exception as e:
+            app.logger.warning("healthz: database unreachable: %s", e)
+            return jsonify({"ok": False, "build": BUILD_ID, "db": "unreachable"}), 503
+    return jsonify({"ok": True, "build": BUILD_ID, "db": "ok" if USE_DB else "local"})
+
+# Worker diagnostics (PIDs, pool sizing, cache and write-queue state): operators only
+
+@app.route("/api/db/pool")
+@api_login_required
+@admin_required
+def api_db_pool():
+    return jsonify(pool_stats())
+
+@app.route("/api/db/cache")
+@api_login_required
+@admin_required
+def api_db_cache():
+    return jsonify(cache_stats())
+
+@app.route("/api/db/writes")
+@api_login_required
+@admin_required
+def api_db_writes():
+    return jsonify(write_stats())
+
+@app.teardown_request
+def _settle_writes(exc):
+    # With SETTINGS_WRITE_DELAY_MS=0 (several workers) a save is stored
+    # before its response goes out, so any worker serves the next read
+    settle_settings(session.get("user_id"))
+
+# ── Instrumentation ──────────────────────────────────────────
+# With METRICS_ENABLED=1 every response carries a Server-Timing header
+# (stages, DB queries and connections, total) and /metrics serves
+# Prometheus histograms and cache hit rates for this worker process.
+
+def _hit_rates():
+    caches = {"catalog": cache_stats(), "result": _memo_stats, "plan": plan_cache_stats()}
+    pool   = pool_stats()
+    return [
+        ("bottlecount_cache_hits_total", "counter", "Cache lookups served from memory.",
+         [({"cache": name}, s["hits"]) for name, s in caches.items()]),
+        ("bottlecount_cache_misses_total", "counter", "Cache lookups that had to rebuild.",
+         [({"cache": name}, s["misses"]) for name, s in caches.items()]),
+        ("bottlecount_cache_hit_ratio", "gauge", "Hits over lookups since start.",
+         [({"cache": name}, round(s["hits"] / (s["hits"] + s["misses"]), 4))
+          for name, s in caches.items() if s["hits"] + s["misses"]]),
+        ("bottlecount_db_pool_connections", "gauge", "Pooled connections by state.",
+         [({"state": state}, pool[state]) for state in ("idle", "in_use")]),
+        ("bottlecount_db_pool_wait_seconds_total", "counter", "Time spent waiting for a connection.",
+         [({}, pool["wait_seconds"])]),
+    ]
+
+if metrics.ENABLED:
+    metrics.register_collector(_hit_rates)
+
+    @app.before_request
+    def _begin_timing():
+        metrics.begin_request()
+
+    @app.after_request
+    def _end_timing(response):
+        route = request.url_rule.rule if request.url_rule else "unmatched"
+        response.headers["Server-Timing"] = metrics.end_request(
+            route, request.method, response.status_code)
+        return response
+
+@app.route("/metrics")
+def metrics_route():
+    if not metrics.ENABLED:
+        return jsonify({"ok": False, "error": "metrics are disabled (set METRICS_ENABLED=1)"}), 404
+    return app.response_class(metrics.render(), mimetype="text/plain; version=0.0.4")
+
+# ── API: events & season planning ─────────────────────────────
+
+# Settings an event may override; the rest follow the user's current settings
+EVENT_FIELDS = ["date", "guests", "ticket_price", "venue_cost", "equipment_cost",
+                "alcohol_ml_per_person", "buffer", "menu", "extras"]
+
+@app.route("/api/events")
+def api_events():
+    return jsonify({"ok": True, "events": get_events(session.get("user_id"))})
+
+@app.route("/api/events", methods=["POST"])
+@api_login_required
+def save_event_route():
+    user_id = session["user_id"]
+    data    = request.json or {}
+    name    = str(data.get("name", "")).strip()
+    if not name:
+        return jsonify({"ok": False, "error": "Event name missing"}), 400
+    event = {k: data[k] for k in EVENT_FIELDS if k in data}
+    if "menu" in event:
+        errors = validate_menu(event["menu"])
+        if errors:
+            return jsonify({"ok": False, "errors": errors}), 400
+    save_event(user_id, name, event)
     return jsonify({"ok": True})
 
+@app.route("/api/events/<name>", methods=["DELETE"])
+@api_login_required
+def delete_event_route(name):
+    delete_event(session["user_id"], name)
+    return jsonify({"ok": True})
+
+def _season():
+    """(season plan, errors) for the signed-in user's events."""
+    events, catalog = get_season(session.get("user_id"))
+    if not events:
+        return None, ["No events yet"]
+    errors = [f"{ev['name']}: {e}" for ev in events for e in validate_menu(ev["menu"])]
+    if errors:
+        return None, errors
+    return plan_season(events, catalog, catalog_digest(catalog)), []
+
+@app.route("/api/season", methods=["GET", "POST"])
+def api_season():
+    result, errors = _season()
+    if errors:
+        return jsonify({"ok": False, "errors": errors}), 400
+    return jsonify({"ok": True, "result": result})
+
+@app.route("/api/season/export")
+def export_season_txt():
+    r, errors = _season()
+    if errors:
+        return jsonify({"ok": False, "errors": errors}), 400
+    lines = [
+        "=" * 62,
+        f"  SEASON PLAN - {len(r['events'])} EVENTS",
+        "=" * 62,
+        f"  {'Event':<22} {'Date':<10} {'Guests':>6} {'Spend E':>9} {'Profit E':>9}  (worst case)",
+        "  " + "-" * 60,
+    ]
+    for e in r["events"]:
+        lines.append(
+            f"  {e['name'][:22]:<22} {e['date'] or '':<10} {e['guests']:>6} "
+            f"{e['total_max']:>9.2f} {e['profit_min']:>9.2f}"
+        )
+    lines += [
+        "",
+        f"  Revenue      : E{r['revenue']}",
+        f"  Profit       : E{r['profit_min']} - E{r['profit_max']}",
+        f"  Spend        : E{r['total_min']} - E{r['total_max']}"
+        f" (E{r['standalone_total_min']} - E{r['standalone_total_max']} bought per event)",
+        "",
+        "=" * 62,
+        "  COMBINED SHOPPING LIST",
+        "=" * 62,
+        f"  {'Type':<8} {'Item':<26} {'Qty':>5} {'Unit':<6} {'Min E':>7} {'Max E':>7}",
+        "  " + "-" * 60,
+    ]
+    for item in r["shopping_list"]:
+        lines.append(
+            f"  {item['type']:<8} {item['name']:<26} {item['quantity']:>5} "
+            f"{item['unit']:<6} {item['cost_min']:>7.2f} {item['cost_max']:>7.2f}"
+        )
+        for pack in item.get("packs", []):
+            lines.append(f"  {'':<8}   {pack['count']:>4} x {pack['format']}")
+    if r["leftovers"]:
+        lines += ["", "  Left over after the last event:"]
+        lines += [f"    {l['name']:<26} {l['amount']:>9} {l['unit']}" for l in r["leftovers"]]
+    lines.append(f"\n  Generated on {datetime.now().strftime('%d/%m/%Y %H:%M')}")
+    buf = io.BytesIO("\n".join(lines).encode("utf-8"))
+    filename = f"season_{datetime.now().strftime('%Y%m%d')}.txt"
+    return send_file(buf, as_attachment=True, download_name=filename, mimetype="text/plain")
+
 # ── API: export shopping list as TXT ─────────────────────────
 
 @app.route("/api/export")
 def export_txt():
     user_id = session.get("user_id")
-    s = get_settings(user_id)
-    c = get_catalog(user_id)
-    r = calculate(s, c)
+    s, c = get_bundle(user_id)
+    digest, key = _digests(s, c)
+    # Weak: the body carries a generation timestamp
+    return _conditional(_etag(digest), lambda: _export(s, c, digest, key), weak=True)
+
+def _export(s, c, digest, key):
+    # The export does not block on menu errors; compute those directly
+    r = _result(s, c, digest, key) or calculate_compiled(s, c, catalog_digest(c), key)
     lines = [
         "=" * 62,
         f"  PARTY BUDGET - {s['guests']} GUESTS",
@@ -243,6 +840,8 @@ def export_txt():
             f"  {item['type']:<8} {item['name']:<26} {item['quantity']:>5} "
             f"{item['unit']:<6} {item['cost_min']:>7.2f} {item['cost_max']:>7.2f}"
         )
+        for pack in item.get("packs", []):
+            lines.append(f"  {'':<8}   {pack['count']:>4} x {pack['format']}")
     lines += [
         "  " + "-" * 60,
         f"  TOTAL SPEND  : E{r['total_min']} - E{r['total_max']}",
@@ -256,5 +855,8 @@ def export_txt():
 
 
 if __name__ == "__main__":
+    # The development server bootstraps the schema itself; deploys run `python store.py migrate`
+    if USE_DB:
+        migrate()
     port = int(os.environ.get("PORT", 5000))
     app.run(host="0.0.0.0", port=port, debug=False)
@@ -0,0 +1,139 @@
+// Evaluates a client plan (core.client_plan()) in the browser, so the
+// dashboard can recompute while inputs change. Mirrors core.evaluate():
+// same operation order, same rounding, so every figure is identical to the
+// server's calculate(). bench/client.py checks both against shared cases.
+(function (root, factory) {
+  if (typeof module === "object" && module.exports) module.exports = factory();
+  else root.BottlePlan = factory();
+})(this, function () {
+
+  // Python's round(x, 2): the exact binary value, ties to even. toFixed()
+  // rounds the exact value too but breaks ties upwards; a tie means x is an
+  // odd multiple of 1/8.
+  function round2(x) {
+    if (Number.isInteger(x * 8) && !Number.isInteger(x * 4)) {
+      const lo = Math.floor(x * 100);
+      return (lo % 2 === 0 ? lo : lo + 1) / 100;
+    }
+    return Number(x.toFixed(2));
+  }
+
+  // Python's "%.2f" % x
+  function format2(x) {
+    return round2(x).toFixed(2);
+  }
+
+  // ── Purchase formats: core._pack_table() / buy_packs() ──────────
+  const tables = new WeakMap();   // packs → {cover, counts}
+
+  function packTable(packs, upto) {
+    let table = tables.get(packs);
+    if (!table) {
+      table = { cover: [[0, 0]], counts: [packs.units.map(() => 0)] };
+      tables.set(packs, table);
+    }
+    const { cover, counts } = table;
+    for (let u = cover.length; u <= Math.min(upto, packs.limit); u++) {
+      // min() over (cost, packs, format, prev) tuples, as in Python
+      let best = null;
+      packs.units.forEach((size, f) => {
+        const prev   = Math.max(0, u - size);
+        const option = [cover[prev][0] + packs.value[f], cover[prev][1] + 1, f, prev];
+        if (best === null || tupleLess(option, best)) best = option;
+      });
+      const [cost, n, f, prev] = best;
+      cover.push([cost, n]);
+      const mix = counts[prev].slice();
+      mix[f] += 1;
+      counts.push(mix);
+    }
+    return table;
+  }
+
+  function tupleLess(a, b) {
+    for (let i = 0; i < a.length; i++) {
+      if (a[i] < b[i]) return true;
+      if (a[i] > b[i]) return false;
+    }
+    return false;
+  }
+
+  function buyPacks(packs, need) {
+    let u     = Math.max(Math.ceil(need / packs.grain), 0);
+    let extra = 0;
+    const table = packTable(packs, u);
+    if (u > packs.limit) {
+      const step = packs.units[packs.best];
+      extra = Math.ceil((u - packs.limit) / step);
+      u    -= extra * step;
+    }
+    const counts = table.counts[u].slice();
+    counts[packs.best] += extra;
+
+    let costMin = 0, costMax = 0;
+    packs.formats.forEach(([, pmin, pmax], f) => {
+      costMin = costMin + round2(counts[f] * pmin);
+      costMax = costMax + round2(counts[f] * pmax);
+    });
+    const breakdown = [];
+    packs.formats.forEach(([name], f) => {
+      if (counts[f]) breakdown.push({ format: name, count: counts[f] });
+    });
+    return [counts.reduce((a, b) => a + b, 0), round2(costMin), round2(costMax), breakdown];
+  }
+
+  function purchase(row, need) {
+    if (row.packs) return buyPacks(row.packs, need);
+    const quantity = Math.ceil(row.bottle_ml ? need / row.bottle_ml : need);
+    return [quantity, round2(quantity * row.price_min), round2(quantity * row.price_max), null];
+  }
+
+  // ── core.plan_volumes() / evaluate() / _summarize() ─────────────
+  function volumes(plan, guests, alcoholMl) {
+    const total = guests * alcoholMl;
+    const vols  = plan.rows.map(() => 0);
+    for (const [row, macro, spirit, drink, div, mult] of plan.terms) {
+      vols[row] = vols[row] + mult * ((((total * macro) * spirit) * drink) / div);
+    }
+    for (const [row, qpp, minq] of plan.extras) {
+      vols[row] = Math.max(minq, qpp * guests);
+    }
+    return vols;
+  }
+
+  function evaluate(plan, guests, alcoholMl, buffer, ticketPrice, venueCost, equipmentCost) {
+    const vols = volumes(plan, guests, alcoholMl);
+    const shoppingList = plan.rows.map((row, i) => {
+      const [quantity, costMin, costMax, packs] = purchase(row, vols[i] * buffer);
+      const item = { name: row.name, type: row.type, quantity, unit: row.unit,
+                     cost_min: costMin, cost_max: costMax };
+      if (packs !== null) item.packs = packs;
+      return item;
+    });
+
+    // core._summarize(): totals in integer cents, exact in any order
+    let centsMin = 0, centsMax = 0;
+    for (const r of shoppingList) {
+      centsMin += Math.round(r.cost_min * 100);
+      centsMax += Math.round(r.cost_max * 100);
+    }
+    const totalMin   = centsMin / 100;
+    const totalMax   = centsMax / 100;
+    const fixedCosts = venueCost + equipmentCost;
+    const revenue    = guests * ticketPrice;
+    const avgVarCost = guests > 0 ? (totalMin + totalMax) / 2 / guests : 0;
+    const margin     = ticketPrice - avgVarCost;
+    return {
+      shopping_list: shoppingList,
+      total_min:     round2(totalMin),
+      total_max:     round2(totalMax),
+      fixed_costs:   fixedCosts,
+      revenue:       revenue,
+      profit_min:    round2(revenue - totalMax - fixedCosts),
+      profit_max:    round2(revenue - totalMin - fixedCosts),
+      break_even:    margin > 0 ? Math.ceil(fixedCosts / margin) : null,
+    };
+  }
+
+  return { evaluate, round2, format2 };
+});
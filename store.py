@@ -1,139 +1,999 @@
-import json, os
+import atexit, copy, hashlib, json, logging, os, re, tempfile, threading, time
+from collections import OrderedDict
+from contextlib import contextmanager
+from itertools import groupby
+
+import metrics
+from core import content_digest, plan_key
+
+try:
+    import fcntl
+except ImportError:    # Windows: no cross-process locking, run a single worker
+    fcntl = None
 
 DATABASE_URL = os.environ.get("DATABASE_URL")
 USE_DB = bool(DATABASE_URL)
 
+# Connection pool sizing is per process (each gunicorn worker owns a pool).
+# DB_POOL_MIN connections are opened up front and kept warm; bursts may open up
+# to DB_POOL_MAX, and connections beyond the minimum are closed on return.
+# The default keeps one per request thread (WEB_THREADS, set by the start
+# command) plus one for the settings writer.
+WEB_THREADS      = int(os.environ.get("WEB_THREADS", 1))
+DB_SSLMODE       = os.environ.get("DB_SSLMODE", "require")
+DB_POOL_MIN      = int(os.environ.get("DB_POOL_MIN", WEB_THREADS + 1))
+DB_POOL_MAX      = max(int(os.environ.get("DB_POOL_MAX", 5)), DB_POOL_MIN)
+DB_POOL_TIMEOUT  = float(os.environ.get("DB_POOL_TIMEOUT", 10))    # seconds to wait for a free conn
+DB_POOL_PING_AGE = float(os.environ.get("DB_POOL_PING_AGE", 30))   # ping conns idle longer than this
+
 BASE     = os.path.join(os.path.dirname(__file__), "data")
 CAT_PATH = os.path.join(BASE, "catalog.json")
 SET_PATH = os.path.join(BASE, "settings.json")
+EVT_PATH = os.path.join(BASE, "events.json")
+
+# Merged per-user catalogs kept in memory by each worker
+CATALOG_CACHE_SIZE = int(os.environ.get("CATALOG_CACHE_SIZE", 256))
+
+# Settings saves are written behind, once a user's saves pause this long.
+# RYW holds per process, so with several gunicorn workers (WEB_CONCURRENCY)
+# the default is 0: write at the end of the request that saved.
+SETTINGS_WRITE_DELAY = float(os.environ.get(
+    "SETTINGS_WRITE_DELAY_MS", 0 if int(os.environ.get("WEB_CONCURRENCY", 1)) > 1 else 400)) / 1000
+
+log = logging.getLogger("store")
+
+# ── Local JSON files ───────────────────────────────────────────
+# Without DATABASE_URL settings and events live in JSON files, shared by
+# everyone unless LOCAL_PER_USER=1 gives each signed-in user their own
+# directory under LOCAL_USER_DIR (until their first save a user sees the
+# shared settings and no events). Writes go to a temp file that replaces the
+# original, so readers in any worker see the old or the new version, never
+# a partial one; read-modify-write cycles hold an flock on a .lock file next
+# to the target. Parsed files are cached per process and re-read only when
+# the file's inode, mtime or size changes.
+
+LOCAL_PER_USER  = os.environ.get("LOCAL_PER_USER", "0") == "1"
+LOCAL_USER_DIR  = os.environ.get("LOCAL_USER_DIR", os.path.join(BASE, "users"))
+JSON_CACHE_SIZE = 2 * CATALOG_CACHE_SIZE    # settings + events per user
+
+_SAFE_ID     = re.compile(r"[A-Za-z0-9_-]{1,64}")
+_json_files  = OrderedDict()    # path → (stamp, parsed contents)
+_json_lock   = threading.Lock()
+
+def _stamp(st):
+    return (st.st_ino, st.st_mtime_ns, st.st_size)
 
 def _load_json(path):
     with open(path, encoding="utf-8") as f:
         return json.load(f)
 
+def _read_json(path, default=None):
+    """
+    Cached contents of `path` (`default` if it does not exist). The cached
+    object is shared: callers may replace top-level keys of the returned
+    dict, but must not change nested values in place.
+    """
+    try:
+        stamp = _stamp(os.stat(path))
+    except FileNotFoundError:
+        return default
+    with _json_lock:
+        entry = _json_files.get(path)
+        if entry is not None and entry[0] == stamp:
+            _json_files.move_to_end(path)
+            return dict(entry[1])
+    with open(path, encoding="utf-8") as f:
+        # Stamp what was actually read; the file may have been replaced since
+        stamp, data = _stamp(os.fstat(f.fileno())), json.load(f)
+    _cache_json(path, stamp, data)
+    return dict(data)
+
+def _cache_json(path, stamp, data):
+    with _json_lock:
+        _json_files[path] = (stamp, data)
+        _json_files.move_to_end(path)
+        while len(_json_files) > JSON_CACHE_SIZE:
+            _json_files.popitem(last=False)
+
+@contextmanager
+def _file_lock(path):
+    """Exclusive lock for writers of `path`, across threads and worker processes."""
+    with open(path + ".lock", "a") as f:
+        if fcntl is not None:
+            fcntl.flock(f.fileno(), fcntl.LOCK_EX)
+        yield   # closing the file releases the lock
+
 def _save_json(path, data):
-    with open(path, "w", encoding="utf-8") as f:
-        json.dump(data, f, indent=2, ensure_ascii=False)
-
-def _get_conn():
-    import psycopg2
-    return psycopg2.connect(DATABASE_URL, sslmode="require")
-
-def _db_init():
-    conn = _get_conn()
-    cur  = conn.cursor()
-    cur.execute("""
-        CREATE TABLE IF NOT EXISTS user_data (
-            user_id TEXT NOT NULL,
-            key     TEXT NOT NULL,
-            value   JSONB NOT NULL,
-            PRIMARY KEY (user_id, key)
-        );
-    """)
-    conn.commit(); cur.close(); conn.close()
+    """Atomically replaces `path` with `data` (caller holds _file_lock(path))."""
+    folder = os.path.dirname(path)
+    fd, tmp = tempfile.mkstemp(dir=folder, prefix=os.path.basename(path) + ".", suffix=".tmp")
+    try:
+        with os.fdopen(fd, "w", encoding="utf-8") as f:
+            json.dump(data, f, indent=2, ensure_ascii=False)
+            f.flush()
+            os.fsync(f.fileno())
+            if hasattr(os, "fchmod"):
+                os.fchmod(f.fileno(), 0o644)    # mkstemp creates 0600
+            stamp = _stamp(os.fstat(f.fileno()))
+        os.replace(tmp, path)
+    except BaseException:
+        os.unlink(tmp)
+        raise
+    if hasattr(os, "O_DIRECTORY"):
+        # Make the rename itself durable
+        dir_fd = os.open(folder, os.O_RDONLY | os.O_DIRECTORY)
+        try:
+            os.fsync(dir_fd)
+        finally:
+            os.close(dir_fd)
+    _cache_json(path, stamp, dict(data))
+
+def _update_json(path, update, default=None):
+    """Writes update(current contents) to `path` under its lock; returns the new contents."""
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with _file_lock(path):
+        data = update(_read_json(path, default))
+        _save_json(path, data)
+    return data
+
+def _local_path(user_id, shared):
+    """`shared` (SET_PATH / EVT_PATH), or the user's own copy with LOCAL_PER_USER."""
+    if not (LOCAL_PER_USER and user_id):
+        return shared
+    folder = user_id if _SAFE_ID.fullmatch(user_id) else hashlib.sha1(user_id.encode("utf-8")).hexdigest()
+    return os.path.join(LOCAL_USER_DIR, folder, os.path.basename(shared))
+
+# ── Connection pool ────────────────────────────────────────────
+# One lazily created psycopg2 pool per process. Connections are health-checked
+# on checkout, dropped when broken, and never shared across a fork: a child
+# process forgets the parent's pool (without closing the parent's sockets)
+# and builds its own on first use.
+
+_pool       = None
+_pool_pid   = None
+_pool_lock  = threading.Lock()
+_pool_slots = threading.BoundedSemaphore(DB_POOL_MAX)
+_last_used  = {}    # id(conn) → time of last checkin
+_orphans    = []    # pools inherited across fork; kept alive so GC never closes them
+_stats = {
+    "connections_opened": 0,
+    "checkouts":          0,
+    "wait_seconds":       0.0,
+    "timeouts":           0,
+    "pings":              0,
+    "discarded":          0,
+}
+
+def _new_pool():
+    from psycopg2.pool import ThreadedConnectionPool
+
+    class CountingPool(ThreadedConnectionPool):
+        def _connect(self, key=None):
+            _stats["connections_opened"] += 1
+            return super()._connect(key)
+
+    extra = {"cursor_factory": _timed_cursor()} if metrics.ENABLED else {}
+    return CountingPool(DB_POOL_MIN, DB_POOL_MAX, DATABASE_URL, sslmode=DB_SSLMODE, **extra)
+
+def _timed_cursor():
+    from psycopg2.extensions import cursor
+
+    class TimedCursor(cursor):
+        def execute(self, query, vars=None):
+            t = time.perf_counter()
+            try:
+                return super().execute(query, vars)
+            finally:
+                metrics.count_query(time.perf_counter() - t)
+
+    return TimedCursor
+
+def _get_pool():
+    global _pool, _pool_pid
+    if _pool is not None and _pool_pid == os.getpid():
+        return _pool
+    with _pool_lock:
+        if _pool is not None and _pool_pid != os.getpid():
+            _forget_pool()
+        if _pool is None:
+            _pool     = _new_pool()
+            _pool_pid = os.getpid()
+    return _pool
+
+def _forget_pool():
+    """Drop the inherited pool in a forked child without touching its sockets."""
+    global _pool, _pool_pid, _pool_slots
+    if _pool is not None:
+        _orphans.append(_pool)
+    _pool, _pool_pid = None, None
+    _pool_slots = threading.BoundedSemaphore(DB_POOL_MAX)
+    _last_used.clear()
+    for k in _stats:
+        _stats[k] = 0
+
+if hasattr(os, "register_at_fork"):
+    os.register_at_fork(after_in_child=_forget_pool)
+
+def _healthy(conn):
+    if conn.closed:
+        return False
+    last = _last_used.get(id(conn))
+    if last is None or time.monotonic() - last < DB_POOL_PING_AGE:
+        return True
+    _stats["pings"] += 1
+    try:
+        with conn.cursor() as cur:
+            cur.execute("SELECT 1")
+        conn.rollback()
+        return True
+    except Exception:
+        return False
+
+def _checkout():
+    t0 = time.monotonic()
+    if not _pool_slots.acquire(timeout=DB_POOL_TIMEOUT):
+        _stats["timeouts"] += 1
+        raise RuntimeError(f"No database connection available after {DB_POOL_TIMEOUT}s "
+                           f"(pool max = {DB_POOL_MAX})")
+    try:
+        pool = _get_pool()
+        while True:
+            conn = pool.getconn()
+            if _healthy(conn):
+                break
+            _stats["discarded"] += 1
+            _last_used.pop(id(conn), None)
+            pool.putconn(conn, close=True)
+    except Exception:
+        _pool_slots.release()
+        raise
+    _stats["checkouts"]    += 1
+    _stats["wait_seconds"] += time.monotonic() - t0
+    if metrics.ENABLED:
+        metrics.count_checkout()
+    return conn
+
+def _checkin(conn):
+    try:
+        broken = bool(conn.closed)
+        if broken:
+            _stats["discarded"] += 1
+            _last_used.pop(id(conn), None)
+        else:
+            _last_used[id(conn)] = time.monotonic()
+        if _pool is not None and _pool_pid == os.getpid():
+            _pool.putconn(conn, close=broken)
+    finally:
+        _pool_slots.release()
 
+@contextmanager
+def _conn():
+    """Borrow a pooled connection; commit on success, roll back on error."""
+    conn = _checkout()
+    try:
+        yield conn
+        conn.commit()
+    except Exception:
+        if not conn.closed:
+            conn.rollback()
+        raise
+    finally:
+        _checkin(conn)
+
+def close_pool():
+    global _pool, _pool_pid
+    with _pool_lock:
+        if _pool is not None and _pool_pid == os.getpid():
+            _pool.closeall()
+        _pool, _pool_pid = None, None
+        _last_used.clear()
+
+atexit.register(close_pool)
+
+def pool_stats():
+    """Pool sizing counters for this worker process."""
+    pool = _pool if _pool_pid == os.getpid() else None
+    idle   = len(pool._pool) if pool else 0
+    in_use = len(pool._used) if pool else 0
+    return {
+        "pid":      os.getpid(),
+        "min_size": DB_POOL_MIN,
+        "max_size": DB_POOL_MAX,
+        "open":     idle + in_use,
+        "idle":     idle,
+        "in_use":   in_use,
+        **_stats,
+        "wait_seconds": round(_stats["wait_seconds"], 6),
+    }
+
+# ── Schema ─────────────────────────────────────────────────────
+# Nothing here runs at import: a worker boots without touching the network,
+# and gunicorn --preload can load the app once in the master. The schema is
+# created by an explicit step, `python store.py migrate`, run before the
+# server starts (see Procfile).
+
+MIGRATE_ATTEMPTS = 5
+
+def migrate():
+    """Creates the user_data table if it is missing. Idempotent."""
+    with _conn() as conn, conn.cursor() as cur:
+        cur.execute("""
+            CREATE TABLE IF NOT EXISTS user_data (
+                user_id TEXT NOT NULL,
+                key     TEXT NOT NULL,
+                value   JSONB NOT NULL,
+                PRIMARY KEY (user_id, key)
+            );
+        """)
+
+@metrics.timed("store.get")
 def _db_get(user_id, key, default):
-    conn = _get_conn()
-    cur  = conn.cursor()
-    cur.execute("SELECT value FROM user_data WHERE user_id=%s AND key=%s", (user_id, key))
-    row  = cur.fetchone()
-    cur.close(); conn.close()
+    with _conn() as conn, conn.cursor() as cur:
+        cur.execute("SELECT value FROM user_data WHERE user_id=%s AND key=%s", (user_id, key))
+        row = cur.fetchone()
     return row[0] if row else default
 
+@metrics.timed("store.set")
 def _db_set(user_id, key, value):
-    conn = _get_conn()
-    cur  = conn.cursor()
-    cur.execute("""
-        INSERT INTO user_data (user_id, key, value) VALUES (%s, %s, %s)
-        ON CONFLICT (user_id, key) DO UPDATE SET value = EXCLUDED.value
-    """, (user_id, key, json.dumps(value, ensure_ascii=False)))
-    conn.commit(); cur.close(); conn.close()
+    with _conn() as conn, conn.cursor() as cur:
+        cur.execute("""
+            INSERT INTO user_data (user_id, key, value) VALUES (%s, %s, %s)
+            ON CONFLICT (user_id, key) DO UPDATE SET value = EXCLUDED.value
+        """, (user_id, key, json.dumps(value, ensure_ascii=False)))
+
+def ping():
+    """One round trip to the database; raises when it cannot be reached."""
+    with _conn() as conn, conn.cursor() as cur:
+        cur.execute("SELECT 1")
+
+# ── Catalog cache ──────────────────────────────────────────────
+# The shipped catalog is parsed once and re-read only when the file changes.
+# Merged per-user catalogs live in a bounded LRU tagged with the user's
+# catalog_version, a counter stored in user_data and bumped by every overlay
+# write, so an edit made through one worker invalidates the others too.
+# Cached catalogs are shared: treat them as read-only.
+
+_default_cat     = {"stamp": None, "data": None}
+_user_catalogs   = OrderedDict()    # user_id → (version, merged catalog)
+_user_cache_lock = threading.Lock()
+_digests         = {}               # id(cached catalog) → (catalog, content digest)
+_cache_stats     = {"hits": 0, "misses": 0, "default_reloads": 0}
+
+def _remember_digest(catalog):
+    entry = _digests.get(id(catalog))
+    if entry is None or entry[0] is not catalog:
+        _digests[id(catalog)] = (catalog, content_digest(catalog))
+
+def _forget_digest(catalog):
+    # Users without an overlay share the default catalog; its digest stays
+    if catalog is not _default_cat["data"]:
+        _digests.pop(id(catalog), None)
+
+def catalog_digest(catalog):
+    """Content digest of a catalog; free for catalogs served from the cache."""
+    entry = _digests.get(id(catalog))
+    if entry is not None and entry[0] is catalog:
+        return entry[1]
+    return content_digest(catalog)
+
+def bundle_digest(settings, catalog, key=None):
+    """
+    Stable content hash of (settings, merged catalog) — everything a result
+    depends on. Built on core.plan_key() (menu, extras, catalog), so a caller
+    that passes the key on to the plan functions hashes the menu only once.
+    """
+    key = key or plan_key(settings, catalog, catalog_digest(catalog))
+    return content_digest([key, {k: v for k, v in settings.items() if k not in ("menu", "extras")}])
+
+def _default_catalog():
+    stamp = _stamp(os.stat(CAT_PATH))
+    if _default_cat["stamp"] != stamp:
+        with _user_cache_lock:
+            _user_catalogs.clear()
+            _digests.clear()
+            _default_cat["data"]  = _load_json(CAT_PATH)
+            _default_cat["stamp"] = stamp
+            _remember_digest(_default_cat["data"])
+        _cache_stats["default_reloads"] += 1
+    return _default_cat["data"]
 
-if USE_DB:
-    _db_init()
+def _default_settings():  return _read_json(SET_PATH)
 
-# ── Helpers ────────────────────────────────────────────────────
+def _cached_catalog(user_id):
+    with _user_cache_lock:
+        entry = _user_catalogs.get(user_id)
+        if entry is not None:
+            _user_catalogs.move_to_end(user_id)
+        return entry
 
-def _default_catalog():   return _load_json(CAT_PATH)
-def _default_settings():  return _load_json(SET_PATH)
+def _cache_catalog(user_id, version, catalog):
+    with _user_cache_lock:
+        old = _user_catalogs.pop(user_id, None)
+        if old is not None:
+            _forget_digest(old[1])
+        _user_catalogs[user_id] = (version, catalog)
+        _remember_digest(catalog)
+        while len(_user_catalogs) > CATALOG_CACHE_SIZE:
+            _forget_digest(_user_catalogs.popitem(last=False)[1][1])
+
+def cache_stats():
+    lookups = _cache_stats["hits"] + _cache_stats["misses"]
+    return {
+        **_cache_stats,
+        "hit_rate": round(_cache_stats["hits"] / lookups, 4) if lookups else None,
+        "entries":  len(_user_catalogs),
+        "capacity": CATALOG_CACHE_SIZE,
+    }
+
+# Overlay patches: SQL expressions over {v}, the stored value (the key's
+# default when the row does not exist yet). {p} prefixes parameter names.
+_MERGE      = "{v} || %({p}items)s::jsonb"                       # add / replace entries
+_REMOVE     = "{v} - %({p}names)s::text[]"                       # drop entries
+_APPEND_NEW = ("{v} || COALESCE((SELECT jsonb_agg(n ORDER BY i)"   # add to a list once
+               " FROM unnest(%({p}names)s::text[]) WITH ORDINALITY AS t(n, i)"
+               " WHERE NOT {v} ? n), '[]'::jsonb)")
+_MERGE_INTO = ("{v} || COALESCE((SELECT jsonb_object_agg(name, ({v} -> name) || patch)"  # patch existing entries
+               " FROM jsonb_each(%({p}items)s::jsonb) AS e(name, patch)"
+               " WHERE {v} ? name), '{{}}'::jsonb)")
+
+@metrics.timed("store.patch")
+def _db_patch(user_id, patches, catalog=True):
+    """
+    Applies (key, expr, args, create) patches to stored values and bumps
+    catalog_version, all in one statement: each edit costs one round trip,
+    writes only its own items, and concurrent edits cannot overwrite each
+    other. Patches to the same key are composed in order; `create=False`
+    leaves a missing row missing. The version is only bumped (and the cached
+    catalog dropped) when a value actually changed, and never for
+    non-catalog keys (`catalog=False`). Returns whether anything changed.
+    """
+    params = {"u": user_id}
+    by_key = {}     # key → ([(expr, prefix), ...], create); same-key patches compose
+    for i, (key, expr, args, create) in enumerate(patches):
+        # An empty payload (no items, no names) changes nothing: no row, no version bump
+        if not any(args.values()):
+            continue
+        p = f"p{i}_"
+        for name, value in args.items():
+            params[p + name] = json.dumps(value, ensure_ascii=False) if isinstance(value, dict) else value
+        exprs, created = by_key.get(key, ([], False))
+        by_key[key] = (exprs + [(expr, p)], created or create)
+    if not by_key:
+        return False
+
+    def patched(exprs, v):
+        for expr, p in exprs:
+            v = expr.format(v=f"({v})", p=p)
+        return v
+
+    ctes = []
+    for i, (key, (exprs, create)) in enumerate(by_key.items()):
+        params[f"k{i}"], params[f"d{i}"] = key, json.dumps(PATCH_DEFAULTS[key])
+        new = patched(exprs, "user_data.value")
+        if create:
+            ctes.append(f"""c{i} AS (
+                INSERT INTO user_data (user_id, key, value)
+                VALUES (%(u)s, %(k{i})s, {patched(exprs, f"%(d{i})s::jsonb")})
+                ON CONFLICT (user_id, key) DO UPDATE SET value = {new}
+                 WHERE {new} IS DISTINCT FROM user_data.value
+                RETURNING 1)""")
+        else:
+            ctes.append(f"""c{i} AS (
+                UPDATE user_data SET value = {new}
+                 WHERE user_id = %(u)s AND key = %(k{i})s
+                   AND {new} IS DISTINCT FROM user_data.value
+                RETURNING 1)""")
+    changed = " UNION ALL ".join(f"SELECT 1 FROM c{i}" for i in range(len(ctes)))
+    with _conn() as conn, conn.cursor() as cur:
+        if not catalog:
+            cur.execute(f"WITH {', '.join(ctes)} SELECT EXISTS ({changed})", params)
+            return cur.fetchone()[0]
+        cur.execute(f"""
+            WITH {", ".join(ctes)}
+            INSERT INTO user_data (user_id, key, value)
+            SELECT %(u)s, 'catalog_version', '1'::jsonb WHERE EXISTS ({changed})
+            ON CONFLICT (user_id, key)
+            DO UPDATE SET value = to_jsonb((user_data.value #>> '{{}}')::bigint + 1)
+            RETURNING 1
+        """, params)
+        bumped = cur.fetchone() is not None
+    if bumped:
+        with _user_cache_lock:
+            old = _user_catalogs.pop(user_id, None)
+            if old is not None:
+                _forget_digest(old[1])
+    return bumped
 
 # ── Public API ─────────────────────────────────────────────────
 
-def get_catalog(user_id=None):
-    defaults = _default_catalog()
-    if not user_id or not USE_DB:
-        return defaults
+# Every per-user key a page render needs: the catalog overlay plus settings
+OVERLAY_DEFAULTS = {
+    "hidden_ingredients":   [],
+    "hidden_cocktails":     [],
+    "personal_ingredients": {},
+    "personal_cocktails":   {},
+    "price_overrides":      {},
+}
 
-    hidden_ing      = set(_db_get(user_id, "hidden_ingredients",  []))
-    hidden_cock     = set(_db_get(user_id, "hidden_cocktails",    []))
-    personal_ing    =     _db_get(user_id, "personal_ingredients", {})
-    personal_cock   =     _db_get(user_id, "personal_cocktails",   {})
-    price_overrides =     _db_get(user_id, "price_overrides",      {})
+# Keys _db_patch() may create, with the value a missing row stands for
+PATCH_DEFAULTS = {**OVERLAY_DEFAULTS, "events": {}}
+
+def _merge_catalog(defaults, overlay):
+    """
+    The user's catalog: defaults with the overlay applied. Parts the overlay
+    leaves alone are the defaults' own dicts, and an empty overlay returns
+    `defaults` itself, so users who never edited share one copy.
+    """
+    if not any(overlay.values()):
+        return defaults
+    hidden_ing      = set(overlay["hidden_ingredients"])
+    hidden_cock     = set(overlay["hidden_cocktails"])
+    personal_ing    = overlay["personal_ingredients"]
+    personal_cock   = overlay["personal_cocktails"]
+    price_overrides = overlay["price_overrides"]
 
     # Ingredients: remove hidden, apply price overrides, add personal
-    ingredients = {k: v for k, v in defaults["ingredients"].items() if k not in hidden_ing}
-    for name, override in price_overrides.items():
-        if name in ingredients:
-            ingredients[name] = {**ingredients[name], **override}
-    ingredients.update(personal_ing)
+    ingredients = defaults["ingredients"]
+    if hidden_ing or price_overrides or personal_ing:
+        ingredients = {k: v for k, v in ingredients.items() if k not in hidden_ing}
+        for name, override in price_overrides.items():
+            if name in ingredients:
+                ingredients[name] = {**ingredients[name], **override}
+        ingredients.update(personal_ing)
 
     # Cocktails: remove hidden, add personal
-    cocktails = {k: v for k, v in defaults["cocktails"].items() if k not in hidden_cock}
-    cocktails.update(personal_cock)
+    cocktails = defaults["cocktails"]
+    if hidden_cock or personal_cock:
+        cocktails = {k: v for k, v in cocktails.items() if k not in hidden_cock}
+        cocktails.update(personal_cock)
 
     return {"ingredients": ingredients, "cocktails": cocktails}
 
+def merged_catalog(overlay):
+    """The catalog of a user with this overlay (from iter_users()); None is the default catalog."""
+    defaults = _default_catalog()
+    return defaults if overlay is None else _merge_catalog(defaults, overlay)
+
+@metrics.timed("store.load")
+def _load_user(user_id, extra_keys=()):
+    """
+    Merged catalog plus any extra keys for one user, in one round trip.
+    The overlay rows are only shipped when the DB catalog_version differs
+    from the one this worker has cached.
+    """
+    cached = _cached_catalog(user_id)
+    with _conn() as conn, conn.cursor() as cur:
+        cur.execute("""
+            SELECT key, value FROM user_data
+             WHERE user_id = %(u)s
+               AND (key = 'catalog_version' OR key = ANY(%(extra)s)
+                    OR (key = ANY(%(overlay)s)
+                        AND COALESCE((SELECT value FROM user_data
+                                       WHERE user_id = %(u)s AND key = 'catalog_version'),
+                                     '0'::jsonb) IS DISTINCT FROM %(cached)s::jsonb))
+        """, {"u": user_id, "extra": list(extra_keys), "overlay": list(OVERLAY_DEFAULTS),
+              "cached": json.dumps(cached[0]) if cached else None})
+        rows = dict(cur.fetchall())
+
+    defaults = _default_catalog()
+    version  = rows.pop("catalog_version", 0)
+    if cached and cached[0] == version:
+        _cache_stats["hits"] += 1
+        catalog = cached[1]
+    else:
+        _cache_stats["misses"] += 1
+        overlay = {k: rows.get(k, d) for k, d in OVERLAY_DEFAULTS.items()}
+        catalog = _merge_catalog(defaults, overlay)
+        _cache_catalog(user_id, version, catalog)
+    return catalog, rows
+
+def get_catalog(user_id=None):
+    if not user_id or not USE_DB:
+        return _default_catalog()
+    return _load_user(user_id)[0]
+
+def get_bundle(user_id=None):
+    """(settings, catalog) for one user, fetched in a single DB round trip."""
+    if not user_id or not USE_DB:
+        return _local_settings(user_id), _default_catalog()
+    catalog, rows = _load_user(user_id, ["settings", "settings_version"])
+    return _row_settings(user_id, rows), catalog
+
+def _row_settings(user_id, rows):
+    """Settings from _load_user() rows, or the user's queued save."""
+    return _fresh_settings(user_id, rows.get("settings_version", 0),
+                           rows.get("settings") or _default_settings())
+
+def _shipped(kind, names):
+    """The names that are in the shipped catalog (hidden / overridden rather than removed)."""
+    defaults = _default_catalog()[kind]
+    return [n for n in names if n in defaults]
+
+def add_ingredients(user_id, items):
+    """Adds or replaces personal ingredients ({name: data}) in one statement."""
+    return _db_patch(user_id, [("personal_ingredients", _MERGE, {"items": items}, True)])
+
+# A personal entry may share a shipped entry's name and hide it (imports
+# before catalog_io learned to skip shipped rows wrote those), so deletes
+# and price edits reach personal entries under every name, shipped or not.
+
+def delete_ingredients(user_id, names):
+    names = list(dict.fromkeys(names))
+    return _db_patch(user_id, [
+        ("hidden_ingredients",   _APPEND_NEW, {"names": _shipped("ingredients", names)}, True),
+        ("personal_ingredients", _REMOVE,     {"names": names},                         False),
+    ])
+
+def _price_patches(prices):
+    patch   = {n: {"price_min": pmin, "price_max": pmax} for n, (pmin, pmax) in prices.items()}
+    shipped = {n: patch[n] for n in _shipped("ingredients", patch)}
+    return [("price_overrides",      _MERGE,      {"items": shipped}, True),
+            ("personal_ingredients", _MERGE_INTO, {"items": patch},   False)]
+
+def update_ingredient_prices(user_id, prices):
+    """{name: (price_min, price_max)}; names missing from the catalog are ignored."""
+    return _db_patch(user_id, _price_patches(prices))
+
+def add_cocktails(user_id, items):
+    """Adds or replaces personal cocktails ({name: data}) in one statement."""
+    return _db_patch(user_id, [("personal_cocktails", _MERGE, {"items": items}, True)])
+
+def delete_cocktails(user_id, names):
+    names = list(dict.fromkeys(names))
+    return _db_patch(user_id, [
+        ("hidden_cocktails",   _APPEND_NEW, {"names": _shipped("cocktails", names)}, True),
+        ("personal_cocktails", _REMOVE,     {"names": names},                       False),
+    ])
+
+def apply_catalog_batch(user_id, ingredients=None, prices=None, cocktails=None):
+    """New ingredients, price updates and new cocktails (e.g. one import batch) in one statement."""
+    return _db_patch(user_id, [
+        ("personal_ingredients", _MERGE, {"items": ingredients or {}}, True),
+        *_price_patches(prices or {}),
+        ("personal_cocktails",   _MERGE, {"items": cocktails or {}},   True),
+    ])
+
 def add_ingredient(user_id, name, data):
-    personal = _db_get(user_id, "personal_ingredients", {})
-    personal[name] = data
-    _db_set(user_id, "personal_ingredients", personal)
+    add_ingredients(user_id, {name: data})
 
 def delete_ingredient(user_id, name):
-    if name in _default_catalog()["ingredients"]:
-        hidden = _db_get(user_id, "hidden_ingredients", [])
-        if name not in hidden:
-            hidden.append(name)
-        _db_set(user_id, "hidden_ingredients", hidden)
-    else:
-        personal = _db_get(user_id, "personal_ingredients", {})
-        personal.pop(name, None)
-        _db_set(user_id, "personal_ingredients", personal)
+    delete_ingredients(user_id, [name])
 
 def update_ingredient_price(user_id, name, price_min, price_max):
-    if name in _default_catalog()["ingredients"]:
-        overrides = _db_get(user_id, "price_overrides", {})
-        overrides[name] = {"price_min": price_min, "price_max": price_max}
-        _db_set(user_id, "price_overrides", overrides)
-    else:
-        personal = _db_get(user_id, "personal_ingredients", {})
-        if name in personal:
-            personal[name]["price_min"] = price_min
-            personal[name]["price_max"] = price_max
-            _db_set(user_id, "personal_ingredients", personal)
+    update_ingredient_prices(user_id, {name: (price_min, price_max)})
 
 def add_cocktail(user_id, name, data):
-    personal = _db_get(user_id, "personal_cocktails", {})
-    personal[name] = data
-    _db_set(user_id, "personal_cocktails", personal)
+    add_cocktails(user_id, {name: data})
 
 def delete_cocktail(user_id, name):
-    if name in _default_catalog()["cocktails"]:
-        hidden = _db_get(user_id, "hidden_cocktails", [])
-        if name not in hidden:
-            hidden.append(name)
-        _db_set(user_id, "hidden_cocktails", hidden)
-    else:
-        personal = _db_get(user_id, "personal_cocktails", {})
-        personal.pop(name, None)
-        _db_set(user_id, "personal_cocktails", personal)
+    delete_cocktails(user_id, [name])
 
 def get_settings(user_id=None):
     if not user_id or not USE_DB:
-        return _default_settings()
-    return _db_get(user_id, "settings", _default_settings())
+        return _local_settings(user_id)
+    pending = _pending_settings(user_id)
+    if pending is not None:
+        return pending
+    settings, version = _db_get_settings(user_id)
+    return _fresh_settings(user_id, version, settings)
 
 def save_settings(user_id, data):
     if USE_DB:
-        _db_set(user_id, "settings", data)
+        _queue_settings(user_id, data)
     else:
-        _save_json(SET_PATH, data)
+        _update_json(_local_path(user_id, SET_PATH), lambda _: data)
+
+def _local_settings(user_id):
+    return _read_json(_local_path(user_id, SET_PATH)) or _default_settings()
+
+# ── Settings write-behind ──────────────────────────────────────
+# Dashboard inputs and menu edits save settings in bursts. In DB mode
+# save_settings() only queues the new value; a writer thread stores each
+# user's latest value once SETTINGS_WRITE_DELAY passes without another save
+# (SETTINGS_WRITE_MAX_DELAY at most after the first), so a burst costs one
+# write. Reads in this process return queued values (read-your-writes).
+#
+# Writes are a compare-and-set on the user's settings_version row: the keys
+# saved here are applied onto the version this process last read, and if
+# another process wrote in between, they are re-applied onto a fresh read
+# instead of overwriting its keys. A failed write stays queued and is
+# retried; queued values are flushed when the worker exits.
+
+SETTINGS_WRITE_MAX_DELAY = 2.0    # seconds from the first save of a burst
+SETTINGS_RETRY_DELAY     = 5.0    # seconds before retrying a failed write
+SETTINGS_CAS_ATTEMPTS    = 5
+SETTINGS_EXIT_TIMEOUT    = 10.0   # seconds to wait for queued writes at exit
+
+_write_cv      = threading.Condition()
+_pending       = {}             # user_id → queued write {"value", "changed", "first", "due"}
+_inflight      = {}             # user_id → write being stored
+_settings_seen = OrderedDict()  # user_id → (settings_version, settings) last read or written
+_writer        = {"thread": None}
+_write_stats   = {"saves": 0, "writes": 0, "conflicts": 0, "failures": 0}
+
+def _forget_writes():
+    """A forked child starts with no queue; the parent flushes its own."""
+    global _write_cv
+    _write_cv = threading.Condition()
+    _pending.clear()
+    _inflight.clear()
+    _writer["thread"] = None
+
+if hasattr(os, "register_at_fork"):
+    os.register_at_fork(after_in_child=_forget_writes)
+
+@metrics.timed("store.get")
+def _db_get_settings(user_id):
+    """(settings, settings_version) as stored; defaults and 0 for a new user."""
+    with _conn() as conn, conn.cursor() as cur:
+        cur.execute("SELECT key, value FROM user_data WHERE user_id = %s"
+                    " AND key IN ('settings', 'settings_version')", (user_id,))
+        rows = dict(cur.fetchall())
+    return rows.get("settings") or _default_settings(), rows.get("settings_version", 0)
+
+@metrics.timed("store.set")
+def _db_cas_settings(user_id, settings, version):
+    """Stores settings if settings_version is still `version`; the new version, else None."""
+    with _conn() as conn, conn.cursor() as cur:
+        cur.execute("""
+            WITH bump AS (
+                INSERT INTO user_data (user_id, key, value) VALUES (%(u)s, 'settings_version', '1')
+                ON CONFLICT (user_id, key)
+                DO UPDATE SET value = to_jsonb((user_data.value #>> '{}')::bigint + 1)
+                 WHERE (user_data.value #>> '{}')::bigint = %(v)s
+                RETURNING (value #>> '{}')::bigint AS version
+            ), store AS (
+                INSERT INTO user_data (user_id, key, value)
+                SELECT %(u)s, 'settings', %(s)s::jsonb FROM bump
+                ON CONFLICT (user_id, key) DO UPDATE SET value = EXCLUDED.value
+            )
+            SELECT version FROM bump
+        """, {"u": user_id, "v": version, "s": json.dumps(settings, ensure_ascii=False)})
+        row = cur.fetchone()
+    return row[0] if row else None
+
+def _remember_settings(user_id, version, settings, fresh=False):
+    """Records a stored version; an older one than recorded only when `fresh`."""
+    with _write_cv:
+        seen = _settings_seen.get(user_id)
+        if fresh or seen is None or version >= seen[0]:
+            _settings_seen[user_id] = (version, copy.deepcopy(settings))
+        _settings_seen.move_to_end(user_id)
+        while len(_settings_seen) > CATALOG_CACHE_SIZE:
+            _settings_seen.popitem(last=False)
+
+def _pending_settings(user_id):
+    """A copy of the user's queued or in-flight settings, or None."""
+    with _write_cv:
+        entry = _pending.get(user_id) or _inflight.get(user_id)
+        return copy.deepcopy(entry["value"]) if entry else None
+
+def _fresh_settings(user_id, version, settings):
+    """
+    What a read returns after loading (version, settings): the user's queued
+    save if there is one, else the newer of that and the last version this
+    process wrote, which a read racing the writer may have missed.
+    """
+    with _write_cv:
+        pending = _pending_settings(user_id)
+        if pending is not None:
+            return pending
+        seen = _settings_seen.get(user_id)
+        if seen is not None and seen[0] > version:
+            _settings_seen.move_to_end(user_id)
+            return copy.deepcopy(seen[1])
+        _remember_settings(user_id, version, settings)
+        return settings
+
+def _queue_settings(user_id, data):
+    now = time.monotonic()
+    with _write_cv:
+        entry = _pending.get(user_id) or _inflight.get(user_id)
+        seen  = _settings_seen.get(user_id)
+        view  = entry["value"] if entry else seen[1] if seen else None
+        if user_id not in _pending:
+            _pending[user_id] = {"value": None, "changed": set(), "first": now}
+        entry = _pending[user_id]
+        # Only the keys this save changed are applied at write time
+        if view is None:
+            entry["changed"].update(data)
+        else:
+            entry["changed"].update(k for k in view.keys() | data.keys() if view.get(k) != data.get(k))
+        entry["value"] = copy.deepcopy(data)
+        entry["due"]   = min(now + SETTINGS_WRITE_DELAY, entry["first"] + SETTINGS_WRITE_MAX_DELAY)
+        _write_stats["saves"] += 1
+        _write_cv.notify_all()
+        if _writer["thread"] is None:
+            _writer["thread"] = threading.Thread(target=_write_loop, name="settings-writer", daemon=True)
+            _writer["thread"].start()
+
+def _rebased(base, entry):
+    value = dict(base)
+    for key in entry["changed"]:
+        if key in entry["value"]:
+            value[key] = entry["value"][key]
+        else:
+            value.pop(key, None)
+    return value
+
+def _write_settings(user_id, entry):
+    """Compare-and-set loop: applies the entry onto the latest stored version."""
+    with _write_cv:
+        seen = _settings_seen.get(user_id)
+    if seen is None:
+        seen = _db_get_settings(user_id)[::-1]
+    for _ in range(SETTINGS_CAS_ATTEMPTS):
+        version, base = seen
+        value   = _rebased(base, entry)
+        written = _db_cas_settings(user_id, value, version)
+        if written is not None:
+            _remember_settings(user_id, written, value)
+            _write_stats["writes"] += 1
+            return
+        _write_stats["conflicts"] += 1
+        seen = _db_get_settings(user_id)[::-1]
+        _remember_settings(user_id, *seen, fresh=True)
+    raise RuntimeError(f"settings of {user_id} changed concurrently {SETTINGS_CAS_ATTEMPTS} times")
+
+def _write_loop():
+    while True:
+        with _write_cv:
+            while True:
+                now   = time.monotonic()
+                ready = [u for u, e in _pending.items() if u not in _inflight]
+                due   = [u for u in ready if _pending[u]["due"] <= now]
+                if due:
+                    break
+                _write_cv.wait(min((_pending[u]["due"] - now for u in ready), default=None))
+            batch = {u: _pending.pop(u) for u in due}
+            _inflight.update(batch)
+        for user_id, entry in batch.items():
+            try:
+                _write_settings(user_id, entry)
+                failed = False
+            except Exception as e:
+                _write_stats["failures"] += 1
+                log.warning("settings write for %s failed, will retry: %s", user_id, e)
+                failed = True
+            with _write_cv:
+                del _inflight[user_id]
+                if failed:
+                    # Back in the queue, under any save that came in meanwhile
+                    newer = _pending.get(user_id)
+                    if newer is not None:
+                        newer["changed"] |= entry["changed"]
+                    else:
+                        entry["due"] = time.monotonic() + SETTINGS_RETRY_DELAY
+                        _pending[user_id] = entry
+                _write_cv.notify_all()
+
+def flush_settings(user_id=None, timeout=None):
+    """
+    Writes queued settings now (one user's, or everyone's) and waits until
+    they are stored or `timeout` passes. Returns whether the queue drained.
+    """
+    deadline = time.monotonic() + timeout if timeout is not None else None
+    with _write_cv:
+        users = [user_id] if user_id is not None else list(_pending)
+        for u in users:
+            if u in _pending:
+                _pending[u]["due"] = 0
+        _write_cv.notify_all()
+        while any(u in _pending or u in _inflight for u in users):
+            left = deadline - time.monotonic() if deadline is not None else None
+            if left is not None and left <= 0:
+                return False
+            _write_cv.wait(left)
+    return True
+
+def settle_settings(user_id):
+    """End of a request: with no write delay, returns once the user's saves are stored."""
+    if user_id and SETTINGS_WRITE_DELAY == 0 and USE_DB:
+        flush_settings(user_id, SETTINGS_EXIT_TIMEOUT)
+
+def write_stats():
+    with _write_cv:
+        return {**_write_stats, "queued": len(_pending), "in_flight": len(_inflight),
+                "delay_ms": SETTINGS_WRITE_DELAY * 1000}
+
+def _flush_at_exit():
+    if (_pending or _inflight) and not flush_settings(timeout=SETTINGS_EXIT_TIMEOUT):
+        log.error("settings not written at exit for: %s", ", ".join(sorted({*_pending, *_inflight})))
+
+# Registered after close_pool, so it runs first
+atexit.register(_flush_at_exit)
+
+# ── Events ─────────────────────────────────────────────────────
+# Named events of a season: {name: overrides of the user's settings plus an
+# optional "date"}. Fields an event leaves out follow the current settings.
+
+def _local_events(user_id):
+    return _read_json(_local_path(user_id, EVT_PATH), {})
+
+def get_events(user_id=None):
+    if not user_id or not USE_DB:
+        return _local_events(user_id)
+    return _db_get(user_id, "events", {})
+
+def save_event(user_id, name, event):
+    if USE_DB:
+        _db_patch(user_id, [("events", _MERGE, {"items": {name: event}}, True)], catalog=False)
+    else:
+        _update_json(_local_path(user_id, EVT_PATH), lambda events: {**events, name: event}, {})
+
+def delete_event(user_id, name):
+    if USE_DB:
+        _db_patch(user_id, [("events", _REMOVE, {"names": [name]}, False)], catalog=False)
+    else:
+        _update_json(_local_path(user_id, EVT_PATH),
+                     lambda events: {k: v for k, v in events.items() if k != name}, {})
+
+def season_events(settings, events):
+    """Full settings per event, tagged with its name, in date order (undated last)."""
+    ordered = sorted(events.items(), key=lambda kv: (not kv[1].get("date"), kv[1].get("date") or ""))
+    return [{**settings, **event, "name": name} for name, event in ordered]
+
+def get_season(user_id=None):
+    """(season_events(), catalog) for one user in a single DB round trip."""
+    if not user_id or not USE_DB:
+        return season_events(_local_settings(user_id), _local_events(user_id)), _default_catalog()
+    catalog, rows = _load_user(user_id, ["settings", "settings_version", "events"])
+    return season_events(_row_settings(user_id, rows), rows.get("events", {})), catalog
+
+# ── All users ──────────────────────────────────────────────────
+# For operator reports across accounts. Rows come through a server-side
+# cursor, ITER_BATCH at a time and grouped per user as they arrive, so a
+# pass over every user holds one batch in memory however many there are.
+
+ITER_BATCH = 1000
+
+def iter_users(batch=ITER_BATCH):
+    """
+    Yields (user_id, settings, overlay) for every user with stored settings
+    or catalog edits; overlay is None when the user never edited the
+    catalog (get_catalog() would be the default one).
+    """
+    if not USE_DB:
+        yield from _local_users()
+        return
+    with _conn() as conn, conn.cursor(name="iter_users") as cur:
+        cur.itersize = batch
+        cur.execute("SELECT user_id, key, value FROM user_data WHERE key = ANY(%s) ORDER BY user_id",
+                    (["settings", *OVERLAY_DEFAULTS],))
+        for user_id, rows in groupby(cur, key=lambda row: row[0]):
+            values  = {key: value for _, key, value in rows}
+            overlay = {k: values.get(k, d) for k, d in OVERLAY_DEFAULTS.items()}
+            if not any(overlay.values()):
+                overlay = None
+            yield user_id, values.get("settings") or _default_settings(), overlay
+
+def _local_users():
+    if not LOCAL_PER_USER:
+        yield None, _local_settings(None), None
+        return
+    if not os.path.isdir(LOCAL_USER_DIR):
+        return
+    for entry in sorted(os.scandir(LOCAL_USER_DIR), key=lambda e: e.name):
+        path = os.path.join(entry.path, os.path.basename(SET_PATH))
+        if entry.is_dir() and os.path.exists(path):
+            yield entry.name, _load_json(path), None
+
+if __name__ == "__main__":
+    import sys
+    if sys.argv[1:] != ["migrate"]:
+        sys.exit("usage: python store.py migrate")
+    if not USE_DB:
+        print("DATABASE_URL is not set: local JSON mode, nothing to migrate")
+        sys.exit(0)
+    # The database may still be starting alongside the app: retry with backoff
+    for attempt in range(MIGRATE_ATTEMPTS):
+        try:
+            migrate()
+            break
+        except Exception as e:
+            if attempt == MIGRATE_ATTEMPTS - 1:
+                sys.exit(f"migrate failed: {e}")
+            print(f"migrate failed ({e}), retrying", file=sys.stderr)
+            close_pool()
+            time.sleep(2 ** attempt)
+    print("schema up to date")